@@ -0,0 +1,67 @@
+# app/archive.py
+"""
+Arquivamento dos posts antigos ("frios").
+
+Quase todas as leituras pegam os posts dos últimos dias, mas a coleção `posts` (e os seus
+índices) só crescia. Aqui os posts com mais de POST_ARCHIVE_AFTER_DAYS dias são movidos,
+em lotes, para a coleção `posts_archive` (ArchivedPost, mesmo formato e índices). A coleção
+quente fica do tamanho da janela recente e os índices dela cabem na memória.
+
+Leituras: as rotas de posts leem a coleção quente primeiro e, quando a página não se
+completa ali (o cursor passou da fronteira), continuam no arquivo (ver routes.py). Como
+tudo que está no arquivo é mais antigo do que tudo que está na coleção quente, a ordem
+por data se mantém. Posts arquivados são só de leitura (likes e comentários em posts tão
+antigos deixam de ser aceitos).
+
+Cada lote é copiado (upsert, que pode ser repetido sem duplicar) e só depois apagado da
+coleção quente. Se a rodada cair no meio, a próxima refaz o lote. O apagamento é condicional:
+só sai da coleção quente o post que ainda é igual à cópia. Um like ou comentário que chegou
+entre a cópia e o apagamento deixa o post na coleção quente, e ele é copiado de novo (com a
+mudança) na próxima volta do laço.
+"""
+import asyncio
+import datetime
+
+from pymongo import DeleteOne, ReplaceOne
+
+from .config import settings
+from .models import ArchivedPost, Post
+
+# Um worker por rodada (a trava expira junto com o intervalo entre as rodadas).
+ARCHIVE_LOCK_KEY = "archive:posts:lock"
+
+
+async def archive_cold_posts(older_than: datetime.timedelta, batch_size: int) -> int:
+    """Move para o arquivo os posts criados antes de agora - `older_than`. Devolve quantos foram movidos."""
+    cutoff = datetime.datetime.now(datetime.UTC) - older_than
+    hot = Post.get_motor_collection()
+    archive = ArchivedPost.get_motor_collection()
+
+    moved = 0
+    while True:
+        # Lotes dos mais antigos para os mais novos, pelo índice de created_at.
+        batch = await hot.find({"created_at": {"$lt": cutoff}}).sort("created_at", 1).limit(batch_size).to_list(None)
+        if not batch:
+            return moved
+        await archive.bulk_write([ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in batch], ordered=False)
+        # O filtro é o documento copiado inteiro: se likes ou comentários mudaram desde a
+        # leitura, nada é apagado e o post volta no próximo lote.
+        result = await hot.bulk_write([DeleteOne(doc) for doc in batch], ordered=False)
+        moved += result.deleted_count
+        if not result.deleted_count:
+            return moved  # o lote inteiro mudou durante a cópia: fica para a próxima rodada
+
+
+async def run_periodically(redis_client):
+    """Roda o arquivamento a cada POST_ARCHIVE_INTERVAL_SECONDS (tarefa iniciada no lifespan)."""
+    interval = settings.POST_ARCHIVE_INTERVAL_SECONDS
+    while True:
+        if await redis_client.set(ARCHIVE_LOCK_KEY, 1, nx=True, ex=interval):
+            try:
+                moved = await archive_cold_posts(
+                    datetime.timedelta(days=settings.POST_ARCHIVE_AFTER_DAYS), settings.POST_ARCHIVE_BATCH_SIZE)
+                if moved:
+                    print(f"INFO: {moved} posts antigos movidos para o arquivo.")
+            except Exception as exc:
+                print(f"AVISO: falha no arquivamento de posts ({exc}). Nova tentativa na próxima rodada.")
+        await asyncio.sleep(interval)
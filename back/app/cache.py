@@ -1,12 +1,273 @@
 # app/cache.py
+import asyncio
+import functools
+import json
+import math
+import os
+import random
+import time
+from collections import OrderedDict
+
 import redis.asyncio as redis
-from .config import settings
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
 
-# Cria um "pool" de conexões com o Redis que pode ser reutilizado.
-redis_pool = redis.from_url(settings.REDIS_URL, encoding="utf-8", decode_responses=True)
+from .config import settings
+from .metrics import record_cache
+from .resources import resources
 
 async def get_redis_client():
     """
-    Dependência do FastAPI que fornece um cliente Redis para as rotas.
+    Dependência do FastAPI que fornece um cliente Redis para as rotas
+    (o cliente compartilhado de app/resources.py, com o pool configurado lá).
+    """
+    return resources.redis
+
+
+# =============================================================================
+# --- Cache em duas camadas (L1 em memória + L2 no Redis) ---
+# =============================================================================
+
+# Prefixos das chaves no Redis.
+CACHE_KEY_PREFIX = "cache:"
+TAG_KEY_PREFIX = "cache:tag:"
+# Canal usado para avisar os outros workers que devem descartar entradas do L1.
+INVALIDATION_CHANNEL = "cache:invalidations"
+# Os conjuntos de chaves por tag só precisam viver mais que as entradas que apontam.
+TAG_TTL_SECONDS = 24 * 60 * 60
+
+
+class CacheEntry:
+    """Valor em cache com o momento em que expira e quanto custou para ser calculado."""
+    __slots__ = ("value", "expires_at", "compute_seconds", "tags")
+
+    def __init__(self, value, expires_at, compute_seconds, tags):
+        self.value = value
+        self.expires_at = expires_at
+        self.compute_seconds = compute_seconds
+        self.tags = tuple(tags)
+
+    def to_json(self) -> str:
+        return json.dumps({"v": self.value, "exp": self.expires_at, "cost": self.compute_seconds, "tags": self.tags})
+
+    @classmethod
+    def from_json(cls, raw: str) -> "CacheEntry":
+        data = json.loads(raw)
+        return cls(data["v"], data["exp"], data["cost"], data["tags"])
+
+    def should_refresh_early(self, now: float, beta: float) -> bool:
+        """
+        Renovação antecipada probabilística ("XFetch"): quanto mais perto de expirar e quanto
+        mais caro de recalcular, maior a chance de uma leitura disparar o recálculo antes da hora.
+        Assim as entradas não expiram todas juntas e ninguém espera o recálculo.
+        """
+        return now - self.compute_seconds * beta * math.log(random.random() or 1e-12) >= self.expires_at
+
+
+class TwoTierCache:
+    """
+    Cache de respostas em duas camadas:
+    - L1: LRU em memória, por processo (sem ida à rede);
+    - L2: Redis, compartilhado entre os workers.
+
+    Cada entrada pode ter tags (ex.: "posts") para invalidar famílias de chaves de uma vez.
+    Leituras concorrentes da mesma chave ausente esperam um único cálculo (single-flight), e a
+    invalidação é repassada aos outros workers por pub/sub para que descartem o próprio L1.
+    """
+
+    def __init__(self, max_entries: int, early_refresh_beta: float):
+        self.max_entries = max_entries
+        self.beta = early_refresh_beta
+        self._l1 = OrderedDict()
+        self._inflight = {}
+        # Invalidações por tag já vistas neste processo (para não gravar um valor
+        # calculado antes de uma invalidação que chegou durante o cálculo).
+        self._tag_epochs = {}
+        self._instance_id = os.urandom(8).hex()
+        self._listener = None
+
+    @property
+    def redis(self):
+        return resources.redis
+
+    # --- Leitura ---
+
+    async def get_or_load(self, key: str, loader, ttl: int, tags=(), family: str = None):
+        """Devolve o valor de `key`, chamando `loader()` (async) só se ele não estiver em cache."""
+        family = family or key.split(":", 1)[0]
+        now = time.time()
+
+        entry = self._l1_get(key, now)
+        result = "l1_hit"
+        if entry is None:
+            raw = await self.redis.get(CACHE_KEY_PREFIX + key)
+            if raw is not None:
+                entry = CacheEntry.from_json(raw)
+                self._l1_put(key, entry)
+                result = "l2_hit"
+
+        if entry is None:
+            record_cache(family, "miss")
+            return await self._load(key, loader, ttl, tags)
+
+        record_cache(family, result)
+        if entry.should_refresh_early(now, self.beta) and key not in self._inflight:
+            # Devolve o valor atual e recalcula em segundo plano.
+            self._start_load(key, loader, ttl, tags)
+        return entry.value
+
+    def _l1_get(self, key, now):
+        entry = self._l1.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= now:
+            del self._l1[key]
+            return None
+        self._l1.move_to_end(key)
+        return entry
+
+    def _l1_put(self, key, entry):
+        self._l1[key] = entry
+        self._l1.move_to_end(key)
+        while len(self._l1) > self.max_entries:
+            self._l1.popitem(last=False)
+
+    # --- Cálculo (single-flight) ---
+
+    def _start_load(self, key, loader, ttl, tags):
+        task = asyncio.ensure_future(self._compute(key, loader, ttl, tags))
+        self._inflight[key] = task
+
+        def done(finished):
+            self._inflight.pop(key, None)
+            if not finished.cancelled():
+                finished.exception()  # evita o aviso de exceção nunca lida em recálculos de fundo
+
+        task.add_done_callback(done)
+        return task
+
+    async def _load(self, key, loader, ttl, tags):
+        task = self._inflight.get(key) or self._start_load(key, loader, ttl, tags)
+        # `shield`: se quem está esperando for cancelado, o cálculo continua para os demais.
+        return await asyncio.shield(task)
+
+    async def _compute(self, key, loader, ttl, tags):
+        epochs = [self._tag_epochs.get(tag, 0) for tag in tags]
+        start = time.perf_counter()
+        value = jsonable_encoder(await loader())
+        entry = CacheEntry(value, time.time() + ttl, time.perf_counter() - start, tags)
+
+        if epochs != [self._tag_epochs.get(tag, 0) for tag in tags]:
+            # Uma tag foi invalidada durante o cálculo: o valor pode estar velho, não guarda.
+            return value
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set(CACHE_KEY_PREFIX + key, entry.to_json(), ex=ttl)
+            for tag in tags:
+                pipe.sadd(TAG_KEY_PREFIX + tag, key)
+                pipe.expire(TAG_KEY_PREFIX + tag, TAG_TTL_SECONDS)
+            await pipe.execute()
+        self._l1_put(key, entry)
+        return value
+
+    # --- Invalidação ---
+
+    async def invalidate_tags(self, *tags: str):
+        """Remove do L1 e do L2 todas as entradas com alguma das tags, em todos os workers."""
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for tag in tags:
+                pipe.smembers(TAG_KEY_PREFIX + tag)
+            members = await pipe.execute()
+        keys = sorted(set().union(*members)) if members else []
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            if keys:
+                pipe.delete(*(CACHE_KEY_PREFIX + key for key in keys))
+            pipe.delete(*(TAG_KEY_PREFIX + tag for tag in tags))
+            pipe.publish(INVALIDATION_CHANNEL, json.dumps(
+                {"origin": self._instance_id, "keys": keys, "tags": list(tags)}))
+            await pipe.execute()
+
+        self._drop_local(keys, tags)
+
+    def _drop_local(self, keys, tags):
+        for tag in tags:
+            self._tag_epochs[tag] = self._tag_epochs.get(tag, 0) + 1
+        for key in keys:
+            self._l1.pop(key, None)
+        if tags:
+            tag_set = set(tags)
+            for key in [k for k, entry in self._l1.items() if tag_set.intersection(entry.tags)]:
+                del self._l1[key]
+
+    # --- Pub/sub entre workers ---
+
+    async def start(self):
+        """Começa a ouvir as invalidações publicadas pelos outros workers (chamado no lifespan)."""
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    async def _listen(self):
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    data = json.loads(message["data"])
+                    if data["origin"] != self._instance_id:
+                        self._drop_local(data["keys"], data["tags"])
+            except redis.ConnectionError as exc:
+                # Sem o canal, o L1 pode ficar velho: limpa tudo e tenta reconectar.
+                print(f"AVISO: canal de invalidação do cache caiu ({exc}). Reconectando...")
+                self._l1.clear()
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+
+response_cache = TwoTierCache(
+    max_entries=settings.CACHE_L1_MAX_ENTRIES,
+    early_refresh_beta=settings.CACHE_EARLY_REFRESH_BETA,
+)
+
+
+def _default_key(kwargs) -> str:
+    """Chave a partir dos parâmetros simples da rota (ids, textos, números), ignorando dependências."""
+    parts = [
+        f"{name}={value}" for name, value in sorted(kwargs.items())
+        if isinstance(value, (str, int, float, bool, ObjectId)) or value is None
+    ]
+    return ":".join(parts)
+
+
+def cached(family: str, ttl: int, tags=(), key=None):
+    """
+    Decorador de rota que guarda a resposta no cache em duas camadas.
+
+        @router.get("/posts/popular")
+        @cached("popular_posts", ttl=300, tags=("posts",))
+        async def get_popular_posts(): ...
+
+    `key` recebe os parâmetros da rota e devolve o sufixo da chave; por padrão, usa os
+    parâmetros simples (ids, textos, números). Para invalidar: `response_cache.invalidate_tags(...)`.
     """
-    return redis_pool
\ No newline at end of file
+    def decorator(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            suffix = key(**kwargs) if key else _default_key(kwargs)
+            cache_key = f"{family}:{suffix}" if suffix else family
+            return await response_cache.get_or_load(
+                cache_key, lambda: endpoint(*args, **kwargs), ttl, tags, family)
+        return wrapper
+    return decorator
@@ -1,5 +1,6 @@
 # app/config.py
 
+from typing import Dict
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -14,6 +15,78 @@ class Settings(BaseSettings):
     NEO4J_USERNAME: str
     NEO4J_PASSWORD: str
 
+    # Motor usado nas recomendações de times:
+    # "gds" -> Neo4j + Graph Data Science (app/gds.py)
+    # "embedded" -> análise em memória com NumPy, sem Neo4j (app/graph_engine.py)
+    RECOMMENDATION_ENGINE: str = "gds"
+    # Por quanto tempo o topo do PageRank global fica em cache (segundos)
+    PAGERANK_CACHE_TTL_SECONDS: int = 300
+    # Por quanto tempo o feed ranqueado de cada time fica em cache (segundos)
+    FEED_CACHE_TTL_SECONDS: int = 60
+
+    # Arquivamento dos posts antigos (app/archive.py): idade, em dias, a partir da qual um
+    # post sai da coleção quente (0 desliga), tamanho dos lotes e intervalo entre as rodadas.
+    POST_ARCHIVE_AFTER_DAYS: int = 0
+    POST_ARCHIVE_BATCH_SIZE: int = 500
+    POST_ARCHIVE_INTERVAL_SECONDS: int = 3600
+    # De quanto em quanto tempo os contadores dos times (app/team_stats.py) são conferidos com a base
+    TEAM_STATS_RECONCILE_INTERVAL_SECONDS: int = 3600
+
+    # Fila de tarefas em segundo plano (app/task_queue.py): tamanho da fila em memória,
+    # quantos workers a consomem, tentativas por tarefa, quanto tempo o encerramento espera
+    # a fila esvaziar e se as tarefas passam por um stream do Redis (sobrevivem a um restart).
+    TASK_QUEUE_MAX_SIZE: int = 1000
+    TASK_QUEUE_WORKERS: int = 4
+    TASK_QUEUE_MAX_ATTEMPTS: int = 3
+    TASK_QUEUE_DRAIN_TIMEOUT_SECONDS: float = 10.0
+    TASK_QUEUE_DURABLE: bool = False
+
+    # Conexões (app/resources.py). Os pools são por processo: com N workers do uvicorn,
+    # cada banco recebe até N × o tamanho do pool.
+    # MongoDB: tamanho máximo do pool, conexões mantidas abertas desde a subida (aquecimento),
+    # quanto uma operação espera por uma conexão livre com o pool cheio, e os tempos para
+    # achar o servidor e abrir uma conexão.
+    MONGO_MAX_POOL_SIZE: int = 100
+    MONGO_MIN_POOL_SIZE: int = 10
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: int = 5000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 5000
+    MONGO_CONNECT_TIMEOUT_MS: int = 5000
+    # Redis: tamanho máximo do pool, quanto um comando espera por uma conexão livre com o
+    # pool cheio, o tempo para abrir uma conexão e quantas são abertas já na subida.
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_POOL_TIMEOUT_SECONDS: float = 5.0
+    REDIS_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    REDIS_WARMUP_CONNECTIONS: int = 4
+    # Neo4j (só com RECOMMENDATION_ENGINE="gds"): tamanho máximo do pool, quanto uma sessão
+    # espera por uma conexão livre e o tempo para abrir uma conexão.
+    NEO4J_MAX_POOL_SIZE: int = 50
+    NEO4J_ACQUISITION_TIMEOUT_SECONDS: float = 10.0
+    NEO4J_CONNECT_TIMEOUT_SECONDS: float = 5.0
+
+    # Cache de respostas (app/cache.py): entradas no L1 (memória de cada worker)
+    # e o "beta" da renovação antecipada (maior = renova mais cedo; 0 desliga).
+    CACHE_L1_MAX_ENTRIES: int = 1024
+    CACHE_EARLY_REFRESH_BETA: float = 1.0
+
+    # Token das rotas de administração (cabeçalho X-Admin-Token, ex.: GET /admin/slow-queries).
+    # Vazio desliga essas rotas.
+    ADMIN_TOKEN: str = ""
+
+    # Log de consultas lentas (app/slow_queries.py):
+    # a partir de quantos ms um comando do MongoDB é considerado lento,
+    # a fração das consultas lentas que tem o plano capturado com explain()
+    # e de quanto em quanto tempo o plano de um mesmo formato de consulta é recapturado.
+    SLOW_QUERY_THRESHOLD_MS: int = 100
+    SLOW_QUERY_EXPLAIN_RATE: float = 0.2
+    SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS: int = 600
+
+    # Rastreamento das requisições (app/tracing.py):
+    # fração das requisições rastreadas (0 desliga), taxas por prefixo de caminho
+    # (JSON no .env, ex.: {"/api/teams/recommendations": 1.0}) e o arquivo de saída.
+    TRACE_SAMPLE_RATE: float = 0.0
+    TRACE_ROUTE_SAMPLE_RATES: Dict[str, float] = {}
+    TRACE_EXPORT_PATH: str = "traces.json"
+
     # Configuração para dizer ao Pydantic onde encontrar o arquivo .env
     model_config = SettingsConfigDict(env_file=".env", extra='ignore')
 
@@ -1,15 +1,19 @@
 # app/db.py
 
-import motor.motor_asyncio
 from beanie import init_beanie
-from .models import Team, Player, Post, Scrim
+from .models import Team, Player, Post, ArchivedPost, Scrim, TeamStats, ScrimPairSummary
 from .config import settings
+from .resources import resources
+from .tracing import instrument_beanie
 
 async def init_db():
     """
     Inicializa a conexão com o banco de dados e registra os modelos de Documento.
     """
-    client = motor.motor_asyncio.AsyncIOMotorClient(settings.MONGODB_URI)
+    # O cliente (e o pool de conexões) é o de app/resources.py, compartilhado pela aplicação inteira.
+    client = resources.mongo
+    # Os carregamentos de Link (fetch_link) também aparecem como spans nos traces.
+    instrument_beanie()
     database = client[settings.DATABASE_NAME]
 
     # A função init_beanie agora lê a `class Settings` de cada modelo
@@ -20,7 +24,10 @@ async def init_db():
             Team,
             Player,
             Post,
-            Scrim
+            ArchivedPost,
+            Scrim,
+            TeamStats,
+            ScrimPairSummary
         ]
     )
     
@@ -0,0 +1,160 @@
+# app/feed.py
+"""
+Feed inicial personalizado e ranqueado de cada time.
+
+1. Candidatos (leituras projetadas e limitadas, em paralelo):
+   - os posts mais novos dos amigos;
+   - entre os posts mais novos da plataforma, os com mais likes;
+   - os posts mais novos de times do mesmo jogo principal;
+   - os posts do próprio time.
+   Cada candidato traz só autor, data e as contagens de likes e comentários.
+2. Ranking: todos os candidatos (alguns milhares) são pontuados de uma vez, com NumPy:
+       recência (meia-vida de FEED_RECENCY_HALF_LIFE_HOURS)
+     + velocidade de likes (likes / idade^FEED_LIKE_GRAVITY, como no Hacker News)
+     + conversa (log do número de comentários)
+     + afinidade do autor na rede de amizades (PageRank personalizado, calculado pelo motor
+       de RECOMMENDATION_ENGINE: app/gds.py ou app/graph_engine.py)
+     + mesmo jogo principal
+3. A lista ranqueada (só ids e scores) fica no cache em duas camadas por
+   FEED_CACHE_TTL_SECONDS, por time; as páginas do feed são fatias dela. Um post novo do
+   próprio time invalida o feed dele (tag "feed:<id>").
+"""
+import asyncio
+import datetime
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from . import gds, graph_engine, tracing
+from .cache import response_cache
+from .config import settings
+from .models import Post, Team
+
+# Limites de cada fonte de candidatos.
+FEED_FRIEND_CANDIDATES = 1500
+FEED_POPULAR_SCAN = 3000        # posts mais novos examinados para achar os populares
+FEED_POPULAR_CANDIDATES = 500
+FEED_GAME_TEAMS = 500           # times do mesmo jogo considerados
+FEED_GAME_CANDIDATES = 1000
+FEED_OWN_CANDIDATES = 50
+# Tamanho da lista ranqueada guardada no cache (o fim do feed).
+FEED_SIZE = 500
+
+# Pesos e escalas do ranking.
+FEED_WEIGHT_RECENCY = 0.35
+FEED_WEIGHT_LIKE_VELOCITY = 0.2
+FEED_WEIGHT_COMMENTS = 0.1
+FEED_WEIGHT_AFFINITY = 0.25
+FEED_WEIGHT_SAME_GAME = 0.1
+FEED_RECENCY_HALF_LIFE_HOURS = 48
+FEED_LIKE_GRAVITY = 1.5
+
+# Motor que calcula a afinidade (o mesmo das recomendações, ver app/routes.py).
+affinity_engine = graph_engine if settings.RECOMMENDATION_ENGINE == "embedded" else gds
+
+_CANDIDATE_PROJECTION = {
+    "author": 1,
+    "created_at": 1,
+    "likes_count": {"$size": "$likes"},
+    "comments_count": {"$size": "$comments"},
+}
+
+
+async def _candidates(match: dict, limit: int, top_liked: int = None) -> List[dict]:
+    pipeline = [{"$match": match}, {"$sort": {"created_at": -1}}, {"$limit": limit},
+                {"$project": _CANDIDATE_PROJECTION}]
+    if top_liked:
+        pipeline += [{"$sort": {"likes_count": -1}}, {"$limit": top_liked}]
+    return await Post.get_motor_collection().aggregate(pipeline).to_list(None)
+
+
+async def _same_game_candidates(team_id, main_game) -> Tuple[List[dict], set]:
+    if not main_game:
+        return [], set()
+    teams = await Team.get_motor_collection().find(
+        {"main_game": main_game, "_id": {"$ne": team_id}}, {"_id": 1}
+    ).limit(FEED_GAME_TEAMS).to_list(None)
+    author_ids = [team["_id"] for team in teams]
+    if not author_ids:
+        return [], set()
+    posts = await _candidates({"author.$id": {"$in": author_ids}}, FEED_GAME_CANDIDATES)
+    return posts, {str(author_id) for author_id in author_ids}
+
+
+async def gather_candidates(team_id) -> Tuple[List[dict], Dict[str, float], set]:
+    """Candidatos (sem repetição), a afinidade de cada autor e os autores do mesmo jogo."""
+    team = await Team.get_motor_collection().find_one({"_id": team_id}, {"main_game": 1, "friends": 1})
+    if team is None:
+        return [], {}, set()
+    friend_ids = [ref.id for ref in team.get("friends", [])]
+
+    friends, popular, (same_game, game_authors), own, affinity = await asyncio.gather(
+        _candidates({"author.$id": {"$in": friend_ids}}, FEED_FRIEND_CANDIDATES),
+        _candidates({}, FEED_POPULAR_SCAN, top_liked=FEED_POPULAR_CANDIDATES),
+        _same_game_candidates(team_id, team.get("main_game")),
+        _candidates({"author.$id": team_id}, FEED_OWN_CANDIDATES),
+        affinity_engine.get_affinity(str(team_id)),
+    )
+
+    unique = {}
+    for post in (*friends, *popular, *same_game, *own):
+        unique.setdefault(post["_id"], post)
+    # O próprio time é o autor mais "próximo".
+    affinity = {**affinity, str(team_id): 1.0}
+    return list(unique.values()), affinity, game_authors
+
+
+def rank(candidates: List[dict], affinity: Dict[str, float], game_authors: set,
+         now: float) -> List[Tuple[str, float]]:
+    """Pontua todos os candidatos de uma vez e devolve (id, score) do melhor ao pior."""
+    if not candidates:
+        return []
+    count = len(candidates)
+    authors = [str(post["author"].id) for post in candidates]
+    created = np.fromiter((_timestamp(post["created_at"]) for post in candidates), dtype=np.float64, count=count)
+    likes = np.fromiter((post["likes_count"] for post in candidates), dtype=np.float64, count=count)
+    comments = np.fromiter((post["comments_count"] for post in candidates), dtype=np.float64, count=count)
+    author_affinity = np.fromiter((affinity.get(author, 0.0) for author in authors), dtype=np.float64, count=count)
+    same_game = np.fromiter((author in game_authors for author in authors), dtype=np.float64, count=count)
+
+    age_hours = np.maximum(now - created, 0.0) / 3600
+    recency = np.exp2(-age_hours / FEED_RECENCY_HALF_LIFE_HOURS)
+    velocity = likes / np.power(age_hours + 2, FEED_LIKE_GRAVITY)
+    discussion = np.log1p(comments)
+
+    score = (FEED_WEIGHT_RECENCY * recency
+             + FEED_WEIGHT_LIKE_VELOCITY * _scaled(velocity)
+             + FEED_WEIGHT_COMMENTS * _scaled(discussion)
+             + FEED_WEIGHT_AFFINITY * author_affinity
+             + FEED_WEIGHT_SAME_GAME * same_game)
+
+    order = np.argsort(-score, kind="stable")[:FEED_SIZE]
+    return [(str(candidates[i]["_id"]), round(float(score[i]), 6)) for i in order]
+
+
+def _scaled(values: np.ndarray) -> np.ndarray:
+    """Divide pelo maior valor (0..1); tudo zero continua zero."""
+    top = values.max()
+    return values / top if top > 0 else values
+
+
+def _timestamp(value: datetime.datetime) -> float:
+    # O MongoDB devolve datas sem fuso (em UTC).
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.UTC)
+    return value.timestamp()
+
+
+async def build_feed(team_id) -> List[Tuple[str, float]]:
+    """Feed ranqueado do time, calculado agora (sem cache)."""
+    candidates, affinity, game_authors = await gather_candidates(team_id)
+    with tracing.span("feed.rank", candidates=len(candidates)):
+        return rank(candidates, affinity, game_authors, datetime.datetime.now(datetime.UTC).timestamp())
+
+
+async def get_feed(team_id) -> List[Tuple[str, float]]:
+    """Feed ranqueado do time, do cache quando possível."""
+    return await response_cache.get_or_load(
+        f"home_feed:team={team_id}", lambda: build_feed(team_id),
+        ttl=settings.FEED_CACHE_TTL_SECONDS, tags=(f"feed:{team_id}",), family="home_feed",
+    )
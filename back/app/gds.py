@@ -1,98 +1,172 @@
-from neo4j import AsyncGraphDatabase
 from .config import settings
-from typing import List, Dict
+from .cache import response_cache
+from .metrics import track_neo4j
+from .resources import resources
+from .graph_engine import affinity_scores, push_personalized_pagerank, PAGERANK_TOP_SIZE
+from typing import List, Dict, Optional
 
 # Nome que daremos ao nosso grafo projetado na memória do GDS
 FRIENDSHIP_GRAPH_NAME = "friendship-graph"
 
-async def get_similar_teams(team_id: str) -> List[Dict]:
+# Restrição de unicidade (que também cria um índice) em :Team(id).
+# Sem ela, todo `MATCH (t:Team {id: ...})` varre todos os nós do grafo.
+TEAM_ID_CONSTRAINT = "CREATE CONSTRAINT team_id IF NOT EXISTS FOR (t:Team) REQUIRE t.id IS UNIQUE"
+
+# Chave do cache onde fica o topo do PageRank global (já ordenado).
+PAGERANK_CACHE_KEY = "pagerank:top"
+
+# Consulta de similaridade restrita ao time solicitante.
+# Em vez de calcular o Jaccard de TODOS os pares do grafo (gds.nodeSimilarity.stream)
+# e descartar quase tudo, partimos do próprio time e caminhamos só 2 saltos:
+# time -> amigos -> amigos dos amigos. O custo depende do grau local, não do tamanho do grafo.
+# Jaccard(a, b) = |amigos em comum| / (|amigos de a| + |amigos de b| - |amigos em comum|)
+SIMILAR_TEAMS_QUERY = """
+    MATCH (me:Team {id: $team_id})-[:AMIGO_DE]->(friend:Team)<-[:AMIGO_DE]-(other:Team)
+    WHERE other <> me AND NOT EXISTS { (me)-[:AMIGO_DE]->(other) }
+    WITH me, other, count(DISTINCT friend) AS common
+    WITH other, common,
+         COUNT { (me)-[:AMIGO_DE]->() } AS my_degree,
+         COUNT { (other)-[:AMIGO_DE]->() } AS other_degree
+    RETURN
+        other.id AS id,
+        other.name AS team_name,
+        other.game AS main_game,
+        toFloat(common) / (my_degree + other_degree - common) AS similarity
+    ORDER BY similarity DESC
+    LIMIT $limit
+"""
+
+
+async def upsert_team(team_id: str, team_name: str, main_game: Optional[str] = None):
+    """Mesma interface de `graph_engine.upsert_team`. Nada a fazer: o Neo4j é alimentado pelo mongo_to_neo4j."""
+
+
+async def add_friendship(team1_id: str, team2_id: str):
+    """Mesma interface de `graph_engine.add_friendship`. Nada a fazer: o Neo4j é alimentado pelo mongo_to_neo4j."""
+
+
+async def get_similar_teams(team_id: str, limit: int = 5) -> List[Dict]:
+    """
+    Encontra times similares a um time específico com base em amigos em comum
+    (similaridade de Jaccard, a mesma métrica do Node Similarity da GDS).
+    A busca parte apenas do time solicitante, sem projetar o grafo inteiro.
+    """
+    # A sessão usa uma conexão do pool do driver compartilhado (app/resources.py).
+    async with resources.neo4j.session() as session, track_neo4j("similar_teams"):
+        result = await session.run(SIMILAR_TEAMS_QUERY, team_id=team_id, limit=limit)
+        recommendations = [record.data() async for record in result]
+        return recommendations
+
+
+# Vizinhança de até 2 saltos de um time, com a lista de amigos de cada nó.
+# É o subgrafo sobre o qual o PageRank personalizado é aproximado localmente.
+LOCAL_NEIGHBORHOOD_QUERY = """
+    MATCH (me:Team {id: $team_id})-[:AMIGO_DE*0..2]->(n:Team)
+    WITH DISTINCT n
+    LIMIT $max_nodes
+    OPTIONAL MATCH (n)-[:AMIGO_DE]->(m:Team)
+    RETURN n.id AS id, n.name AS team_name, n.game AS main_game, collect(m.id) AS friends
+"""
+
+
+async def _local_neighborhood(team_id: str, max_nodes: int) -> List[Dict]:
+    async with resources.neo4j.session() as session, track_neo4j("local_neighborhood"):
+        result = await session.run(LOCAL_NEIGHBORHOOD_QUERY, team_id=team_id, max_nodes=max_nodes)
+        return [record.data() async for record in result]
+
+
+async def get_personalized_teams(team_id: str, limit: int = 5, max_nodes: int = 5000) -> List[Dict]:
     """
-    Usa o algoritmo Node Similarity (Jaccard) da GDS Library para encontrar
-    times similares a um time específico, com base em amigos em comum.
+    Recomendações por PageRank personalizado, com o time e seus amigos como sementes.
+    Busca só a vizinhança de 2 saltos no Neo4j e aproxima o PPR localmente (push),
+    sem projetar nem percorrer o grafo inteiro.
     """
-    driver = AsyncGraphDatabase.driver(
-        settings.NEO4J_URI,
-        auth=(settings.NEO4J_USERNAME, settings.NEO4J_PASSWORD)
+    rows = await _local_neighborhood(team_id, max_nodes)
+    neighbors = {row["id"]: row["friends"] for row in rows}
+    if team_id not in neighbors:
+        return []
+    friends = set(neighbors[team_id])
+    scores = push_personalized_pagerank(neighbors, [team_id, *friends])
+
+    info = {row["id"]: row for row in rows}
+    ranked = sorted(
+        ((score, other_id) for other_id, score in scores.items()
+         if other_id != team_id and other_id not in friends and other_id in info),
+        reverse=True
     )
-    
-    async with driver.session() as session:
-        try:
-            # Etapa 1: Projetar o Grafo na memória do GDS
-            await session.run(f"""
-                CALL gds.graph.project(
-                    '{FRIENDSHIP_GRAPH_NAME}',
-                    'Team', 
-                    'AMIGO_DE'
-                )
-            """)
-
-            # Etapa 2: Executar o Algoritmo de Similaridade
-            result = await session.run(f"""
-                CALL gds.nodeSimilarity.stream('{FRIENDSHIP_GRAPH_NAME}')
-                YIELD node1, node2, similarity
-                WITH gds.util.asNode(node1) AS team1, gds.util.asNode(node2) AS team2, similarity
-                WHERE team1.id = $team_id AND NOT EXISTS((team1)-[:AMIGO_DE]->(team2))
-                RETURN 
-                    team2.id AS id, 
-                    team2.name AS team_name, 
-                    team2.game AS main_game,
-                    similarity
-                ORDER BY similarity DESC
-                LIMIT 5
-            """, team_id=team_id)
-            
-            # Etapa 3: Coletar e Formatar os Resultados
-            recommendations = [record.data() async for record in result]
-            return recommendations
+    return [
+        {
+            "id": other_id,
+            "team_name": info[other_id]["team_name"],
+            "main_game": info[other_id]["main_game"],
+            "score": score,
+        }
+        for score, other_id in ranked[:limit]
+    ]
 
-        finally:
-            # Etapa 4: Limpeza (remove o grafo da memória)
-            await session.run(f"CALL gds.graph.drop('{FRIENDSHIP_GRAPH_NAME}', false)")
-            await driver.close()
+
+async def get_affinity(team_id: str, max_nodes: int = 5000) -> Dict[str, float]:
+    """
+    Proximidade dos outros times ao time na rede de amizades (usada no ranking do feed).
+    Mesmo cálculo de `graph_engine.get_affinity`, sobre a vizinhança de 2 saltos no Neo4j.
+    """
+    rows = await _local_neighborhood(team_id, max_nodes)
+    return affinity_scores({row["id"]: row["friends"] for row in rows}, team_id)
 
 
 async def get_top_teams_by_pagerank(current_team_id: str) -> List[Dict]:
     """
-    Usa o algoritmo PageRank da GDS para encontrar os times mais influentes
-    na rede de amizades, excluindo o próprio time.
+    Retorna os times mais influentes na rede de amizades (PageRank), excluindo o próprio time.
+    O topo do ranking global é o mesmo para todos, então fica no Redis por
+    PAGERANK_CACHE_TTL_SECONDS e a maioria das chamadas é só uma leitura.
     """
-    driver = AsyncGraphDatabase.driver(
-        settings.NEO4J_URI,
-        auth=(settings.NEO4J_USERNAME, settings.NEO4J_PASSWORD)
+    # Single-flight e renovação antecipada do cache evitam vários cálculos na GDS ao mesmo tempo.
+    top_teams = await response_cache.get_or_load(
+        PAGERANK_CACHE_KEY,
+        lambda: compute_global_pagerank(PAGERANK_TOP_SIZE),
+        ttl=settings.PAGERANK_CACHE_TTL_SECONDS,
     )
-    
-    async with driver.session() as session:
+
+    return [team for team in top_teams if team["id"] != current_team_id][:5]
+
+
+async def compute_global_pagerank(limit: int) -> List[Dict]:
+    """
+    Usa o algoritmo PageRank da GDS para encontrar os `limit` times mais influentes
+    na rede de amizades.
+    """
+    async with resources.neo4j.session() as session:
         try:
             # Etapa 1: Projetar o mesmo grafo de amizades que usamos antes.
-            await session.run(f"""
-                CALL gds.graph.project(
-                    '{FRIENDSHIP_GRAPH_NAME}',
-                    'Team', 
-                    'AMIGO_DE'
-                )
-            """)
+            async with track_neo4j("graph_project"):
+                await session.run(f"""
+                    CALL gds.graph.project(
+                        '{FRIENDSHIP_GRAPH_NAME}',
+                        'Team', 
+                        'AMIGO_DE'
+                    )
+                """)
 
             # Etapa 2: Executar o Algoritmo PageRank.
             # Ele calcula um "score" de influência para cada time.
-            result = await session.run(f"""
-                CALL gds.pageRank.stream('{FRIENDSHIP_GRAPH_NAME}')
-                YIELD nodeId, score
-                WITH gds.util.asNode(nodeId) AS team, score
-                // Filtra para não recomendar o próprio time
-                WHERE team.id <> $current_team_id
-                RETURN
-                    team.id as id,
-                    team.name as team_name,
-                    team.game as main_game,
-                    score
-                ORDER BY score DESC
-                LIMIT 5
-            """, current_team_id=current_team_id)
-            
-            recommendations = [record.data() async for record in result]
+            async with track_neo4j("pagerank"):
+                result = await session.run(f"""
+                    CALL gds.pageRank.stream('{FRIENDSHIP_GRAPH_NAME}')
+                    YIELD nodeId, score
+                    WITH gds.util.asNode(nodeId) AS team, score
+                    RETURN
+                        team.id as id,
+                        team.name as team_name,
+                        team.game as main_game,
+                        score
+                    ORDER BY score DESC
+                    LIMIT $limit
+                """, limit=limit)
+                
+                recommendations = [record.data() async for record in result]
             return recommendations
 
         finally:
             # Etapa 3: Limpeza.
-            await session.run(f"CALL gds.graph.drop('{FRIENDSHIP_GRAPH_NAME}', false)")
-            await driver.close()
\ No newline at end of file
+            async with track_neo4j("graph_drop"):
+                await session.run(f"CALL gds.graph.drop('{FRIENDSHIP_GRAPH_NAME}', false)")
\ No newline at end of file
@@ -0,0 +1,491 @@
+# app/graph_engine.py
+"""
+Motor de análise de grafos embutido (em processo), alternativo ao Neo4j GDS (app/gds.py).
+
+Para o tamanho do nosso grafo, a ida e volta até o Neo4j custa mais do que a conta em si.
+Aqui a rede de amizades é lida do MongoDB (campo `Team.friends`) e guardada em memória
+como uma matriz de adjacência esparsa no formato CSR (Compressed Sparse Row):
+
+- `indptr[i]:indptr[i+1]` delimita, dentro de `indices`, os amigos do time i.
+
+Sobre essa matriz calculamos:
+- Similaridade de Jaccard (linha do time em A·Aᵀ = amigos em comum com cada outro time).
+- PageRank por iteração de potência vetorizada com NumPy.
+- PageRank personalizado local (algoritmo de "push"), que só visita a vizinhança do time.
+
+As alterações feitas neste processo (novo time, nova amizade, perfil atualizado) são
+aplicadas no dicionário de adjacência e na CSR já construída (inserção vetorizada com NumPy,
+sem reconstruir a matriz); o PageRank recomeça a partir do vetor anterior, convergindo em
+poucas iterações.
+
+Com vários workers, cada processo tem a sua cópia do grafo. Toda alteração também incrementa
+um contador de versão no Redis (GRAPH_VERSION_KEY); antes de cada uso o processo compara esse
+contador com a versão que ele leu e, se outro worker mudou o grafo, relê tudo do MongoDB em
+segundo plano (as requisições continuam usando a cópia atual até a nova ficar pronta). Mudanças
+que não passam pela API (populate, restore do banco) são vistas na releitura periódica
+(GRAPH_MAX_AGE_SECONDS).
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+import redis.asyncio as redis
+
+from .resources import resources
+from .models import Team
+
+# Parâmetros do PageRank personalizado:
+# PPR_ALPHA é a probabilidade de "teletransporte" de volta às sementes (1 - damping).
+# PPR_EPSILON controla a precisão: quanto menor, mais nós são visitados.
+PPR_ALPHA = 0.15
+PPR_EPSILON = 1e-4
+
+# Quantos times do topo do PageRank global ficam guardados, já ordenados.
+PAGERANK_TOP_SIZE = 50
+
+# Contador incrementado a cada alteração no grafo, por qualquer worker.
+GRAPH_VERSION_KEY = "graph:friendships:version"
+# Mesmo sem alterações avisadas pelo Redis, o grafo é relido do MongoDB depois deste tempo.
+GRAPH_MAX_AGE_SECONDS = 600
+
+
+def push_personalized_pagerank(
+    neighbors: Dict[str, Iterable[str]],
+    seeds: Iterable[str],
+    alpha: float = PPR_ALPHA,
+    epsilon: float = PPR_EPSILON,
+) -> Dict[str, float]:
+    """
+    Aproximação local do PageRank personalizado (push de Andersen-Chung-Lang).
+
+    Começa com toda a massa ("resíduo") distribuída entre as sementes e, enquanto algum
+    nó tiver resíduo/grau >= epsilon, guarda alpha do resíduo como score do nó e empurra
+    o restante para os vizinhos. Só os nós alcançados pelo empurrão são tocados, então o
+    custo é limitado por 1/(alpha·epsilon), não pelo tamanho do grafo.
+
+    Nós ausentes de `neighbors` (borda de um subgrafo parcial) apenas acumulam resíduo.
+    """
+    seeds = list(dict.fromkeys(seeds))
+    if not seeds:
+        return {}
+
+    scores: Dict[str, float] = {}
+    residual: Dict[str, float] = {seed: 1.0 / len(seeds) for seed in seeds}
+    queue = deque(seeds)
+    queued = set(seeds)
+
+    while queue:
+        node = queue.popleft()
+        queued.discard(node)
+        if node not in neighbors:
+            continue
+        node_neighbors = list(neighbors[node])
+        mass = residual.get(node, 0.0)
+        degree = len(node_neighbors)
+        if mass < epsilon * max(degree, 1):
+            continue
+
+        scores[node] = scores.get(node, 0.0) + alpha * mass
+        residual[node] = 0.0
+        if degree == 0:
+            continue
+        share = (1 - alpha) * mass / degree
+        for neighbor in node_neighbors:
+            residual[neighbor] = residual.get(neighbor, 0.0) + share
+            if neighbor not in queued and neighbor in neighbors:
+                if residual[neighbor] >= epsilon * max(len(neighbors[neighbor]), 1):
+                    queue.append(neighbor)
+                    queued.add(neighbor)
+
+    return scores
+
+
+def affinity_scores(neighbors: Dict[str, Iterable[str]], team_id: str) -> Dict[str, float]:
+    """
+    Proximidade de cada time ao `team_id` na rede de amizades: PageRank personalizado
+    local com o próprio time como semente, dividido pelo maior valor (o mais próximo vale 1).
+    Times fora da vizinhança alcançada ficam de fora (proximidade 0).
+    """
+    scores = push_personalized_pagerank(neighbors, [team_id])
+    scores.pop(team_id, None)
+    top = max(scores.values(), default=0.0)
+    if top == 0:
+        return {}
+    return {other_id: score / top for other_id, score in scores.items()}
+
+
+class FriendshipGraph:
+    """Grafo de amizades em memória, com CSR e resultados cacheados por versão."""
+
+    def __init__(self):
+        # Fonte da verdade: id do time -> ids dos amigos (arestas direcionadas, como no Neo4j).
+        self._adjacency: Dict[str, Set[str]] = {}
+        # Dados exibidos nas recomendações: id do time -> {"team_name", "main_game"}.
+        self._info: Dict[str, Dict] = {}
+        self._version = 0
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+        # Versão do contador no Redis que esta cópia já reflete, quando ela foi lida e a releitura em curso.
+        self._synced_version = 0
+        self._loaded_at = 0.0
+        self._reload_task = None
+
+        # Estruturas derivadas (reconstruídas quando a versão muda).
+        self._csr_version = -1
+        self._ids: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._indices = np.zeros(0, dtype=np.int64)
+
+        self._pagerank: Optional[np.ndarray] = None
+        self._pagerank_ids: List[str] = []
+        self._pagerank_version = -1
+        self._pagerank_top: List[int] = []
+        self._similarity_cache: Dict[str, tuple] = {}
+
+    @property
+    def version(self) -> int:
+        """Número que muda a cada alteração no grafo (útil como chave de cache)."""
+        return self._version
+
+    # -------------------------------------------------------------------------
+    # Carga e atualizações incrementais
+    # -------------------------------------------------------------------------
+
+    @property
+    def redis(self):
+        return resources.redis
+
+    async def ensure_loaded(self):
+        """
+        Carrega o grafo do MongoDB na primeira utilização. Depois, se outro worker alterou o
+        grafo (ou a cópia passou de GRAPH_MAX_AGE_SECONDS), agenda a releitura em segundo plano.
+        """
+        if not self._loaded:
+            async with self._load_lock:
+                if not self._loaded:
+                    await self.load()
+            return
+        if self._reload_task is None and await self._is_stale():
+            self._reload_task = asyncio.create_task(self._reload())
+
+    async def _is_stale(self) -> bool:
+        if time.monotonic() - self._loaded_at > GRAPH_MAX_AGE_SECONDS:
+            return True
+        try:
+            return int(await self.redis.get(GRAPH_VERSION_KEY) or 0) != self._synced_version
+        except redis.RedisError:
+            # Sem o Redis, segue com a cópia atual até a releitura periódica.
+            return False
+
+    async def _reload(self):
+        try:
+            async with self._load_lock:
+                await self.load()
+        except Exception as exc:
+            print(f"AVISO: falha ao reler o grafo de amizades ({exc}). Nova tentativa no próximo uso.")
+        finally:
+            self._reload_task = None
+
+    async def _publish_change(self):
+        """Avisa os outros workers de uma alteração já aplicada nesta cópia."""
+        try:
+            version = await self.redis.incr(GRAPH_VERSION_KEY)
+        except redis.RedisError as exc:
+            print(f"AVISO: falha ao publicar a versão do grafo de amizades ({exc}).")
+            return
+        # Se ninguém mais mudou o grafo desde a nossa versão, a cópia continua em dia.
+        if version == self._synced_version + 1:
+            self._synced_version = version
+
+    async def load(self):
+        """(Re)lê todos os times do MongoDB, trazendo só os campos necessários."""
+        # A versão é lida antes dos times: uma alteração no meio da leitura força outra releitura.
+        try:
+            version = int(await self.redis.get(GRAPH_VERSION_KEY) or 0)
+        except redis.RedisError:
+            version = self._synced_version
+        adjacency: Dict[str, Set[str]] = {}
+        info: Dict[str, Dict] = {}
+        cursor = Team.get_motor_collection().find(
+            {}, {"team_name": 1, "main_game": 1, "friends": 1}
+        )
+        async for doc in cursor:
+            team_id = str(doc["_id"])
+            # Os Links do Beanie são gravados como DBRef; só precisamos do id.
+            adjacency[team_id] = {str(ref.id) for ref in doc.get("friends", [])}
+            info[team_id] = {"team_name": doc.get("team_name"), "main_game": doc.get("main_game")}
+
+        self._adjacency = adjacency
+        self._info = info
+        self._loaded = True
+        self._synced_version = version
+        self._loaded_at = time.monotonic()
+        self._bump()
+
+    async def upsert_team(self, team_id: str, team_name: str, main_game: Optional[str] = None):
+        """Registra um time novo ou atualiza os dados exibidos de um time existente."""
+        if self._loaded:
+            main_game = getattr(main_game, "value", main_game)
+            self._info[team_id] = {"team_name": team_name, "main_game": main_game}
+            if team_id not in self._adjacency:
+                csr_current = self._csr_version == self._version
+                self._adjacency[team_id] = set()
+                self._bump()
+                if csr_current:
+                    self._csr_add_node(team_id)
+                    self._csr_version = self._version
+            else:
+                self._similarity_cache.clear()
+        await self._publish_change()
+
+    async def add_friendship(self, team1_id: str, team2_id: str):
+        """Adiciona uma amizade (nos dois sentidos, como em `accept_friend_request`)."""
+        if self._loaded:
+            # dict.fromkeys: com team1 == team2 as duas direções são a mesma aresta.
+            new_edges = [
+                (source, target) for source, target in dict.fromkeys(((team1_id, team2_id), (team2_id, team1_id)))
+                if target not in self._adjacency.get(source, ())
+            ]
+            if new_edges:
+                csr_current = self._csr_version == self._version
+                for source, target in new_edges:
+                    self._adjacency.setdefault(source, set()).add(target)
+                self._bump()
+                if csr_current:
+                    for source, target in new_edges:
+                        self._csr_add_edge(source, target)
+                    self._csr_version = self._version
+        await self._publish_change()
+
+    def _bump(self):
+        self._version += 1
+        self._similarity_cache.clear()
+
+    def _csr_add_node(self, team_id: str):
+        """Acrescenta uma linha vazia à CSR já construída."""
+        self._index[team_id] = len(self._ids)
+        self._ids.append(team_id)
+        self._indptr = np.append(self._indptr, self._indptr[-1])
+
+    def _csr_add_edge(self, source: str, target: str):
+        """Insere uma aresta na CSR já construída: uma cópia vetorizada dos arrays, sem laço Python."""
+        for team_id in (source, target):
+            if team_id not in self._index:
+                self._csr_add_node(team_id)
+        row = self._index[source]
+        self._indices = np.insert(self._indices, self._indptr[row + 1], self._index[target])
+        self._indptr = self._indptr.copy()
+        self._indptr[row + 1:] += 1
+
+    def _ensure_csr(self):
+        """Reconstrói a matriz CSR inteira (carga e releituras; as alterações locais são incrementais)."""
+        if self._csr_version == self._version:
+            return
+        ids = list(self._adjacency.keys())
+        index = {team_id: i for i, team_id in enumerate(ids)}
+
+        degrees = np.fromiter(
+            (sum(1 for f in self._adjacency[t] if f in index) for t in ids),
+            dtype=np.int64, count=len(ids)
+        )
+        indptr = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(degrees, out=indptr[1:])
+        indices = np.fromiter(
+            (index[f] for t in ids for f in self._adjacency[t] if f in index),
+            dtype=np.int64, count=int(indptr[-1])
+        )
+
+        self._ids, self._index = ids, index
+        self._indptr, self._indices = indptr, indices
+        self._csr_version = self._version
+
+    # -------------------------------------------------------------------------
+    # Algoritmos
+    # -------------------------------------------------------------------------
+
+    def similar_teams(self, team_id: str, limit: int = 5) -> List[Dict]:
+        """
+        Similaridade de Jaccard entre `team_id` e os demais times, via produto esparso:
+        a linha do time em A·Aᵀ dá o número de amigos em comum com cada outro time.
+        Só a vizinhança de 2 saltos é tocada.
+        """
+        cached = self._similarity_cache.get(team_id)
+        if cached and cached[0] == self._version and cached[1] >= limit:
+            return cached[2][:limit]
+
+        self._ensure_csr()
+        source = self._index.get(team_id)
+        if source is None:
+            return []
+
+        indptr, indices = self._indptr, self._indices
+        friends = indices[indptr[source]:indptr[source + 1]]
+        if friends.size == 0:
+            return []
+
+        # Junta (sem laço Python) as listas de amigos de cada amigo: A[source]·Aᵀ.
+        starts = indptr[friends]
+        lengths = indptr[friends + 1] - starts
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        friends_of_friends = indices[np.arange(lengths.sum()) + offsets]
+
+        candidates, common = np.unique(friends_of_friends, return_counts=True)
+        # Remove o próprio time e quem já é amigo.
+        keep = (candidates != source) & ~np.isin(candidates, friends)
+        candidates, common = candidates[keep], common[keep]
+        if candidates.size == 0:
+            return []
+
+        degrees = np.diff(indptr)
+        similarity = common / (degrees[source] + degrees[candidates] - common)
+
+        top = min(limit, candidates.size)
+        best = np.argpartition(-similarity, top - 1)[:top]
+        best = best[np.argsort(-similarity[best], kind="stable")]
+
+        results = []
+        for i in best:
+            other_id = self._ids[candidates[i]]
+            info = self._info.get(other_id, {})
+            results.append({
+                "id": other_id,
+                "team_name": info.get("team_name"),
+                "main_game": info.get("main_game"),
+                "similarity": float(similarity[i]),
+            })
+        self._similarity_cache[team_id] = (self._version, limit, results)
+        return results
+
+    def pagerank(self, damping: float = 0.85, tolerance: float = 1e-6, max_iterations: int = 100) -> np.ndarray:
+        """
+        PageRank por iteração de potência vetorizada.
+        O resultado fica em memória até o grafo mudar; depois de uma mudança, a
+        iteração recomeça do vetor anterior (warm start) em vez do vetor uniforme.
+        """
+        if self._pagerank is not None and self._pagerank_version == self._version:
+            return self._pagerank
+
+        self._ensure_csr()
+        n = len(self._ids)
+        if n == 0:
+            return np.zeros(0)
+
+        out_degree = np.diff(self._indptr)
+        sources = np.repeat(np.arange(n), out_degree)
+        inverse_degree = np.divide(1.0, out_degree, out=np.zeros(n), where=out_degree > 0)
+        dangling = out_degree == 0
+
+        scores = np.full(n, 1.0 / n)
+        if self._pagerank is not None:
+            previous = dict(zip(self._pagerank_ids, self._pagerank))
+            warm = np.fromiter((previous.get(t, 1.0 / n) for t in self._ids), dtype=np.float64, count=n)
+            scores = warm / warm.sum()
+
+        for _ in range(max_iterations):
+            incoming = np.bincount(self._indices, weights=(scores * inverse_degree)[sources], minlength=n)
+            new_scores = (1 - damping) / n + damping * (incoming + scores[dangling].sum() / n)
+            converged = np.abs(new_scores - scores).sum() < tolerance
+            scores = new_scores
+            if converged:
+                break
+
+        # Guarda o topo já ordenado: o fallback de popularidade vira uma leitura direta.
+        top = min(PAGERANK_TOP_SIZE, n)
+        best = np.argpartition(-scores, top - 1)[:top]
+        self._pagerank_top = best[np.argsort(-scores[best], kind="stable")].tolist()
+
+        self._pagerank = scores
+        self._pagerank_ids = list(self._ids)
+        self._pagerank_version = self._version
+        return scores
+
+    def top_by_pagerank(self, exclude_id: Optional[str] = None, limit: int = 5) -> List[Dict]:
+        """Os `limit` times com maior PageRank, excluindo `exclude_id`."""
+        scores = self.pagerank()
+        if scores.size == 0:
+            return []
+
+        results = []
+        for i in self._pagerank_top[:limit + 1]:
+            team_id = self._pagerank_ids[i]
+            if team_id == exclude_id:
+                continue
+            info = self._info.get(team_id, {})
+            results.append({
+                "id": team_id,
+                "team_name": info.get("team_name"),
+                "main_game": info.get("main_game"),
+                "score": float(scores[i]),
+            })
+        return results[:limit]
+
+    def personalized_teams(self, team_id: str, limit: int = 5) -> List[Dict]:
+        """
+        Recomendações por PageRank personalizado, com o próprio time e seus amigos como
+        sementes. Exclui o time e quem já é amigo dele.
+        """
+        friends = self._adjacency.get(team_id)
+        if friends is None:
+            return []
+        scores = push_personalized_pagerank(self._adjacency, [team_id, *friends])
+
+        ranked = sorted(
+            ((score, other_id) for other_id, score in scores.items()
+             if other_id != team_id and other_id not in friends),
+            reverse=True
+        )
+        results = []
+        for score, other_id in ranked[:limit]:
+            info = self._info.get(other_id, {})
+            results.append({
+                "id": other_id,
+                "team_name": info.get("team_name"),
+                "main_game": info.get("main_game"),
+                "score": score,
+            })
+        return results
+
+    def affinity(self, team_id: str) -> Dict[str, float]:
+        """Proximidade de cada time ao `team_id` na rede de amizades (ver `affinity_scores`)."""
+        return affinity_scores(self._adjacency, team_id)
+
+
+# Instância única do grafo, compartilhada por todas as requisições do processo.
+friendship_graph = FriendshipGraph()
+
+
+async def upsert_team(team_id: str, team_name: str, main_game: Optional[str] = None):
+    """Time criado ou editado: atualiza o grafo em memória (e avisa os outros workers)."""
+    await friendship_graph.upsert_team(team_id, team_name, main_game)
+
+
+async def add_friendship(team1_id: str, team2_id: str):
+    """Amizade aceita: atualiza o grafo em memória (e avisa os outros workers)."""
+    await friendship_graph.add_friendship(team1_id, team2_id)
+
+
+async def get_similar_teams(team_id: str, limit: int = 5) -> List[Dict]:
+    """Mesma interface de `gds.get_similar_teams`, calculada em memória."""
+    await friendship_graph.ensure_loaded()
+    return friendship_graph.similar_teams(team_id, limit)
+
+
+async def get_personalized_teams(team_id: str, limit: int = 5) -> List[Dict]:
+    """Mesma interface de `gds.get_personalized_teams`, calculada em memória."""
+    await friendship_graph.ensure_loaded()
+    return friendship_graph.personalized_teams(team_id, limit)
+
+
+async def get_affinity(team_id: str) -> Dict[str, float]:
+    """Proximidade dos outros times ao time na rede de amizades (usada no ranking do feed)."""
+    await friendship_graph.ensure_loaded()
+    return friendship_graph.affinity(team_id)
+
+
+async def get_top_teams_by_pagerank(current_team_id: str) -> List[Dict]:
+    """Mesma interface de `gds.get_top_teams_by_pagerank`, calculada em memória."""
+    await friendship_graph.ensure_loaded()
+    return friendship_graph.top_by_pagerank(exclude_id=current_team_id)
@@ -0,0 +1,409 @@
+# app/metrics.py
+"""
+Métricas da aplicação, expostas no formato texto do Prometheus em GET /metrics.
+
+De onde vêm os números:
+- MongoDB: listeners de monitoramento do PyMongo (comandos e pool de conexões),
+  registrados no cliente do Motor em app/db.py;
+- Redis: o cliente de app/cache.py é embrulhado por `instrument_redis`;
+- Neo4j: as consultas de app/gds.py rodam dentro de `track_neo4j`;
+  (os dois últimos também abrem spans do rastreamento, ver app/tracing.py);
+- Rotas: `MetricsMiddleware` mede cada requisição e soma as chamadas a banco feitas nela.
+
+Tudo fica em memória, no próprio processo; o custo por requisição é um punhado de
+operações em dicionários.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import asynccontextmanager
+
+from pymongo import monitoring
+
+from . import tracing
+
+# Faixas (em segundos) dos histogramas de latência.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Faixas dos histogramas de "quantas chamadas a banco por requisição".
+CALL_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+BACKENDS = ("mongo", "redis", "neo4j")
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra="") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        # Os listeners do PyMongo rodam nas threads do Motor, não no loop do asyncio.
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in sorted(items):
+            lines.extend(self._render_sample(labels, value))
+        return lines
+
+    def samples(self) -> dict:
+        """Cópia dos valores atuais, por tupla de rótulos."""
+        with self._lock:
+            return dict(self._values)
+
+    def _render_sample(self, labels, value):
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {value}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+
+class Gauge(_Metric):
+    """Valor que sobe e desce. Com `collect`, o valor é lido na hora da coleta."""
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames=(), collect=None):
+        super().__init__(name, help_text, labelnames)
+        self.collect = collect
+
+    def inc(self, *labels, amount=1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels, amount=1.0):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value):
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self):
+        if self.collect:
+            for labels, value in self.collect():
+                self.set(*labels, value=value)
+        return super().render()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # [contagem por faixa (a última é +Inf), soma, total]
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _render_sample(self, labels, state):
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+            cumulative += bucket_count
+            le = f'le="{bound}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+        lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "Requisições HTTP atendidas.", ("method", "route", "status")))
+http_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "Latência das requisições HTTP por rota.", ("method", "route")))
+request_db_calls = registry.register(Histogram(
+    "request_db_calls", "Chamadas a cada banco feitas em uma requisição.", ("route", "backend"),
+    buckets=CALL_COUNT_BUCKETS))
+request_db_time = registry.register(Histogram(
+    "request_db_time_seconds", "Tempo somado em cada banco durante uma requisição.", ("route", "backend")))
+db_duration = registry.register(Histogram(
+    "db_operation_duration_seconds", "Latência de cada operação de banco.", ("backend", "operation", "target")))
+db_errors = registry.register(Counter(
+    "db_operation_errors_total", "Operações de banco que falharam.", ("backend", "operation", "target")))
+cache_requests = registry.register(Counter(
+    "cache_requests_total", "Leituras de cache por família de chave e resultado (l1_hit/l2_hit/miss).", ("family", "result")))
+mongo_pool_connections = registry.register(Gauge(
+    "mongo_pool_connections", "Conexões do pool do MongoDB por servidor e estado.", ("address", "state")))
+mongo_pool_checkout_failures = registry.register(Counter(
+    "mongo_pool_checkout_failures_total", "Falhas ao obter uma conexão do pool do MongoDB.", ("address", "reason")))
+
+
+# =============================================================================
+# --- Contexto da requisição ---
+# =============================================================================
+
+class RequestStats:
+    """Chamadas e tempo gasto em cada banco durante a requisição atual."""
+    __slots__ = ("scope", "calls", "seconds")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.calls = dict.fromkeys(BACKENDS, 0)
+        self.seconds = dict.fromkeys(BACKENDS, 0.0)
+
+    @property
+    def route(self) -> str:
+        """Modelo da rota (ex.: /api/teams/{team_id}); só existe depois do roteamento."""
+        return getattr(self.scope.get("route"), "path", "desconhecida")
+
+
+# O Motor copia o contexto para as suas threads, então os listeners do PyMongo
+# enxergam (e alteram) o mesmo objeto da requisição que disparou o comando.
+current_request = contextvars.ContextVar("metrics_request", default=None)
+
+
+def record_db_call(backend: str, operation: str, target: str, seconds: float, ok: bool = True):
+    db_duration.observe(seconds, backend, operation, target)
+    if not ok:
+        db_errors.inc(backend, operation, target)
+    stats = current_request.get()
+    if stats is not None:
+        stats.calls[backend] += 1
+        stats.seconds[backend] += seconds
+
+
+def record_cache(family: str, result: str):
+    """
+    Registra uma leitura de cache. `family` é o tipo da chave (ex.: "popular_posts"), nunca a chave em si;
+    `result` é "l1_hit", "l2_hit" ou "miss".
+    """
+    cache_requests.inc(family, result)
+
+
+# =============================================================================
+# --- MongoDB ---
+# =============================================================================
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Mede cada comando enviado ao MongoDB (find, aggregate, update...)."""
+
+    def __init__(self):
+        # request_id do comando -> coleção alvo (o evento de sucesso não traz o comando).
+        self._targets = {}
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        self._targets[event.request_id] = target if isinstance(target, str) else event.database_name
+
+    def succeeded(self, event):
+        target = self._targets.pop(event.request_id, "")
+        record_db_call("mongo", event.command_name, target, event.duration_micros / 1_000_000)
+
+    def failed(self, event):
+        target = self._targets.pop(event.request_id, "")
+        record_db_call("mongo", event.command_name, target, event.duration_micros / 1_000_000, ok=False)
+
+
+class MongoPoolListener(monitoring.ConnectionPoolListener):
+    """Acompanha quantas conexões do pool estão abertas e quantas estão em uso."""
+
+    def _address(self, event):
+        host, port = event.address
+        return f"{host}:{port}"
+
+    def pool_created(self, event):
+        address = self._address(event)
+        mongo_pool_connections.set(address, "open", value=0)
+        mongo_pool_connections.set(address, "in_use", value=0)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        mongo_pool_connections.inc(self._address(event), "open")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        mongo_pool_connections.dec(self._address(event), "open")
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        mongo_pool_checkout_failures.inc(self._address(event), str(event.reason))
+
+    def connection_checked_out(self, event):
+        mongo_pool_connections.inc(self._address(event), "in_use")
+
+    def connection_checked_in(self, event):
+        mongo_pool_connections.dec(self._address(event), "in_use")
+
+
+mongo_listeners = [MongoCommandListener(), MongoPoolListener()]
+
+
+# =============================================================================
+# --- Redis ---
+# =============================================================================
+
+# Pools dos clientes instrumentados, lidos só na hora da coleta.
+_redis_pools = {}
+
+
+def _collect_redis_pools():
+    for name, pool in _redis_pools.items():
+        yield (name, "in_use"), len(pool._in_use_connections)
+        yield (name, "idle"), len(pool._available_connections)
+        yield (name, "max"), pool.max_connections
+
+
+registry.register(Gauge(
+    "redis_pool_connections", "Conexões do pool do Redis por estado.", ("pool", "state"),
+    collect=_collect_redis_pools))
+
+
+def instrument_redis(client, name: str = "app"):
+    """Embrulha os comandos (e pipelines) de um cliente redis.asyncio e expõe o uso do pool."""
+    execute_command = client.execute_command
+    pipeline = client.pipeline
+
+    async def timed_execute_command(*args, **options):
+        command = str(args[0]).upper()
+        start = time.perf_counter()
+        ok = False
+        try:
+            with tracing.span(f"redis {command}"):
+                result = await execute_command(*args, **options)
+            ok = True
+            return result
+        finally:
+            record_db_call("redis", command, "", time.perf_counter() - start, ok)
+
+    def timed_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        execute = pipe.execute
+
+        async def timed_execute(*exec_args, **exec_kwargs):
+            # Um pipeline inteiro é uma única ida e volta ao servidor.
+            start = time.perf_counter()
+            ok = False
+            try:
+                with tracing.span("redis PIPELINE", **{"redis.commands": len(pipe.command_stack)}):
+                    result = await execute(*exec_args, **exec_kwargs)
+                ok = True
+                return result
+            finally:
+                record_db_call("redis", "PIPELINE", "", time.perf_counter() - start, ok)
+
+        pipe.execute = timed_execute
+        return pipe
+
+    client.execute_command = timed_execute_command
+    client.pipeline = timed_pipeline
+
+    _redis_pools[name] = client.connection_pool
+    return client
+
+
+# =============================================================================
+# --- Neo4j ---
+# =============================================================================
+
+@asynccontextmanager
+async def track_neo4j(operation: str):
+    """Mede uma consulta ao Neo4j (da execução até o último registro lido)."""
+    start = time.perf_counter()
+    ok = False
+    try:
+        with tracing.span(f"neo4j {operation}"):
+            yield
+        ok = True
+    finally:
+        record_db_call("neo4j", operation, "", time.perf_counter() - start, ok)
+
+
+# =============================================================================
+# --- Rotas ---
+# =============================================================================
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI que mede cada requisição HTTP pelo *modelo* da rota
+    (ex.: /api/teams/{team_id}), para não criar uma série por ID.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            current_request.reset(token)
+            route_path = stats.route
+            method = scope["method"]
+            http_requests.inc(method, route_path, str(status_code))
+            http_duration.observe(elapsed, method, route_path)
+            for backend in BACKENDS:
+                request_db_calls.observe(stats.calls[backend], route_path, backend)
+                if stats.calls[backend]:
+                    request_db_time.observe(stats.seconds[backend], route_path, backend)
@@ -9,9 +9,9 @@ O benie:  Beanie é um ODM (Object-Document Mapper) assíncrono para MongoDB,
           feito para funcionar perfeitamente com Python moderno e FastAPI.
 """
 import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 from beanie import Document, Link, PydanticObjectId
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import AliasChoices, BaseModel, EmailStr, Field
 from enum import Enum
 from pymongo import IndexModel, ASCENDING, DESCENDING
 
@@ -94,6 +94,7 @@ class Player(Document):
         name = "players"
         indexes = [
             IndexModel("nickname", unique=False), # Índice para buscas futuras por nickname
+            IndexModel("team.$id"), # Jogadores de um time (página de perfil, busca em lote)
         ]
 
 class PlayerCreate(BaseModel):
@@ -128,6 +129,10 @@ class Team(Document):
     friends: List[Link["Team"]] = []
     friend_requests_sent: List[Link["Team"]] = []
     friend_requests_received: List[Link["Team"]] = []
+    # Cópias (id, nome, tag e jogo) dos times em `friends` e `friend_requests_received`,
+    # para listar amigos e pedidos sem carregar um documento por amigo (ver app/snapshots.py).
+    friends_info: List[FriendInfo] = []
+    friend_requests_received_info: List[FriendInfo] = []
     players: List[Link[Player]] = []
     created_at: datetime.datetime = Field(
         default_factory=lambda: datetime.datetime.now(datetime.UTC))
@@ -137,6 +142,11 @@ class Team(Document):
         indexes = [
             IndexModel("email", unique=True),
             IndexModel("team_name", unique=True),
+            # Usados para achar quem guarda uma cópia de um time quando o perfil dele muda.
+            IndexModel("friends_info.id"),
+            IndexModel("friend_requests_received_info.id"),
+            IndexModel("tag"), # Resolve as menções (@TAG) dos posts
+            IndexModel("main_game"), # Times do mesmo jogo (candidatos do feed)
         ]
 
 class TeamCreate(BaseModel):
@@ -169,6 +179,55 @@ class TeamUpdate(BaseModel):
     main_game: Optional[GameEnum] = None 
     socials: Optional[Socials] = None
 
+# Projeções: leituras parciais de um time, para as rotas que não precisam do documento inteiro
+# (senha, bio, listas de Links e cópias dos amigos). Usadas com `.project(...)`; o `_id` do
+# MongoDB chega como `id`.
+
+class TeamPrincipal(PostAuthor):
+    """
+    O time logado nas rotas de escrita mais frequentes: o que vai como autor de posts e
+    comentários, mais o jogo principal (usado pelo filtro da busca de posts).
+    """
+    id: PydanticObjectId = Field(validation_alias=AliasChoices("_id", "id"))
+    main_game: Optional[GameEnum] = None
+
+    class Settings:
+        projection = {"_id": 1, "team_name": 1, "tag": 1, "main_game": 1}
+
+class TeamCard(FriendInfo):
+    """Cartão de um time (os campos de FriendInfo), para buscas, autores e validações de existência."""
+    id: PydanticObjectId = Field(validation_alias=AliasChoices("_id", "id"))
+
+    class Settings:
+        projection = {"_id": 1, "team_name": 1, "tag": 1, "main_game": 1}
+
+class TeamProfile(BaseModel):
+    """Os campos públicos de TeamOut, com os jogadores ainda como Links (sem senha nem listas de amizade)."""
+    id: PydanticObjectId = Field(validation_alias=AliasChoices("_id", "id"))
+    email: EmailStr
+    team_name: str
+    tag: Optional[str] = None
+    main_game: Optional[GameEnum] = None
+    logo_url: Optional[str] = None
+    bio: Optional[str] = None
+    socials: Optional[Socials] = None
+    players: List[Link[Player]] = []
+    created_at: datetime.datetime
+
+    class Settings:
+        projection = {
+            "_id": 1, "email": 1, "team_name": 1, "tag": 1, "main_game": 1, "logo_url": 1,
+            "bio": 1, "socials": 1, "players": 1, "created_at": 1,
+        }
+
+class TeamPageProfile(TeamProfile):
+    """O perfil mais os amigos (Links e cópias), para a página de perfil."""
+    friends: List[Link[Team]] = []
+    friends_info: List[FriendInfo] = []
+
+    class Settings:
+        projection = {**TeamProfile.Settings.projection, "friends": 1, "friends_info": 1}
+
 # -----------------------------------------------------------------------------
 # Modelos de Post
 # -----------------------------------------------------------------------------
@@ -180,13 +239,30 @@ class Post(Document):
     author: Link[Team]
     likes: List[Link[Team]] = []
     comments: List[Comment] = []
+    # Extraídos do conteúdo na criação: hashtags normalizadas e ids dos times mencionados.
+    hashtags: List[str] = []
+    mentions: List[PydanticObjectId] = []
 
     class Settings:
         name = "posts"
         indexes = [
             IndexModel([("created_at", DESCENDING)]), # Índice para ordenar o feed
+            IndexModel([("author.$id", ASCENDING), ("created_at", DESCENDING)]), # Posts de um time, mais novos primeiro
+            IndexModel([("hashtags", ASCENDING), ("created_at", DESCENDING)]), # Posts de uma hashtag, mais novos primeiro
+            IndexModel([("mentions", ASCENDING), ("created_at", DESCENDING)]), # Posts que mencionam um time
         ]
 
+class ArchivedPost(Post):
+    """
+    Post antigo movido para o arquivo (coleção 'posts_archive', ver app/archive.py).
+    Mesmo formato e índices de Post; fica fora da coleção quente para que ela e os seus
+    índices continuem pequenos.
+    """
+
+    class Settings:
+        name = "posts_archive"
+        indexes = Post.Settings.indexes
+
 class PostCreate(BaseModel):
     """Modelo para criar um novo post via API."""
     content: str = Field(..., min_length=1, max_length=280)
@@ -197,9 +273,36 @@ class PostOut(BaseModel):
     content: str
     created_at: datetime.datetime
     author: PostAuthor
-    likes: List[PydanticObjectId]
+    # Modo completo: ids de todos os times que curtiram.
+    # Modo compacto (`?compact=true`): None, e `liked_by_me` diz se o time logado curtiu.
+    likes: Optional[List[PydanticObjectId]] = None
     likes_count: int
+    liked_by_me: Optional[bool] = None
     comments: List[Comment]
+    hashtags: List[str] = []
+    mentions: List[PydanticObjectId] = []
+
+class PostLikesOut(BaseModel):
+    """Uma página dos times que curtiram um post, na ordem em que curtiram."""
+    likes_count: int
+    teams: List[FriendInfo]
+
+class ViewStats(BaseModel):
+    """Visitantes distintos de um post ou perfil (estimados), por período."""
+    day: int
+    week: int
+    month: int
+
+class TrendingHashtag(BaseModel):
+    """Uma hashtag em alta e quantas vezes foi usada na janela pedida."""
+    tag: str
+    count: int
+
+class PostSearchOut(BaseModel):
+    """Uma página da busca de posts, do mais bem ranqueado ao pior."""
+    posts: List[PostOut]
+    # Passado de volta em `cursor` para ler a próxima página (None na última).
+    next_cursor: Optional[str] = None
     
 # -----------------------------------------------------------------------------
 # Modelos de Scrim
@@ -211,6 +314,12 @@ class Scrim(Document):
     scrim_datetime: datetime.datetime
     game: GameEnum
     status: ScrimStatusEnum = Field(default=ScrimStatusEnum.PENDING)
+    # Quem venceu, depois de concluída (None: empate ou ainda não concluída).
+    winner_team_id: Optional[PydanticObjectId] = None
+    # Resultado informado por um dos times e ainda não confirmado pelo outro
+    # (`reported_winner_team_id` None: empate).
+    reported_by: Optional[PydanticObjectId] = None
+    reported_winner_team_id: Optional[PydanticObjectId] = None
     created_at: datetime.datetime = Field(default_factory=lambda: datetime.datetime.now(datetime.UTC))
 
     class Settings:
@@ -220,12 +329,45 @@ class Scrim(Document):
             IndexModel("status"),
         ]
 
+class TeamStats(Document):
+    """
+    Contadores de um time (coleção 'team_stats', `_id` = id do time), mantidos com `$inc` pelas
+    rotas de escrita e conferidos de tempos em tempos com a base (ver app/team_stats.py).
+    """
+    posts_count: int = 0
+    friends_count: int = 0
+    players_count: int = 0
+    likes_received: int = 0
+    # Scrims do time (proposta ou recebida), por status.
+    scrims_pending: int = 0
+    scrims_confirmed: int = 0
+    scrims_completed: int = 0
+    scrims_canceled: int = 0
+
+    class Settings:
+        name = "team_stats"
+
+class TeamStatsOut(BaseModel):
+    """Os números da página de perfil de um time."""
+    posts_count: int = 0
+    friends_count: int = 0
+    players_count: int = 0
+    likes_received: int = 0
+    scrims_pending: int = 0
+    scrims_confirmed: int = 0
+    scrims_completed: int = 0
+    scrims_canceled: int = 0
+
 class ScrimCreate(BaseModel):
     """Modelo para receber os dados de criação de uma nova scrim."""
     opponent_team_id: PydanticObjectId
     scrim_datetime: datetime.datetime
     game: GameEnum
 
+class ScrimComplete(BaseModel):
+    """Resultado de uma scrim: o time vencedor, ou nenhum em caso de empate."""
+    winner_team_id: Optional[PydanticObjectId] = None
+
 class ScrimOut(BaseModel):
     """Modelo para exibir uma scrim na API."""
     id: PydanticObjectId
@@ -234,8 +376,69 @@ class ScrimOut(BaseModel):
     scrim_datetime: datetime.datetime
     game: GameEnum
     status: ScrimStatusEnum
+    winner_team_id: Optional[PydanticObjectId] = None
+    reported_by: Optional[PydanticObjectId] = None
+    reported_winner_team_id: Optional[PydanticObjectId] = None
     created_at: datetime.datetime
 
+class PairRecord(BaseModel):
+    """Retrospecto de um par de times, com os lados `a` e `b` do par."""
+    played: int = 0
+    wins_a: int = 0
+    wins_b: int = 0
+    draws: int = 0
+
+class ScrimPairSummary(Document):
+    """
+    Retrospecto das scrims concluídas entre dois times (coleção 'scrim_pairs'), atualizado a
+    cada scrim concluída (ver app/scrim_history.py). O `_id` é "<id menor>:<id maior>"; o time
+    de id menor é o lado `a`.
+    """
+    id: str
+    team_a: PydanticObjectId
+    team_b: PydanticObjectId
+    played: int = 0
+    wins_a: int = 0
+    wins_b: int = 0
+    draws: int = 0
+    last_played: Optional[datetime.datetime] = None
+    # Nome do jogo -> retrospecto só naquele jogo.
+    by_game: Dict[str, PairRecord] = {}
+    # Scrims já somadas ao resumo (uma tarefa repetida não conta a mesma scrim duas vezes).
+    counted_scrims: List[PydanticObjectId] = []
+
+    class Settings:
+        name = "scrim_pairs"
+        indexes = [
+            # Histórico de um time (ele pode ser o lado `a` ou o `b`), mais recentes primeiro.
+            IndexModel([("team_a", ASCENDING), ("last_played", DESCENDING)]),
+            IndexModel([("team_b", ASCENDING), ("last_played", DESCENDING)]),
+        ]
+
+class ScrimRecordOut(BaseModel):
+    """Retrospecto do ponto de vista de um time."""
+    played: int = 0
+    wins: int = 0
+    losses: int = 0
+    draws: int = 0
+
+class OpponentRecordOut(ScrimRecordOut):
+    """Retrospecto de um time contra um adversário."""
+    opponent: FriendInfo
+    last_played: Optional[datetime.datetime] = None
+    by_game: Dict[str, ScrimRecordOut] = {}
+
+class HeadToHeadOut(OpponentRecordOut):
+    """Confronto direto entre dois times (GET /teams/{id}/vs/{other})."""
+    team: FriendInfo
+
+class TeamScrimHistoryOut(ScrimRecordOut):
+    """Resumo das scrims concluídas de um time: totais, por jogo e por adversário."""
+    last_played: Optional[datetime.datetime] = None
+    by_game: Dict[str, ScrimRecordOut] = {}
+    # Adversários, do confronto mais recente ao mais antigo.
+    opponents: List[OpponentRecordOut] = []
+
 # -----------------------------------------------------------------------------
 # Modelos de Autenticação
 # -----------------------------------------------------------------------------
@@ -248,3 +451,28 @@ class NotificationsOut(BaseModel):
     """Modelo para a resposta da rota de notificações."""
     friend_requests: List[FriendInfo]
     scrim_invites: List[ScrimOut]
+
+# -----------------------------------------------------------------------------
+# Modelos das Rotas em Lote
+# -----------------------------------------------------------------------------
+class TeamBatchRequest(BaseModel):
+    """Ids dos times a buscar numa única requisição."""
+    ids: List[PydanticObjectId] = Field(..., min_length=1, max_length=100)
+
+class TeamPageOut(BaseModel):
+    """Tudo o que a página de perfil de um time mostra, numa única resposta."""
+    team: TeamOut
+    friends: List[FriendInfo]
+    posts: List[PostOut]
+    stats: TeamStatsOut
+
+class LikeBatchRequest(BaseModel):
+    """Posts a curtir e a descurtir numa única requisição (operações idempotentes, não alternam)."""
+    like: List[PydanticObjectId] = Field(default=[], max_length=100)
+    unlike: List[PydanticObjectId] = Field(default=[], max_length=100)
+
+class PostLikeState(BaseModel):
+    """Como ficou um post depois de uma operação de like em lote."""
+    post_id: PydanticObjectId
+    liked: bool
+    likes_count: int
@@ -0,0 +1,241 @@
+# app/resources.py
+"""
+Conexões da aplicação em um só lugar: os clientes do MongoDB, do Redis e do Neo4j.
+
+Cada cliente é criado uma única vez por processo, com o pool configurado em app/config.py,
+e reaproveitado por todas as requisições: nenhuma rota paga a abertura de uma conexão.
+Nenhum outro módulo cria clientes: o cache, a fila de tarefas, o grafo embutido e as rotas
+pegam o Redis em `resources.redis` na hora do uso, então os limites e o fechamento ficam
+todos aqui.
+- Subida (lifespan): `start()` abre as conexões de aquecimento (MONGO_MIN_POOL_SIZE,
+  REDIS_WARMUP_CONNECTIONS e, com o motor "gds", uma do Neo4j). Sem o MongoDB a aplicação
+  não sobe; o Redis e o Neo4j fora do ar só geram um aviso (e aparecem no GET /health).
+- Uso: `resources.mongo` (o Beanie é inicializado sobre ele em app/db.py), `resources.redis`
+  (cache, fila de tarefas, busca, rotas) e `resources.neo4j` (driver usado por app/gds.py).
+  Fora do lifespan (scripts), os clientes são criados no primeiro uso.
+- Saúde: `health()` faz um ping em cada banco e devolve a latência e o uso de cada pool
+  (conexões abertas, em uso, o máximo e a saturação = em uso / máximo). A saturação também
+  sai no GET /metrics (`resource_pool_saturation`).
+- Encerramento: `close()` fecha os três clientes.
+"""
+import asyncio
+import time
+from typing import Dict, Optional
+
+import motor.motor_asyncio
+import redis.asyncio as redis
+from neo4j import AsyncGraphDatabase
+
+from .config import settings
+from .metrics import (
+    Gauge, instrument_redis, mongo_listeners, mongo_pool_checkout_failures, mongo_pool_connections, registry
+)
+from .slow_queries import slow_query_log
+from .tracing import mongo_trace_listener
+
+# Quanto cada ping do GET /health pode demorar antes de o banco ser dado como fora do ar.
+HEALTH_CHECK_TIMEOUT_SECONDS = 2.0
+
+
+def _saturation(in_use: int, maximum: int) -> float:
+    return round(in_use / maximum, 3) if maximum else 0.0
+
+
+class ResourceManager:
+    """Dono dos clientes do MongoDB, do Redis e do Neo4j (e dos seus pools de conexões)."""
+
+    def __init__(self):
+        self._mongo = None
+        self._redis = None
+        self._neo4j = None
+
+    @property
+    def uses_neo4j(self) -> bool:
+        return settings.RECOMMENDATION_ENGINE == "gds"
+
+    @property
+    def mongo(self) -> motor.motor_asyncio.AsyncIOMotorClient:
+        """Cliente do MongoDB, criado no primeiro uso."""
+        if self._mongo is None:
+            # Os listeners alimentam as métricas de comandos e do pool de conexões (GET /metrics),
+            # o log de consultas lentas (GET /admin/slow-queries) e o rastreamento das requisições.
+            self._mongo = motor.motor_asyncio.AsyncIOMotorClient(
+                settings.MONGODB_URI,
+                maxPoolSize=settings.MONGO_MAX_POOL_SIZE,
+                minPoolSize=settings.MONGO_MIN_POOL_SIZE,
+                waitQueueTimeoutMS=settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+                serverSelectionTimeoutMS=settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                connectTimeoutMS=settings.MONGO_CONNECT_TIMEOUT_MS,
+                event_listeners=[*mongo_listeners, slow_query_log, mongo_trace_listener],
+            )
+        return self._mongo
+
+    @property
+    def redis(self) -> redis.Redis:
+        """Cliente do Redis, criado no primeiro uso."""
+        if self._redis is None:
+            # Com o pool cheio, o comando espera uma conexão livre (até REDIS_POOL_TIMEOUT_SECONDS)
+            # em vez de abrir mais uma. Cada comando enviado por ele é medido (GET /metrics).
+            self._redis = instrument_redis(redis.Redis.from_pool(redis.BlockingConnectionPool.from_url(
+                settings.REDIS_URL,
+                encoding="utf-8",
+                decode_responses=True,
+                max_connections=settings.REDIS_MAX_CONNECTIONS,
+                timeout=settings.REDIS_POOL_TIMEOUT_SECONDS,
+                socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT_SECONDS,
+            )))
+        return self._redis
+
+    @redis.setter
+    def redis(self, client):
+        # Troca o cliente de todos os módulos de uma vez (ex.: fakeredis nos stand-ins de benchmarks/).
+        self._redis = client
+
+    @property
+    def neo4j(self):
+        """Driver do Neo4j, criado no primeiro uso (as sessões saem do pool dele)."""
+        if self._neo4j is None:
+            self._neo4j = AsyncGraphDatabase.driver(
+                settings.NEO4J_URI,
+                auth=(settings.NEO4J_USERNAME, settings.NEO4J_PASSWORD),
+                max_connection_pool_size=settings.NEO4J_MAX_POOL_SIZE,
+                connection_acquisition_timeout=settings.NEO4J_ACQUISITION_TIMEOUT_SECONDS,
+                connection_timeout=settings.NEO4J_CONNECT_TIMEOUT_SECONDS,
+            )
+        return self._neo4j
+
+    # =========================================================================
+    # --- Ciclo de vida (lifespan) ---
+    # =========================================================================
+
+    async def start(self):
+        """Abre as conexões de aquecimento. Falha se o MongoDB não responder."""
+        warmups = [self._warm_redis()]
+        if self.uses_neo4j:
+            warmups.append(self._warm_neo4j())
+        # O MongoDB mantém sozinho MONGO_MIN_POOL_SIZE conexões abertas depois do primeiro contato.
+        await asyncio.gather(self.mongo.admin.command("ping"), *warmups)
+
+    async def _warm_redis(self):
+        pool = self.redis.connection_pool
+        count = min(settings.REDIS_WARMUP_CONNECTIONS, settings.REDIS_MAX_CONNECTIONS)
+        connections = []
+        try:
+            # Segura as conexões ao mesmo tempo (senão o pool devolveria sempre a mesma), já conectadas,
+            # e depois as devolve ao pool.
+            for _ in range(count):
+                connections.append(await pool.get_connection())
+        except Exception as exc:
+            print(f"AVISO: não foi possível aquecer o pool do Redis ({exc}).")
+        finally:
+            for connection in connections:
+                await pool.release(connection)
+
+    async def _warm_neo4j(self):
+        try:
+            await self.neo4j.verify_connectivity()
+        except Exception as exc:
+            print(f"AVISO: Neo4j indisponível na subida ({exc}). As recomendações vão falhar até ele voltar.")
+
+    async def close(self):
+        """Fecha os três clientes (e todas as conexões dos pools)."""
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+        if self._neo4j is not None:
+            await self._neo4j.close()
+            self._neo4j = None
+        if self._mongo is not None:
+            self._mongo.close()
+            self._mongo = None
+
+    # =========================================================================
+    # --- Saúde e uso dos pools ---
+    # =========================================================================
+
+    def pool_stats(self) -> Dict[str, dict]:
+        """Conexões abertas, em uso e o máximo de cada pool, com a saturação (em uso / máximo)."""
+        stats = {"mongo": self._mongo_pool(), "redis": self._redis_pool()}
+        if self.uses_neo4j:
+            stats["neo4j"] = self._neo4j_pool()
+        return stats
+
+    def _mongo_pool(self) -> dict:
+        # Um pool por servidor do cluster; os números vêm dos listeners de app/metrics.py.
+        maximum = settings.MONGO_MAX_POOL_SIZE
+        servers = {}
+        for (address, state), value in mongo_pool_connections.samples().items():
+            servers.setdefault(address, {"open": 0, "in_use": 0})[state] = int(value)
+        return {
+            "open": sum(server["open"] for server in servers.values()),
+            "in_use": sum(server["in_use"] for server in servers.values()),
+            "max": maximum,
+            # O servidor mais ocupado é o que vai fazer as operações esperarem primeiro.
+            "saturation": max((_saturation(server["in_use"], maximum) for server in servers.values()), default=0.0),
+            "checkout_failures": int(sum(mongo_pool_checkout_failures.samples().values())),
+        }
+
+    def _redis_pool(self) -> dict:
+        pool = self.redis.connection_pool
+        in_use = len(pool._in_use_connections)
+        return {
+            "open": in_use + len(pool._available_connections),
+            "in_use": in_use,
+            "max": pool.max_connections,
+            "saturation": _saturation(in_use, pool.max_connections),
+        }
+
+    def _neo4j_pool(self) -> dict:
+        maximum = settings.NEO4J_MAX_POOL_SIZE
+        # O driver não expõe o pool publicamente: conexões por servidor em `_pool.connections`.
+        pool = getattr(self._neo4j, "_pool", None)
+        connections = [
+            connection
+            for server in getattr(pool, "connections", {}).values()
+            for connection in list(server)
+        ]
+        in_use = sum(1 for connection in connections if connection.in_use)
+        return {"open": len(connections), "in_use": in_use, "max": maximum, "saturation": _saturation(in_use, maximum)}
+
+    async def health(self) -> dict:
+        """Ping em cada banco (com HEALTH_CHECK_TIMEOUT_SECONDS) e o uso dos pools."""
+        checks = {
+            "mongo": lambda: self.mongo.admin.command("ping"),
+            "redis": self.redis.ping,
+        }
+        if self.uses_neo4j:
+            checks["neo4j"] = self.neo4j.verify_connectivity
+        results = await asyncio.gather(*(self._check(ping) for ping in checks.values()))
+        pools = self.pool_stats()
+        resources = {
+            name: {**result, "pool": pools[name]}
+            for name, result in zip(checks, results)
+        }
+        return {
+            "status": "ok" if all(resource["ok"] for resource in resources.values()) else "degraded",
+            "resources": resources,
+        }
+
+    async def _check(self, ping) -> dict:
+        start = time.perf_counter()
+        error: Optional[str] = None
+        try:
+            await asyncio.wait_for(ping(), HEALTH_CHECK_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            error = f"sem resposta em {HEALTH_CHECK_TIMEOUT_SECONDS}s"
+        except Exception as exc:
+            error = str(exc) or type(exc).__name__
+        return {"ok": error is None, "latency_ms": round((time.perf_counter() - start) * 1000, 2), "error": error}
+
+
+resources = ResourceManager()
+
+
+def _collect_saturation():
+    for name, pool in resources.pool_stats().items():
+        yield (name,), pool["saturation"]
+
+
+registry.register(Gauge(
+    "resource_pool_saturation", "Fração do pool de conexões em uso, por banco (o servidor mais ocupado).",
+    ("resource",), collect=_collect_saturation))
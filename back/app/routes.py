@@ -1,36 +1,71 @@
 # app/routes.py - VERSÃO COMPLETA E ORGANIZADA
 
+import asyncio
 from fastapi import APIRouter, HTTPException, status, Depends,  Query
-from typing import List, Annotated, Optional, Dict
-from beanie import PydanticObjectId
-from datetime import timedelta
+from typing import List, Annotated, Optional, Dict, Literal
+from beanie import PydanticObjectId, UpdateResponse
+from bson import DBRef
+from pymongo import UpdateOne
+from datetime import UTC, datetime, timedelta
 import redis.asyncio as redis
 from .cache import get_redis_client
-import json
+from .cache import cached, response_cache
+from . import tracing
+from .snapshots import (
+    SNAPSHOT_FIELDS, team_snapshot, snapshot_list, remove_snapshot
+)
 
 # Importação de todos os modelos necessários
 from .models import (
-    Team, Player, Post, Comment,
+    Team, Player, Post, Comment, PostAuthor,
     TeamCreate, TeamOut,
     PlayerCreate, PlayerOut,
-    PostCreate, PostOut,
+    PostCreate, PostOut, PostSearchOut, PostLikesOut, TrendingHashtag, ViewStats, TeamStatsOut,
     CommentCreate,
-    Token, FriendInfo, TeamUpdate, LolRoleEnum,
+    Token, FriendInfo, TeamUpdate, TeamPrincipal, TeamCard, LolRoleEnum,
     ValorantRoleEnum, CsRoleEnum, GameEnum,
-    Scrim, ScrimCreate, ScrimOut, ScrimStatusEnum, NotificationsOut
+    ArchivedPost, Scrim, ScrimCreate, ScrimComplete, ScrimOut, ScrimStatusEnum, NotificationsOut,
+    HeadToHeadOut, TeamScrimHistoryOut,
+    TeamProfile, TeamPageProfile, TeamBatchRequest, TeamPageOut, LikeBatchRequest, PostLikeState
 )
 
-from .gds import get_similar_teams, get_top_teams_by_pagerank
-from .security import hash_password, verify_password, create_access_token, get_current_team
+from . import gds, graph_engine
+from . import search as post_search
+from . import trending
+from . import views
+from . import feed
+from . import team_stats
+from . import scrim_history
+from .views import ViewTracker, get_view_tracker
+from .task_queue import task_queue
+from .security import (
+    hash_password, verify_password, create_access_token, get_current_team, get_current_principal,
+    get_optional_team_id
+)
 from fastapi.security import OAuth2PasswordRequestForm
 from .config import settings
 from .cache import get_redis_client
 from beanie.odm.operators.find.logical import Or
+from beanie.odm.operators.find.comparison import In
+from beanie.odm.operators.update.array import Push
 from beanie.odm.operators.find.evaluation import RegEx
 
 # Inicialização do Router
 router = APIRouter()
 
+# Motor de recomendação escolhido pela configuração (RECOMMENDATION_ENGINE).
+# Os dois módulos expõem as mesmas funções: get_similar_teams e get_top_teams_by_pagerank.
+recommender = graph_engine if settings.RECOMMENDATION_ENGINE == "embedded" else gds
+
+# Publicação no mural de atividades, feita pela fila de tarefas depois da resposta.
+@task_queue.task("activity_stream.publish", idempotent=False)
+async def publish_activity(redis_client, event: Dict[str, str]):
+    await redis_client.xadd("activity_stream", event)
+
+# Parâmetros comuns das rotas que listam posts: o time logado (se houver) e o modo compacto.
+ViewerId = Annotated[Optional[PydanticObjectId], Depends(get_optional_team_id)]
+CompactQuery = Annotated[bool, Query(description="Troca a lista de likes por `liked_by_me` (e mantém `likes_count`).")]
+
 # =============================================================================
 # --- Rotas de Autenticação e Registro ---
 # =============================================================================
@@ -57,6 +92,9 @@ async def create_team(team_data: TeamCreate):
     team = Team(**team_dict, hashed_password=hashed_pass)
 
     await team.insert()  # Aq de fato o documento é criado na coleçaõ
+    # Com o motor embutido, mantém o grafo em memória atualizado (e avisa os outros workers);
+    # com o GDS, não faz nada (o Neo4j é alimentado pelo mongo_to_neo4j).
+    await recommender.upsert_team(str(team.id), team.team_name, team.main_game)
     # Retornar o objeto team é seguro pois o response_model=TeamOut filtra os campos
     return team
 
@@ -91,32 +129,43 @@ async def get_team_recommendations(
     """
     (GDS Híbrida) Retorna uma lista de times recomendados.
     - Se o usuário tiver amigos, tenta a recomendação por Similaridade.
-    - Se a Similaridade não retornar resultados ou se o usuário for novo,
-      usa o PageRank como fallback para recomendar os times mais populares.
+    - Se a Similaridade não retornar resultados, usa o PageRank personalizado
+      (semeado no próprio time e nos seus amigos), calculado só na vizinhança.
+    - Se ainda assim não houver resultados (ex.: time novo, sem amigos),
+      usa o PageRank global em cache para recomendar os times mais populares.
     """
-    # Carrega a lista de amigos para tomar a decisão.
-    await current_team.fetch_link(Team.friends)
+    # Para decidir basta a quantidade de amigos: os Links já trazem os ids,
+    # então não é preciso carregar os documentos dos amigos.
+    num_friends = len(current_team.friends)
 
     recommendations = []
 
     # --- LÓGICA DE DECISÃO APRIMORADA ---
 
     # Tenta a recomendação personalizada se o usuário já tiver algumas conexões.
-    if len(current_team.friends) > 1:
+    if num_friends > 1:
         print("INFO: Usuário com amigos. Tentando recomendação por SIMILARIDADE.")
-        recommendations = await get_similar_teams(str(current_team.id))
+        with tracing.span("recommendations.similarity"):
+            recommendations = await recommender.get_similar_teams(str(current_team.id))
+
+    # Com pelo menos um amigo, o PageRank personalizado ainda encontra times próximos.
+    if not recommendations and num_friends >= 1:
+        print("INFO: Usando recomendação por PAGERANK PERSONALIZADO.")
+        with tracing.span("recommendations.personalized_pagerank"):
+            recommendations = await recommender.get_personalized_teams(str(current_team.id))
 
     # --- LÓGICA DE FALLBACK ---
-    # Se o usuário for novo OU se a similaridade não encontrou ninguém, usa o PageRank.
+    # Se o usuário for novo OU se nada foi encontrado na vizinhança, usa o PageRank global.
     if not recommendations:
-        if len(current_team.friends) <= 1:
+        if num_friends == 0:
             print(
-                "INFO: Usuário novo ou com poucos amigos. Usando recomendação por POPULARIDADE (PageRank).")
+                "INFO: Usuário novo, sem amigos. Usando recomendação por POPULARIDADE (PageRank).")
         else:
             print(
-                "INFO: Similaridade não retornou resultados. Usando fallback para POPULARIDADE (PageRank).")
+                "INFO: Vizinhança sem resultados. Usando fallback para POPULARIDADE (PageRank).")
 
-        recommendations = await get_top_teams_by_pagerank(str(current_team.id))
+        with tracing.span("recommendations.global_pagerank"):
+            recommendations = await recommender.get_top_teams_by_pagerank(str(current_team.id))
 
     return recommendations
 
@@ -126,9 +175,10 @@ async def search_teams(q: Annotated[str, Query(min_length=1)]):
     """
     Busca por times cujo nome corresponde a uma query de busca.
     """
+    # Só os campos do cartão (FriendInfo) saem do banco.
     teams = await Team.find(
         RegEx(Team.team_name, pattern=q, options="i")
-    ).to_list()
+    ).project(TeamCard).to_list()
 
     return teams
 
@@ -145,36 +195,174 @@ async def get_all_teams():
 
 
 @router.get("/teams/{team_id}", response_model=TeamOut, tags=["Teams & Profiles"])
-async def get_team(team_id: PydanticObjectId):
+async def get_team(team_id: PydanticObjectId, view_tracker: Annotated[ViewTracker, Depends(get_view_tracker)]):
     """Busca um time específico pelo seu ID. Rota pública."""
-    team = await Team.get(team_id, fetch_links=True)
+    # Como em /teams/batch: só os campos públicos do time (sem carregar amigos nem jogadores
+    # pelos Links) e os jogadores numa consulta própria, ao mesmo tempo.
+    profile, players = await asyncio.gather(
+        Team.find_one(Team.id == team_id).project(TeamProfile),
+        Player.find(Player.team.id == team_id).to_list(),
+    )
+    if not profile:
+        raise HTTPException(status_code=404, detail="Time não encontrado.")
+    # Conta a visualização do perfil depois de enviar a resposta
+    await view_tracker.record("team", [profile.id])
+    return to_team_out(profile, players)
+
+def to_team_out(profile: TeamProfile, players: List[Player]) -> TeamOut:
+    """Monta o TeamOut de um perfil projetado, com os jogadores na ordem da lista do time."""
+    players_by_id = {player.id: player for player in players}
+    team_dict = profile.model_dump(exclude={"players", "friends", "friends_info"})
+    team_dict["players"] = [
+        players_by_id[link.to_ref().id].model_dump(include={"id", "nickname", "full_name", "role"})
+        for link in profile.players if link.to_ref().id in players_by_id
+    ]
+    return TeamOut(**team_dict)
+
+
+@router.post("/teams/batch", response_model=List[TeamOut], tags=["Teams & Profiles"])
+async def get_teams_batch(batch: TeamBatchRequest):
+    """
+    Busca vários times pelo ID numa única requisição, na ordem pedida (IDs inexistentes ficam
+    de fora). Rota pública.
+    """
+    team_ids = list(dict.fromkeys(batch.ids))
+    # Times e jogadores são lidos ao mesmo tempo: cada jogador guarda o Link do seu time.
+    profiles, players = await asyncio.gather(
+        Team.find(In(Team.id, team_ids)).project(TeamProfile).to_list(),
+        Player.find(In(Player.team.id, team_ids)).to_list(),
+    )
+
+    players_by_team = {}
+    for player in players:
+        players_by_team.setdefault(player.team.to_ref().id, []).append(player)
+    profiles_by_id = {profile.id: profile for profile in profiles}
+    return [
+        to_team_out(profiles_by_id[team_id], players_by_team.get(team_id, []))
+        for team_id in team_ids if team_id in profiles_by_id
+    ]
+
+
+@router.get("/teams/{team_id}/page", response_model=TeamPageOut, tags=["Teams & Profiles"])
+async def get_team_page(
+    team_id: PydanticObjectId,
+    view_tracker: Annotated[ViewTracker, Depends(get_view_tracker)],
+    viewer_id: ViewerId,
+    posts_limit: Annotated[int, Query(ge=1, le=50)] = 10,
+    compact: CompactQuery = False
+):
+    """
+    Perfil, amigos e a primeira página de posts de um time numa única resposta (página de perfil).
+    Rota pública.
+    """
+    # As quatro leituras são independentes e rodam ao mesmo tempo.
+    profile, players, post_docs, stats = await asyncio.gather(
+        Team.find_one(Team.id == team_id).project(TeamPageProfile),
+        Player.find(Player.team.id == team_id).to_list(),
+        find_post_docs({"author.$id": team_id}, compact, viewer_id, posts_limit),
+        team_stats.get_stats(team_id),
+    )
+    if not profile:
+        raise HTTPException(status_code=404, detail="Time não encontrado.")
+
+    # Conta a visualização do perfil e dos posts da página depois de enviar a resposta
+    await view_tracker.record("team", [profile.id])
+    await view_tracker.record("post", [doc["_id"] for doc in post_docs])
+
+    # O time é o autor de todos os posts da página.
+    author = PostAuthor(**profile.model_dump(include={"id", "team_name", "tag"}))
+    return TeamPageOut(
+        team=to_team_out(profile, players),
+        friends=await snapshot_list(profile, "friends_info"),
+        posts=to_posts_out(post_docs, {profile.id: author}),
+        stats=stats or TeamStatsOut(),
+    )
+
+@router.get("/teams/{team_id}/views", response_model=ViewStats, tags=["Teams & Profiles"])
+async def get_team_views(
+    team_id: PydanticObjectId,
+    redis_client: Annotated[redis.Redis, Depends(get_redis_client)]
+):
+    """Visitantes distintos do perfil do time hoje, na semana e no mês (estimativa). Rota pública."""
+    return await views.unique_views(redis_client, "team", team_id)
+
+@router.get("/teams/{team_id}/stats", response_model=TeamStatsOut, tags=["Teams & Profiles"])
+async def get_team_stats(team_id: PydanticObjectId):
+    """
+    Posts, amigos, jogadores, likes recebidos e scrims por status de um time. Rota pública.
+    Os números vêm prontos da coleção `team_stats` (ver app/team_stats.py).
+    """
+    stats = await team_stats.get_stats(team_id)
+    if stats is None:
+        # Sem contadores: o time ainda não fez nada (ou não existe).
+        if not await Team.find_one(Team.id == team_id).project(TeamCard):
+            raise HTTPException(status_code=404, detail="Time não encontrado.")
+        return TeamStatsOut()
+    return stats
+
+@router.get("/teams/{team_id}/vs/{other_team_id}", response_model=HeadToHeadOut, tags=["Teams & Profiles"])
+async def get_head_to_head(team_id: PydanticObjectId, other_team_id: PydanticObjectId):
+    """
+    Confronto direto entre dois times nas scrims concluídas: jogos, vitórias, derrotas, empates,
+    último confronto e o mesmo por jogo, do ponto de vista de `team_id`. Rota pública.
+    """
+    if team_id == other_team_id:
+        raise HTTPException(status_code=400, detail="Escolha dois times diferentes.")
+    cards = {card.id: card for card in await Team.find(In(Team.id, [team_id, other_team_id])).project(TeamCard).to_list()}
+    if len(cards) < 2:
+        raise HTTPException(status_code=404, detail="Time não encontrado.")
+    # O retrospecto vem pronto do resumo do par (ver app/scrim_history.py).
+    return await scrim_history.get_head_to_head(cards[team_id], cards[other_team_id])
+
+@router.get("/teams/{team_id}/scrims/history", response_model=TeamScrimHistoryOut, tags=["Teams & Profiles"])
+async def get_team_scrim_history(
+    team_id: PydanticObjectId,
+    limit: Annotated[int, Query(ge=1, le=100, description="Quantos adversários listar.")] = 20
+):
+    """
+    Resumo das scrims concluídas de um time: totais, retrospecto por jogo e contra cada
+    adversário (do confronto mais recente ao mais antigo). Rota pública.
+    """
+    team, history = await asyncio.gather(
+        Team.find_one(Team.id == team_id).project(TeamCard),
+        scrim_history.get_team_history(team_id, limit),
+    )
     if not team:
         raise HTTPException(status_code=404, detail="Time não encontrado.")
-    return team
+    return history
 
 # Retorna os posts de um time específico.
 
 
 @router.get("/teams/{team_id}/posts", response_model=List[PostOut], tags=["Teams & Profiles"])
 # Recebe o ID do time pela URL.
-async def get_posts_by_team(team_id: PydanticObjectId):
-    """Retorna todos os posts feitos por um time específico."""
-    # Busca o time no banco para garantir que ele existe.
-    team = await Team.get(team_id)
+async def get_posts_by_team(
+    team_id: PydanticObjectId,
+    view_tracker: Annotated[ViewTracker, Depends(get_view_tracker)],
+    viewer_id: ViewerId,
+    limit: Annotated[Optional[int], Query(ge=1, le=50)] = None,
+    before: Optional[datetime] = None,
+    compact: CompactQuery = False
+):
+    """
+    Retorna os posts feitos por um time específico, do mais novo para o mais antigo.
+    Sem `limit`, devolve todos. Com `limit`, pagina: passe em `before` o `created_at` do
+    último post recebido para ler a próxima página (a página de perfil começa pela primeira).
+    """
+    # Busca o time no banco para garantir que ele existe (só id, nome e tag: ele é o autor de todos os posts).
+    team = await Team.find_one(Team.id == team_id).project(TeamPrincipal)
     if not team:
         raise HTTPException(status_code=404, detail="Time não encontrado.")
 
-    # Encontra todos os posts onde o autor corresponde ao ID do time.
-    posts = await Post.find(Post.author.id == team.id, fetch_links=True).sort(-Post.created_at).to_list()
+    # Encontra todos os posts onde o autor corresponde ao ID do time (sem carregar o autor de novo).
+    match = {"author.$id": team.id}
+    if before is not None:
+        match["created_at"] = {"$lt": before}
+    docs = await find_post_docs(match, compact, viewer_id, limit)
+    await view_tracker.record("post", [doc["_id"] for doc in docs])
 
     # Prepara a resposta no formato PostOut, que precisa do `likes_count`.
-    posts_out = []
-    for post in posts:
-        post_dict = post.model_dump()
-        post_dict["likes"] = [like.to_ref().id for like in post.likes]
-        post_dict["likes_count"] = len(post.likes)
-        posts_out.append(PostOut(**post_dict))
-    return posts_out
+    return to_posts_out(docs, {team.id: team})
 
 # Annotated: Ele separa o "o quê" (o tipo final, ex: Team) do "como" (a instrução para obtê-lo, ex: Depends(...)).
 # Retorna o current_team no modelo TeamOut
@@ -206,6 +394,13 @@ async def update_my_team_profile(
 
     # Salva o objeto `current_team` com as alterações de volta no banco de dados.
     await current_team.save()
+    await recommender.upsert_team(str(current_team.id), current_team.team_name, current_team.main_game)
+    # Nome e tag do time aparecem em respostas em cache (ex.: autor dos posts populares).
+    if {"team_name", "tag"} & update_dict.keys():
+        await response_cache.invalidate_tags("teams")
+    # Os amigos (e quem recebeu pedido) guardam uma cópia de nome/tag/jogo: atualiza em segundo plano.
+    if SNAPSHOT_FIELDS & update_dict.keys():
+        await task_queue.enqueue("snapshots.propagate_team", team_id=current_team.id)
 
     # Carrega a lista de jogadores para que a resposta seja completa.
     await current_team.fetch_link(Team.players)
@@ -273,6 +468,7 @@ async def add_player_to_team(
     # Adiciona o jogador à lista de jogadores do time e salva a alteração.
     current_team.players.append(player)
     await current_team.save()
+    await team_stats.increment(current_team.id, players_count=1)
 
     # Retorna os dados do jogador recém-criado.
     return player
@@ -303,6 +499,7 @@ async def delete_player_from_team(
 
     # Se a autorização passar, exclui o documento do jogador da coleção 'players'.
     await player_to_delete.delete()
+    await team_stats.increment(current_team.id, players_count=-1)
 
     # Para manter a consistência, também removemos a referência (Link) do jogador da lista de jogadores do time.
     # Encontra o link exato na lista do time.
@@ -323,38 +520,293 @@ async def delete_player_from_team(
 # Retorna uma lista de PostOut
 
 
+def to_post_out(post: Post, author: PostAuthor, compact: bool = False,
+                viewer_id: Optional[PydanticObjectId] = None) -> PostOut:
+    """Monta o PostOut de um post cujo autor já foi lido (likes viram só a lista de ids)."""
+    post_dict = post.model_dump(exclude={"author", "likes"})
+    post_dict["author"] = author.model_dump()
+    like_ids = [like.to_ref().id for like in post.likes]
+    if compact:
+        post_dict["liked_by_me"] = viewer_id in like_ids
+    else:
+        post_dict["likes"] = like_ids
+    post_dict["likes_count"] = len(like_ids)
+    return PostOut(**post_dict)
+
+
+async def load_authors(author_ids) -> Dict[PydanticObjectId, TeamPrincipal]:
+    """
+    Lê os autores dos posts numa única consulta, trazendo só id, nome e tag.
+    Substitui o `fetch_links=True`, que embutia o documento inteiro do autor em cada post
+    (senha, bio, listas de amigos...).
+    """
+    authors = await Team.find(In(Team.id, list(author_ids))).project(TeamPrincipal).to_list()
+    return {author.id: author for author in authors}
+
+
+def post_out_projection(compact: bool, viewer_id: Optional[PydanticObjectId]) -> dict:
+    """
+    `$project` que entrega os posts quase no formato do PostOut (o autor é lido à parte).
+    No modo compacto a lista de likes não sai do banco: saem só a contagem e se o time
+    logado está nela, calculados na mesma leitura para a página inteira.
+    """
+    projection = {
+        "content": 1, "created_at": 1, "author": 1, "comments": 1, "hashtags": 1, "mentions": 1,
+        "likes_count": {"$size": "$likes"},
+    }
+    if compact:
+        # Sem time logado, procura por null (que nunca está na lista): liked_by_me = false.
+        viewer_like = DBRef(Team.get_collection_name(), viewer_id) if viewer_id else None
+        projection["liked_by_me"] = {"$in": [{"$literal": viewer_like}, "$likes"]}
+    else:
+        projection["likes"] = {"$map": {"input": "$likes", "as": "like", "in": "$$like.$id"}}
+    return projection
+
+
+async def find_post_docs(match: dict, compact: bool, viewer_id: Optional[PydanticObjectId],
+                         limit: Optional[int] = None) -> List[dict]:
+    """
+    Posts que casam com `match`, do mais novo para o mais antigo, já projetados para o PostOut.
+    Lê a coleção quente e só desce para o arquivo (app/archive.py) quando ela não completa
+    `limit` posts (sem limite, desce sempre). Tudo no arquivo é mais antigo do que tudo na
+    coleção quente, então a ordem por data se mantém.
+    """
+    pipeline = [{"$match": match}, {"$sort": {"created_at": -1}}]
+    if limit is not None:
+        pipeline.append({"$limit": limit})
+    pipeline.append({"$project": post_out_projection(compact, viewer_id)})
+
+    docs = await Post.aggregate(pipeline).to_list()
+    if limit is not None and len(docs) >= limit:
+        return docs
+    if limit is not None:
+        pipeline[2] = {"$limit": limit - len(docs)}
+    archived = await ArchivedPost.aggregate(pipeline).to_list()
+    # Um lote no meio do arquivamento pode aparecer nas duas coleções.
+    seen = {doc["_id"] for doc in docs}
+    return docs + [doc for doc in archived if doc["_id"] not in seen]
+
+
+async def find_post_docs_by_ids(post_ids: List[PydanticObjectId], compact: bool,
+                                viewer_id: Optional[PydanticObjectId]) -> List[dict]:
+    """Como `find_post_docs`, para ids conhecidos: os que não estão na coleção quente são procurados no arquivo."""
+    projection = {"$project": post_out_projection(compact, viewer_id)}
+    docs = await Post.aggregate([{"$match": {"_id": {"$in": post_ids}}}, projection]).to_list()
+    missing = set(post_ids) - {doc["_id"] for doc in docs}
+    if missing:
+        docs += await ArchivedPost.aggregate([{"$match": {"_id": {"$in": list(missing)}}}, projection]).to_list()
+    return docs
+
+
+def to_posts_out(docs: List[dict], authors: Dict[PydanticObjectId, PostAuthor]) -> List[PostOut]:
+    """PostOut dos documentos projetados, na mesma ordem; posts de times que não existem mais ficam de fora."""
+    results = []
+    for doc in docs:
+        author = authors.get(doc["author"].id)
+        if author is not None:
+            fields = {name: value for name, value in doc.items() if name not in ("_id", "author")}
+            results.append(PostOut(id=doc["_id"], author=author.model_dump(), **fields))
+    return results
+
+
+async def load_posts_out(match: dict, compact: bool, viewer_id: Optional[PydanticObjectId],
+                         limit: Optional[int] = None) -> List[PostOut]:
+    """Posts de `find_post_docs` já como PostOut, com os autores lidos numa segunda consulta."""
+    docs = await find_post_docs(match, compact, viewer_id, limit)
+    authors = await load_authors({doc["author"].id for doc in docs})
+    return to_posts_out(docs, authors)
+
+
+async def load_ranked_posts_out(post_ids: List[str], compact: bool,
+                                viewer_id: Optional[PydanticObjectId]) -> List[PostOut]:
+    """Como `load_posts_out`, para uma lista de ids já ranqueada (mantém a ordem dela)."""
+    object_ids = [PydanticObjectId(post_id) for post_id in post_ids]
+    docs = await find_post_docs_by_ids(object_ids, compact, viewer_id)
+    authors = await load_authors({doc["author"].id for doc in docs})
+    position = {post_id: index for index, post_id in enumerate(object_ids)}
+    return sorted(to_posts_out(docs, authors), key=lambda post: position[post.id])
+
+
 @router.get("/posts", response_model=List[PostOut], tags=["Posts"])
-async def get_all_posts():
-    """Lista todos os posts do feed, do mais novo para o mais antigo. Rota pública."""
-    # fetch_links para: "Quando você encontrar os posts, olhe para os campos que são Links (como o campo author)"
-    # ordenado por data de criação
-    posts = await Post.find_all(fetch_links=True).sort(-Post.created_at).to_list()
-
-    posts_out = []
-    for post in posts:
-        post_dict = post.model_dump()
-        post_dict["likes"] = [like.to_ref().id for like in post.likes]
-        post_dict["likes_count"] = len(post.likes)
-        posts_out.append(PostOut(**post_dict))
-    return posts_out
+async def get_all_posts(
+    view_tracker: Annotated[ViewTracker, Depends(get_view_tracker)],
+    viewer_id: ViewerId,
+    limit: Annotated[Optional[int], Query(ge=1, le=100)] = None,
+    before: Optional[datetime] = None,
+    compact: CompactQuery = False
+):
+    """
+    Lista os posts do feed, do mais novo para o mais antigo. Rota pública.
+    Sem `limit`, devolve todos (inclusive os arquivados). Com `limit`, pagina: passe em
+    `before` o `created_at` do último post recebido para ler a próxima página.
+    """
+    # Posts ordenados por data de criação; os autores vêm numa segunda consulta, projetada.
+    # Posts de times que não existem mais ficam de fora (antes, quebravam a resposta).
+    match = {"created_at": {"$lt": before}} if before is not None else {}
+    posts = await load_posts_out(match, compact, viewer_id, limit)
+    await view_tracker.record("post", [post.id for post in posts])
+    return posts
+
+@router.get("/feed", response_model=List[PostOut], tags=["Posts (Protected)"])
+async def get_home_feed(
+    current_team: Annotated[TeamPrincipal, Depends(get_current_principal)],
+    view_tracker: Annotated[ViewTracker, Depends(get_view_tracker)],
+    limit: Annotated[int, Query(ge=1, le=50)] = 20,
+    offset: Annotated[int, Query(ge=0)] = 0,
+    compact: CompactQuery = False
+):
+    """
+    Feed inicial do time logado: posts dos amigos, populares e do mesmo jogo, ranqueados
+    por recência, likes, comentários e proximidade do autor. Paginado por `offset`.
+    """
+    # A lista ranqueada (só ids) vem do cache por time; do MongoDB saem só os posts da página.
+    ranked = await feed.get_feed(current_team.id)
+    post_ids = [post_id for post_id, _ in ranked[offset:offset + limit]]
+
+    results = await load_ranked_posts_out(post_ids, compact, current_team.id)
+    await view_tracker.record("post", [post.id for post in results])
+    return results
+
+@router.get("/posts/search", response_model=PostSearchOut, tags=["Posts"])
+async def search_posts(
+    q: Annotated[str, Query(min_length=1, max_length=200)],
+    redis_client: Annotated[redis.Redis, Depends(get_redis_client)],
+    view_tracker: Annotated[ViewTracker, Depends(get_view_tracker)],
+    viewer_id: ViewerId,
+    author_id: Optional[PydanticObjectId] = None,
+    game: Optional[GameEnum] = None,
+    limit: Annotated[int, Query(ge=1, le=50)] = 20,
+    cursor: Optional[str] = None,
+    compact: CompactQuery = False
+):
+    """
+    Busca posts pelo conteúdo. Os resultados vêm ordenados por relevância, recência e likes,
+    e podem ser filtrados por autor e pelo jogo principal do autor. Rota pública.
+    Para a próxima página, repita a busca passando o `next_cursor` recebido.
+    """
+    # O ranking é feito no índice do Redis (app/search.py); do MongoDB saem só os posts da página.
+    try:
+        post_ids, next_cursor = await post_search.search(
+            redis_client, q, author_id=author_id, game=game.value if game else None,
+            limit=limit, cursor=cursor)
+    except post_search.InvalidCursor:
+        raise HTTPException(status_code=400, detail="Cursor de paginação inválido.")
+
+    # Mantém a ordem do ranking; posts apagados ou de times que não existem mais ficam de fora.
+    results = await load_ranked_posts_out(post_ids, compact, viewer_id)
+    await view_tracker.record("post", [post.id for post in results])
+    return {"posts": results, "next_cursor": next_cursor}
+
+
+@router.get("/posts/{post_id}/views", response_model=ViewStats, tags=["Posts"])
+async def get_post_views(
+    post_id: PydanticObjectId,
+    redis_client: Annotated[redis.Redis, Depends(get_redis_client)]
+):
+    """Visitantes distintos do post hoje, na semana e no mês (estimativa). Rota pública."""
+    return await views.unique_views(redis_client, "post", post_id)
+
+
+@router.get("/posts/{post_id}/likes", response_model=PostLikesOut, tags=["Posts"])
+async def get_post_likes(
+    post_id: PydanticObjectId,
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+    offset: Annotated[int, Query(ge=0)] = 0
+):
+    """Times que curtiram o post, paginados, na ordem em que curtiram. Rota pública."""
+    # Só a fatia pedida da lista de likes sai do banco, junto com o tamanho total.
+    pipeline = [
+        {"$match": {"_id": post_id}},
+        {"$project": {"likes_count": {"$size": "$likes"}, "page": {"$slice": ["$likes", offset, limit]}}},
+    ]
+    docs = await Post.aggregate(pipeline).to_list() or await ArchivedPost.aggregate(pipeline).to_list()
+    if not docs:
+        raise HTTPException(status_code=404, detail="Post não encontrado.")
+
+    team_ids = [like.id for like in docs[0]["page"]]
+    teams = await Team.find(In(Team.id, team_ids)).project(TeamCard).to_list()
+    teams_by_id = {team.id: team for team in teams}
+    return {
+        "likes_count": docs[0]["likes_count"],
+        "teams": [teams_by_id[team_id] for team_id in team_ids if team_id in teams_by_id],
+    }
+
+
+@router.get("/trending/hashtags", response_model=List[TrendingHashtag], tags=["Posts"])
+async def get_trending_hashtags(
+    redis_client: Annotated[redis.Redis, Depends(get_redis_client)],
+    window: Literal["hour", "day"] = "hour",
+    limit: Annotated[int, Query(ge=1, le=50)] = 10
+):
+    """Hashtags mais usadas na última hora ou no último dia. Rota pública."""
+    # Lido dos contadores por janela no Redis (app/trending.py), sem consultar os posts.
+    top = await trending.top_hashtags(redis_client, window, limit)
+    return [{"tag": tag, "count": count} for tag, count in top]
+
+
+@router.get("/hashtags/{tag}/posts", response_model=List[PostOut], tags=["Posts"])
+async def get_posts_by_hashtag(
+    tag: str,
+    view_tracker: Annotated[ViewTracker, Depends(get_view_tracker)],
+    viewer_id: ViewerId,
+    limit: Annotated[int, Query(ge=1, le=50)] = 20,
+    before: Optional[datetime] = None,
+    compact: CompactQuery = False
+):
+    """
+    Posts com a hashtag, do mais novo para o mais antigo. Rota pública.
+    Para a próxima página, passe em `before` o `created_at` do último post recebido.
+    """
+    # Mesma normalização da extração: "#Campeão", "campeao" e "CAMPEAO" são a mesma hashtag.
+    match = {"hashtags": trending.normalize_hashtag(tag)}
+    if before is not None:
+        match["created_at"] = {"$lt": before}
+    # Usa o índice (hashtags, created_at): lê só os posts da página.
+    posts = await load_posts_out(match, compact, viewer_id, limit)
+    await view_tracker.record("post", [post.id for post in posts])
+    return posts
 
 # Define a rota, o que ela retorna (PostOut)
 
 
 @router.post("/posts", response_model=PostOut, status_code=status.HTTP_201_CREATED, tags=["Posts (Protected)"])
-# A função recebe os dados do post (PostCreate), o time logado (autenticado)
-# e agora também injeta o cliente Redis para podermos publicar eventos.
+# A função recebe os dados do post (PostCreate) e o time logado (autenticado).
 async def create_post(
     post_data: PostCreate,
-    current_team: Annotated[Team, Depends(get_current_team)],
-    redis_client: Annotated[redis.Redis, Depends(get_redis_client)]
+    current_team: Annotated[TeamPrincipal, Depends(get_current_principal)]
 ):
     """Cria um novo post e publica um evento no stream de atividades."""
 
-    # Cria a instância do novo post, associando o conteúdo recebido e o time logado como autor.
-    post = Post(content=post_data.content, author=current_team)
+    # Hashtags e menções vão para campos indexados do post. Uma menção (@TAG) vale para
+    # todos os times com essa tag (a tag não é única); menções sem time são ignoradas.
+    hashtags = trending.extract_hashtags(post_data.content)
+    mentions = []
+    handles = trending.extract_mentions(post_data.content)
+    if handles:
+        variants = list({variant for handle in handles for variant in (handle, handle.upper())})
+        mentioned = await Team.find(In(Team.tag, variants)).project(TeamCard).to_list()
+        mentions = [team.id for team in mentioned]
+
+    # Cria a instância do novo post, associando o conteúdo recebido e o time logado como autor
+    # (uma referência ao time basta; o documento dele não é carregado).
+    post = Post(
+        content=post_data.content,
+        author=DBRef(Team.get_collection_name(), current_team.id),
+        hashtags=hashtags,
+        mentions=mentions,
+    )
     # Insere o novo post na coleção 'posts' do banco de dados.
     await post.insert()
+    await team_stats.increment(current_team.id, posts_count=1)
+    # O feed ranqueado do autor é recalculado para já mostrar o post novo.
+    await response_cache.invalidate_tags("posts", f"feed:{current_team.id}")
+    # O resto sai do caminho da resposta (fila de tarefas, app/task_queue.py):
+    # as hashtags entram nas janelas de "em alta" e o post, no índice da busca.
+    if hashtags:
+        await task_queue.enqueue("trending.record_hashtags", hashtags=hashtags, at=post.created_at)
+    await task_queue.enqueue(
+        "search.index_post", post_id=post.id, content=post.content, author_id=current_team.id,
+        game=current_team.main_game.value if current_team.main_game else None, created_at=post.created_at)
 
     # Publica o evento no Stream
     # Prepara os dados do evento que serão anunciados no "mural" de atividades.
@@ -363,51 +815,103 @@ async def create_post(
         "team_name": current_team.team_name,
         "content_preview": (post.content[:50] + '...') if len(post.content) > 50 else post.content
     }
-    # Publica o evento no stream chamado "activity_stream" no Redis.
-    await redis_client.xadd("activity_stream", event_data)
-
-    # Carrega os dados completos do autor para que possam ser incluídos na resposta.
-    await post.fetch_link(Post.author)
-    # Converte o objeto Post em um dicionário para facilitar a manipulação.
-    post_dict = post.model_dump()
-    # Adiciona os campos de likes (vazios, pois o post é novo) para corresponder ao modelo PostOut.
-    post_dict["likes"] = []
-    post_dict["likes_count"] = 0
-    # Cria e retorna um objeto PostOut com todos os dados necessários, garantindo que a resposta esteja correta.
-    return PostOut(**post_dict)
+    # Publica o evento no stream chamado "activity_stream" no Redis (em segundo plano).
+    await task_queue.enqueue("activity_stream.publish", event=event_data)
+
+    # O autor é o próprio time logado, já lido pela autenticação; os likes começam vazios.
+    return to_post_out(post, current_team)
 
 # Retorna no modelo PostOut
 
 
 @router.post("/posts/{post_id}/like", response_model=PostOut, tags=["Posts (Protected)"])
-async def toggle_like_post(post_id: PydanticObjectId, current_team: Annotated[Team, Depends(get_current_team)]):
+async def toggle_like_post(
+    post_id: PydanticObjectId,
+    current_team: Annotated[TeamPrincipal, Depends(get_current_principal)],
+    compact: CompactQuery = False
+):
     """Adiciona ou remove um like de um post."""
-    post = await Post.get(post_id)  # Pega o post pelo ID passado pelo endpoint
-    if not post:
+    # O like é alterado direto no banco ($push / $pull), sem ler o post antes e regravá-lo
+    # inteiro com save(): cada operação devolve o post já atualizado.
+    like = DBRef(Team.get_collection_name(), current_team.id)
+
+    # Tenta curtir: só casa se o time ainda não estiver nos likes.
+    post = await Post.find_one({"_id": post_id, "likes.$id": {"$ne": current_team.id}}).update(
+        {"$push": {"likes": like}}, response_type=UpdateResponse.NEW_DOCUMENT)
+    delta = 1
+    if post is None:
+        # Já tinha curtido (ou o post não existe): remove o like.
+        post = await Post.find_one({"_id": post_id, "likes.$id": current_team.id}).update(
+            {"$pull": {"likes": like}}, response_type=UpdateResponse.NEW_DOCUMENT)
+        delta = -1
+    if post is None:
         raise HTTPException(status_code=404, detail="Post não encontrado.")
-
-    found = False  # Bandeira
-    # Para cada like do post
-    for team_link in post.likes:
-        # o ".to_ref()" serve para pegarmos os dados brutos daquele documento
-        # Se dentro dos likes o current_team estiver é para remover o like
-        if team_link.to_ref().id == current_team.id:
-            post.likes.remove(team_link)
-            found = True
-            break
-    if not found:
-        # Se não estiver, é para adicionar o like
-        post.likes.append(current_team)
-    await post.save()
-
-    await post.fetch_link(Post.author)  # Carrega os dados do autor do post
-    post_dict = post.model_dump()
-    # Lista com apenas os times que curtiram o post
-    post_dict["likes"] = [like.to_ref().id for like in post.likes]
-    # Atualiza a quantidade de likes do post
-    post_dict["likes_count"] = len(post.likes)
-    # Retorna os dados atualizados no modelo PostOut  ** Serve para desempacator o dict
-    return PostOut(**post_dict)
+    # Likes recebidos pelo autor do post
+    await team_stats.increment(post.author.to_ref().id, likes_received=delta)
+    # A busca de posts usa os likes no ranking (em segundo plano)
+    await task_queue.enqueue("search.set_likes", likes_by_post={str(post.id): len(post.likes)})
+
+    # Carrega só id, nome e tag do autor do post
+    author = await Team.find_one(Team.id == post.author.to_ref().id).project(TeamPrincipal)
+    # Retorna os dados atualizados no modelo PostOut
+    return to_post_out(post, author, compact, current_team.id)
+
+@router.post("/posts/likes/batch", response_model=List[PostLikeState], tags=["Posts (Protected)"])
+async def batch_like_posts(
+    batch: LikeBatchRequest,
+    current_team: Annotated[TeamPrincipal, Depends(get_current_principal)]
+):
+    """
+    Curte e descurte vários posts numa única requisição. Ao contrário da rota de um post só,
+    não alterna: curtir um post já curtido (ou descurtir um não curtido) não muda nada.
+    Devolve como cada post ficou, na ordem pedida (posts inexistentes ficam de fora).
+    """
+    like_ids = list(dict.fromkeys(batch.like))
+    unlike_ids = list(dict.fromkeys(batch.unlike))
+    if set(like_ids) & set(unlike_ids):
+        raise HTTPException(
+            status_code=400, detail="Um post não pode ser curtido e descurtido na mesma requisição.")
+
+    # Todas as alterações vão ao banco numa única ida (bulk_write), como na rota de um post só.
+    like = DBRef(Team.get_collection_name(), current_team.id)
+    post_ids = like_ids + unlike_ids
+    # Antes: o autor de cada post e se o time já curtia (para saber quais likes mudaram de fato).
+    before = await Post.get_motor_collection().aggregate([
+        {"$match": {"_id": {"$in": post_ids}}},
+        {"$project": {"author": 1, "liked": {"$in": [{"$literal": like}, "$likes"]}}},
+    ]).to_list(None)
+    operations = [
+        UpdateOne({"_id": post_id, "likes.$id": {"$ne": current_team.id}}, {"$push": {"likes": like}})
+        for post_id in like_ids
+    ]
+    operations += [UpdateOne({"_id": post_id}, {"$pull": {"likes": like}}) for post_id in unlike_ids]
+    if operations:
+        await Post.get_motor_collection().bulk_write(operations, ordered=False)
+
+    # Lê como os posts ficaram sem trazer as listas de likes: só a contagem e se o time está nela.
+    states = await Post.aggregate([
+        {"$match": {"_id": {"$in": post_ids}}},
+        {"$project": {
+            "post_id": "$_id",
+            "likes_count": {"$size": "$likes"},
+            "liked": {"$in": [{"$literal": like}, "$likes"]},
+        }},
+    ], projection_model=PostLikeState).to_list()
+
+    states_by_id = {state.post_id: state for state in states}
+    if states:
+        await task_queue.enqueue(
+            "search.set_likes", likes_by_post={str(state.post_id): state.likes_count for state in states})
+
+    # Likes recebidos por cada autor: a diferença entre o antes e o depois de cada post.
+    deltas = {}
+    for doc in before:
+        state = states_by_id.get(doc["_id"])
+        if state is not None and state.liked != doc["liked"]:
+            author_id = doc["author"].id
+            deltas[author_id] = deltas.get(author_id, 0) + (1 if state.liked else -1)
+    await team_stats.increment_many({author_id: {"likes_received": delta} for author_id, delta in deltas.items()})
+    return [states_by_id[post_id] for post_id in post_ids if post_id in states_by_id]
 
 # Define a rota (com ID do post), o que ela retorna (o Comentário criado)
 
@@ -417,47 +921,60 @@ async def toggle_like_post(post_id: PydanticObjectId, current_team: Annotated[Te
 async def create_comment_on_post(
     post_id: PydanticObjectId,
     comment_data: CommentCreate,
-    current_team: Annotated[Team, Depends(get_current_team)]
+    current_team: Annotated[TeamPrincipal, Depends(get_current_principal)]
 ):
     """Adiciona um novo comentário a um post."""
-    # Busca no banco de dados o post que será comentado, usando o ID da URL.
-    post = await Post.get(post_id)
-    # Se o post não for encontrado, retorna um erro 404.
-    if not post:
-        raise HTTPException(status_code=404, detail="Post não encontrado.")
-
     # Prepara os dados do autor do comentário (o time logado), pegando apenas os campos públicos necessários.
     author_data = current_team.model_dump(include={'id', 'team_name', 'tag'})
     # Cria a instância do novo comentário com os dados do autor e o conteúdo recebido.
     new_comment = Comment(author=author_data, content=comment_data.content)
-    # Adiciona o novo comentário à lista de comentários embutida no documento do post.
-    post.comments.append(new_comment)
-    # Salva o documento do post, agora com o novo comentário na sua lista.
-    await post.save()
+    # Acrescenta o comentário à lista embutida no post direto no banco ($push),
+    # sem ler o post (com todos os likes e comentários) nem regravá-lo inteiro.
+    result = await Post.find_one(Post.id == post_id).update(Push({Post.comments: new_comment}))
+    # Se o post não for encontrado, retorna um erro 404.
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Post não encontrado.")
+    # Respostas em cache que mostram comentários (ex.: posts populares) ficam velhas.
+    await response_cache.invalidate_tags("posts")
     # Retorna o comentário recém-criado, que será enviado como resposta JSON.
     return new_comment
 
 
 # Retorna uma lista dos 5 posts mais populares no modelo PostOut
 @router.get("/posts/popular", response_model=List[PostOut], tags=["Posts"])
-# Injeta uma conexão do nosso pool de Redis na rota
-async def get_popular_posts(redis_client: Annotated[redis.Redis, Depends(get_redis_client)]):
+async def get_popular_posts(
+    view_tracker: Annotated[ViewTracker, Depends(get_view_tracker)],
+    viewer_id: ViewerId,
+    compact: CompactQuery = False
+):
     """
     Retorna os 5 posts mais populares (com mais likes), usando Aggregation Pipeline
     para máxima performance.
     """
-    # Define a chave do cache
-    cache_key = "popular_posts"
-    # Tenta obter o resultado do cache
-    cached_result = await redis_client.get(cache_key)
-
-    if cached_result:
-        # Cache HIT (Encontrou no cache)
-        print("CACHE HIT para posts populares!")
-        # Converte o texto JSON de volta para uma lista de objetos e retorna.
-        return json.loads(cached_result)
-
-    print("CACHE MISS para posts populares. Buscando no MongoDB...")
+    posts = await load_popular_posts()
+    post_ids = [post["id"] for post in posts]
+    # Conta as visualizações também quando a resposta vem do cache
+    await view_tracker.record("post", post_ids)
+
+    if not compact:
+        return posts
+    # A lista em cache é a mesma para todos; o que o time logado curtiu sai de uma única
+    # consulta de pertinência sobre os posts da lista.
+    liked = set()
+    if viewer_id is not None:
+        liked = {str(post_id) for post_id in await Post.distinct(
+            "_id", {"_id": {"$in": [PydanticObjectId(post_id) for post_id in post_ids]}, "likes.$id": viewer_id})}
+    return [{**post, "likes": None, "liked_by_me": post["id"] in liked} for post in posts]
+
+# A lista fica no cache em duas camadas (memória + Redis) por 5 minutos.
+# Novos posts/comentários invalidam a tag "posts"; mudanças de perfil, a tag "teams" (nome/tag do autor).
+# Likes não invalidam: a contagem pode ficar até 5 minutos atrasada, como antes.
+@cached("popular_posts", ttl=300, tags=("posts", "teams"))
+async def load_popular_posts():
+    """
+    Os 5 posts com mais likes, já no formato de PostOut (guardados no cache).
+    Só a coleção quente é considerada: os posts arquivados são antigos demais para estar em alta.
+    """
     # Define as etapas do Aggregation Pipeline, que serão executadas em ordem.
     pipeline = [
         # Adiciona um campo temporário 'likes_count' a cada post,
@@ -515,7 +1032,10 @@ async def get_popular_posts(redis_client: Annotated[redis.Redis, Depends(get_red
                     }
                 },
                 # Mantém a lista de comentários como está.
-                "comments": "$comments"
+                "comments": "$comments",
+                # Posts anteriores à extração de hashtags/menções não têm esses campos.
+                "hashtags": {"$ifNull": ["$hashtags", []]},
+                "mentions": {"$ifNull": ["$mentions", []]}
             }
         }
     ]
@@ -524,15 +1044,6 @@ async def get_popular_posts(redis_client: Annotated[redis.Redis, Depends(get_red
     # O `projection_model=PostOut` converte o resultado diretamente para uma lista de objetos PostOut.
     posts = await Post.aggregate(pipeline, projection_model=PostOut).to_list()
 
-    # Antes de retornar, salva o resultado no cache para a próxima vez.
-    # Converte a lista de objetos para uma string JSON para poder salvar no Redis.
-    # `ex=300` define a expiração para 300 segundos (5 minutos).
-    await redis_client.set(
-        cache_key,
-        json.dumps([p.model_dump(mode='json') for p in posts]),
-        ex=300
-    )
-
     # Retorna a lista final com os 5 posts mais populares.
     return posts
 
@@ -569,8 +1080,9 @@ async def send_friend_request(
 
     # Adiciona o time alvo à lista de pedidos enviados do time logado.
     current_team.friend_requests_sent.append(target_team)
-    # Adiciona o time logado à lista de pedidos recebidos do time alvo.
+    # Adiciona o time logado à lista de pedidos recebidos do time alvo (e a cópia dos seus dados).
     target_team.friend_requests_received.append(current_team)
+    target_team.friend_requests_received_info.append(team_snapshot(current_team))
 
     # Salva as alterações no documento do time logado.
     await current_team.save()
@@ -584,12 +1096,10 @@ async def send_friend_request(
 
 
 @router.post("/friends/accept/{requester_team_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Friends (Protected)"])
-# A função recebe o ID do solicitante, o time logado (autenticado) e o cliente Redis.
+# A função recebe o ID do solicitante e o time logado (autenticado).
 async def accept_friend_request(
     requester_team_id: PydanticObjectId,
-    current_team: Annotated[Team, Depends(get_current_team)],
-    redis_client: Annotated[redis.Redis, Depends(
-        get_redis_client)]  # Injeta o cliente Redis
+    current_team: Annotated[Team, Depends(get_current_team)]
 ):
     """Aceita um pedido de amizade recebido e publica um evento no stream."""
 
@@ -609,6 +1119,11 @@ async def accept_friend_request(
         raise HTTPException(
             status_code=404, detail="Pedido de amizade não encontrado.")
 
+    # As cópias acompanham os Links; documentos antigos, ainda sem cópias, são remontados antes.
+    await snapshot_list(current_team, "friend_requests_received_info")
+    await snapshot_list(current_team, "friends_info")
+    await snapshot_list(requester_team, "friends_info")
+
     # Encontra os "atalhos" (Links) exatos que precisam ser removidos das listas de pedidos.
     # Encontra o pedido na sua lista de "recebidos".
     request_to_remove_from_current = next(
@@ -626,14 +1141,21 @@ async def accept_friend_request(
         requester_team.friend_requests_sent.remove(
             request_to_remove_from_requester)
 
+    remove_snapshot(current_team.friend_requests_received_info, requester_team.id)
+
     # Etapa final: Adiciona cada time à lista de amigos um do outro.
     current_team.friends.append(requester_team)
     requester_team.friends.append(current_team)
+    current_team.friends_info.append(team_snapshot(requester_team))
+    requester_team.friends_info.append(team_snapshot(current_team))
 
     # Salva as alterações no seu documento.
     await current_team.save()
     # Salva as alterações no documento do seu novo amigo.
     await requester_team.save()
+    await team_stats.increment_many({current_team.id: {"friends_count": 1}, requester_team.id: {"friends_count": 1}})
+    # Com o motor embutido, atualiza o grafo em memória de forma incremental (e avisa os outros workers).
+    await recommender.add_friendship(str(current_team.id), str(requester_team.id))
 
     # -Publica o evento de nova amizade no Stream
     # Prepara os dados do evento com os nomes dos dois times.
@@ -642,8 +1164,8 @@ async def accept_friend_request(
         "team1_name": current_team.team_name,
         "team2_name": requester_team.team_name
     }
-    # Publica o evento no stream "activity_stream" no Redis.
-    await redis_client.xadd("activity_stream", event_data)
+    # Publica o evento no stream "activity_stream" no Redis (em segundo plano).
+    await task_queue.enqueue("activity_stream.publish", event=event_data)
 
     # Retorna `None` para indicar sucesso sem conteúdo.
     return None
@@ -655,10 +1177,8 @@ async def accept_friend_request(
 # A dependência `get_current_team` garante a autenticação e nos dá o time logado.
 async def get_my_friends(current_team: Annotated[Team, Depends(get_current_team)]):
     """Retorna a lista de amigos do time logado."""
-    # Carrega os dados completos dos times que estão na lista de amigos.
-    await current_team.fetch_link(Team.friends)
-    # Retorna a lista de amigos já preenchida com os dados.
-    return current_team.friends
+    # As cópias dos amigos já vêm no documento do time: nenhuma leitura extra.
+    return await snapshot_list(current_team, "friends_info")
 
 # Retorna os pedidos de amizade recebidos pelo time logado.
 
@@ -666,10 +1186,8 @@ async def get_my_friends(current_team: Annotated[Team, Depends(get_current_team)
 @router.get("/friends/requests", response_model=List[FriendInfo], tags=["Friends (Protected)"])
 async def get_my_friend_requests(current_team: Annotated[Team, Depends(get_current_team)]):
     """Retorna a lista de pedidos de amizade recebidos pelo time logado."""
-    # Carrega os dados completos dos times que enviaram pedidos de amizade.
-    await current_team.fetch_link(Team.friend_requests_received)
-    # Retorna a lista de pedidos recebidos já preenchida.
-    return current_team.friend_requests_received
+    # As cópias de quem enviou os pedidos já vêm no documento do time.
+    return await snapshot_list(current_team, "friend_requests_received_info")
 
 # Retorna a lista de amigos de um time específico (rota pública).
 
@@ -682,10 +1200,8 @@ async def get_team_friends(team_id: PydanticObjectId):
     if not team:
         raise HTTPException(status_code=404, detail="Time não encontrado.")
 
-    # Carrega os dados completos dos amigos do time encontrado.
-    await team.fetch_link(Team.friends)
-    # Retorna a lista de amigos.
-    return team.friends
+    # Retorna as cópias dos amigos guardadas no próprio documento do time.
+    return await snapshot_list(team, "friends_info")
 
 # =============================================================================
 # --- Rotas para Scrims (Protegidas) ---
@@ -694,16 +1210,41 @@ async def get_team_friends(team_id: PydanticObjectId):
 # Define a rota POST para criar/propor uma nova scrim.
 
 
+async def to_scrims_out(scrims: List[Scrim]) -> List[ScrimOut]:
+    """
+    Monta os ScrimOut lendo, numa única consulta, só os cartões (TeamCard) dos times envolvidos.
+    Substitui o `fetch_links=True`, que carregava o documento inteiro dos dois times de cada scrim.
+    """
+    team_ids = {scrim.proposing_team.to_ref().id for scrim in scrims}
+    team_ids |= {scrim.opponent_team.to_ref().id for scrim in scrims}
+    cards = {card.id: card for card in await Team.find(In(Team.id, list(team_ids))).project(TeamCard).to_list()}
+
+    scrims_out = []
+    for scrim in scrims:
+        proposing = cards.get(scrim.proposing_team.to_ref().id)
+        opponent = cards.get(scrim.opponent_team.to_ref().id)
+        # Scrims de times que não existem mais ficam de fora.
+        if proposing and opponent:
+            scrim_dict = scrim.model_dump(exclude={"proposing_team", "opponent_team"})
+            scrims_out.append(ScrimOut(**scrim_dict, proposing_team=proposing.model_dump(),
+                                       opponent_team=opponent.model_dump()))
+    return scrims_out
+
+
+def scrim_deltas(scrim: Scrim, deltas: Dict[str, int]) -> Dict[PydanticObjectId, Dict[str, int]]:
+    """Os mesmos deltas de contadores para os dois times de uma scrim."""
+    return {scrim.proposing_team.to_ref().id: deltas, scrim.opponent_team.to_ref().id: deltas}
+
+
 @router.post("/scrims", response_model=ScrimOut, status_code=status.HTTP_201_CREATED, tags=["Scrims (Protected)"])
 # A função recebe os dados da scrim (oponente, data, jogo) e o time logado (proponente).
 async def propose_scrim(
     scrim_data: ScrimCreate,
-    current_team: Annotated[Team, Depends(get_current_team)]
+    current_team: Annotated[TeamPrincipal, Depends(get_current_principal)]
 ):
     """Propõe uma nova scrim para outro time."""
-    # Busca no banco o time que foi convidado (oponente).
-    opponent_team = await Team.get(scrim_data.opponent_team_id)
-    # Valida se o oponente existe e não é o próprio time.
+    # Valida se o oponente existe e não é o próprio time (só o cartão dele é lido).
+    opponent_team = await Team.find_one(Team.id == scrim_data.opponent_team_id).project(TeamCard)
     if not opponent_team or opponent_team.id == current_team.id:
         raise HTTPException(
             status_code=404, detail="Time oponente inválido ou não encontrado.")
@@ -711,43 +1252,33 @@ async def propose_scrim(
     # Cria a instância do documento Scrim...
     scrim = Scrim(
         # ...definindo o time logado como proponente.
-        proposing_team=current_team,
-        opponent_team=opponent_team,  # ...o time alvo como oponente.
+        proposing_team=DBRef(Team.get_collection_name(), current_team.id),
+        opponent_team=DBRef(Team.get_collection_name(), opponent_team.id),  # ...o time alvo como oponente.
         scrim_datetime=scrim_data.scrim_datetime,  # ...a data e hora.
         game=scrim_data.game,  # ...e o jogo.
         # O status inicial já é "Pendente" por padrão.
     )
     # Insere a nova scrim na coleção 'scrims'.
     await scrim.insert()
+    await team_stats.increment_many(scrim_deltas(scrim, {"scrims_pending": 1}))
 
-    # Carrega os dados completos dos times (proponente e oponente) para a resposta.
-    await scrim.fetch_all_links()
-
-    # Retorna o objeto da scrim recém-criada, formatado pelo `ScrimOut`.
-    return scrim
+    # Retorna a scrim recém-criada, com os cartões dos dois times, formatada pelo `ScrimOut`.
+    return (await to_scrims_out([scrim]))[0]
 
 
 @router.get("/scrims/me", response_model=List[ScrimOut], tags=["Scrims (Protected)"])
-async def get_my_scrims(current_team: Annotated[Team, Depends(get_current_team)]):
+async def get_my_scrims(current_team: Annotated[TeamPrincipal, Depends(get_current_principal)]):
     """
     Lista todas as scrims (propostas ou recebidas) do time logado.
-    Esta versão busca todos os dados e filtra em Python para máxima robustez.
     """
-    # Etapa 1: Busca TODAS as scrims no banco de dados, já carregando os dados dos times.
-    all_scrims = await Scrim.find_all(fetch_links=True).to_list()
-
-    # Etapa 2: Filtra a lista em Python para encontrar apenas as scrims que envolvem o time logado.
-    my_scrims = []
-    for scrim in all_scrims:
-        # Verifica se o time logado é o proponente OU o oponente.
-        if scrim.proposing_team.id == current_team.id or scrim.opponent_team.id == current_team.id:
-            my_scrims.append(scrim)
+    # Busca só as scrims em que o time logado é o proponente OU o oponente,
+    # da mais nova para a mais antiga.
+    my_scrims = await Scrim.find(
+        Or(Scrim.proposing_team.id == current_team.id, Scrim.opponent_team.id == current_team.id)
+    ).sort(-Scrim.scrim_datetime).to_list()
 
-    # Etapa 3: Ordena a lista filtrada pela data, do mais novo para o mais antigo.
-    my_scrims.sort(key=lambda s: s.scrim_datetime, reverse=True)
-
-    # Retorna a lista final e correta de scrims.
-    return my_scrims
+    # Retorna as scrims com os cartões dos times.
+    return await to_scrims_out(my_scrims)
 
 # Define a rota POST para aceitar uma scrim, usando o ID da scrim na URL.
 
@@ -756,16 +1287,16 @@ async def get_my_scrims(current_team: Annotated[Team, Depends(get_current_team)]
 # Recebe o ID da scrim da URL e o time logado (quem está aceitando).
 async def accept_scrim(
     scrim_id: PydanticObjectId,
-    current_team: Annotated[Team, Depends(get_current_team)]
+    current_team: Annotated[TeamPrincipal, Depends(get_current_principal)]
 ):
     """Aceita um convite de scrim (apenas o oponente pode aceitar)."""
-    # Busca a scrim específica pelo ID e já carrega os dados dos times.
-    scrim = await Scrim.get(scrim_id, fetch_links=True)
+    # Busca a scrim específica pelo ID (os times ficam como referências).
+    scrim = await Scrim.get(scrim_id)
     if not scrim:
         raise HTTPException(status_code=404, detail="Scrim não encontrada.")
 
     # Etapa de AUTORIZAÇÃO: Garante que apenas o time convidado (opponent_team) pode aceitar.
-    if scrim.opponent_team.id != current_team.id:
+    if scrim.opponent_team.to_ref().id != current_team.id:
         raise HTTPException(
             status_code=403, detail="Você não tem permissão para aceitar este convite.")
 
@@ -774,13 +1305,70 @@ async def accept_scrim(
         raise HTTPException(
             status_code=400, detail="Esta scrim não está mais pendente.")
 
-    # Atualiza o status da scrim para 'Confirmada'.
-    scrim.status = ScrimStatusEnum.CONFIRMED
-    # Salva a alteração no banco de dados.
-    await scrim.save()
+    # Atualiza só o status da scrim para 'Confirmada' ($set), sem regravar o documento.
+    await scrim.set({Scrim.status: ScrimStatusEnum.CONFIRMED})
+    await team_stats.increment_many(scrim_deltas(scrim, {"scrims_pending": -1, "scrims_confirmed": 1}))
 
     # Retorna a scrim com seu novo status.
-    return scrim
+    return (await to_scrims_out([scrim]))[0]
+
+@router.post("/scrims/{scrim_id}/complete", response_model=ScrimOut, tags=["Scrims (Protected)"])
+async def complete_scrim(
+    scrim_id: PydanticObjectId,
+    result: ScrimComplete,
+    current_team: Annotated[TeamPrincipal, Depends(get_current_principal)]
+):
+    """
+    Informa o resultado de uma scrim confirmada, depois do horário marcado. A scrim só é concluída
+    quando os dois times informam o mesmo resultado: o primeiro fica registrado (`reported_by`)
+    até o outro time confirmar. Um resultado diferente substitui o anterior e passa a esperar a
+    confirmação do outro lado.
+    """
+    scrim = await Scrim.get(scrim_id)
+    if not scrim:
+        raise HTTPException(status_code=404, detail="Scrim não encontrada.")
+
+    # Etapa de AUTORIZAÇÃO: só os dois times da scrim.
+    team_ids = {scrim.proposing_team.to_ref().id, scrim.opponent_team.to_ref().id}
+    if current_team.id not in team_ids:
+        raise HTTPException(
+            status_code=403, detail="Você não tem permissão para concluir esta scrim.")
+    if result.winner_team_id is not None and result.winner_team_id not in team_ids:
+        raise HTTPException(
+            status_code=400, detail="O vencedor precisa ser um dos dois times da scrim.")
+    # O MongoDB devolve datas sem fuso (em UTC).
+    if scrim.scrim_datetime.replace(tzinfo=scrim.scrim_datetime.tzinfo or UTC) > datetime.now(UTC):
+        raise HTTPException(
+            status_code=400, detail="A scrim ainda não aconteceu.")
+    other_team_id = next(iter(team_ids - {current_team.id}))
+
+    # O outro time já informou este mesmo resultado: conclui. A conclusão acontece uma única
+    # vez: o update só casa se a scrim ainda estiver confirmada com aquele resultado pendente
+    # (duas conclusões ao mesmo tempo não contam o resultado duas vezes).
+    completed = await Scrim.find_one({
+        "_id": scrim_id,
+        "status": ScrimStatusEnum.CONFIRMED.value,
+        "reported_by": other_team_id,
+        "reported_winner_team_id": result.winner_team_id,
+    }).update(
+        {"$set": {"status": ScrimStatusEnum.COMPLETED.value, "winner_team_id": result.winner_team_id}},
+        response_type=UpdateResponse.NEW_DOCUMENT)
+    if completed is None:
+        # Primeiro resultado informado (ou diferente do que o outro time informou): fica esperando a confirmação.
+        reported = await Scrim.find_one({"_id": scrim_id, "status": ScrimStatusEnum.CONFIRMED.value}).update(
+            {"$set": {"reported_by": current_team.id, "reported_winner_team_id": result.winner_team_id}},
+            response_type=UpdateResponse.NEW_DOCUMENT)
+        if reported is None:
+            raise HTTPException(
+                status_code=400, detail="Só scrims confirmadas podem ser concluídas.")
+        return (await to_scrims_out([reported]))[0]
+    scrim = completed
+
+    # O resultado entra no confronto direto do par e nos contadores dos dois times.
+    await scrim_history.record_result(scrim)
+    await team_stats.increment_many(scrim_deltas(scrim, {"scrims_confirmed": -1, "scrims_completed": 1}))
+
+    return (await to_scrims_out([scrim]))[0]
 
 # Define a rota POST para recusar um convite de scrim.
 
@@ -789,21 +1377,27 @@ async def accept_scrim(
 # Recebe o ID da scrim e o time logado (quem está recusando).
 async def decline_scrim(
     scrim_id: PydanticObjectId,
-    current_team: Annotated[Team, Depends(get_current_team)]
+    current_team: Annotated[TeamPrincipal, Depends(get_current_principal)]
 ):
     """Recusa um convite de scrim (apenas o oponente pode recusar)."""
     # Busca a scrim que será recusada.
-    scrim = await Scrim.get(scrim_id, fetch_links=True)
+    scrim = await Scrim.get(scrim_id)
     if not scrim:
         raise HTTPException(status_code=404, detail="Scrim não encontrada.")
 
     # Etapa de AUTORIZAÇÃO: Garante que apenas o time convidado pode recusar.
-    if scrim.opponent_team.id != current_team.id:
+    if scrim.opponent_team.to_ref().id != current_team.id:
         raise HTTPException(
             status_code=403, detail="Você não tem permissão para recusar este convite.")
 
+    # Uma scrim concluída já está no retrospecto dos dois times e não pode mais sair.
+    if scrim.status == ScrimStatusEnum.COMPLETED:
+        raise HTTPException(
+            status_code=400, detail="Esta scrim já foi concluída.")
+
     # Em vez de mudar o status, simplesmente deletamos o convite recusado.
     await scrim.delete()
+    await team_stats.increment_many(scrim_deltas(scrim, {team_stats.SCRIM_STATUS_COUNTERS[scrim.status]: -1}))
 
     # Retorna sucesso sem conteúdo.
     return None
@@ -819,21 +1413,19 @@ async def get_my_notifications(current_team: Annotated[Team, Depends(get_current
     Busca e retorna todas as notificações pendentes para o usuário logado
     (pedidos de amizade e convites de scrim).
     """
-    # Busca os pedidos de amizade recebidos
-    await current_team.fetch_link(Team.friend_requests_received)
-    friend_requests = current_team.friend_requests_received
+    # Os pedidos de amizade recebidos já vêm (como cópias) no documento do time
+    friend_requests = await snapshot_list(current_team, "friend_requests_received_info")
 
     # Busca os convites de scrim pendentes onde o usuário é o oponente
     pending_scrims = await Scrim.find(
         Scrim.opponent_team.id == current_team.id,
-        Scrim.status == ScrimStatusEnum.PENDING,
-        fetch_links=True
+        Scrim.status == ScrimStatusEnum.PENDING
     ).to_list()
 
     # Retorna os dois tipos de notificação em um único objeto
     return {
         "friend_requests": friend_requests,
-        "scrim_invites": pending_scrims
+        "scrim_invites": await to_scrims_out(pending_scrims)
     }
 
 
@@ -0,0 +1,255 @@
+# app/scrim_history.py
+"""
+Retrospecto das scrims concluídas: confronto direto entre dois times e o histórico de cada time.
+
+Em vez de varrer `scrims` a cada consulta, cada par de times tem um resumo na coleção
+`scrim_pairs` (ScrimPairSummary, `_id` = "<id menor>:<id maior>"): jogos, vitórias de cada
+lado, empates, a data do último confronto e o mesmo retrospecto por jogo.
+- Escrita: quando uma scrim é concluída (POST /scrims/{id}/complete), um único update com
+  `$inc`/`$max` (upsert) soma o resultado ao resumo do par (pela fila de tarefas, depois da resposta).
+  O mesmo update guarda o id da scrim em `counted_scrims` e só casa se ele ainda não estiver
+  lá: uma tarefa repetida (nova tentativa, entrega dupla do stream) não conta a scrim de novo.
+- Leitura: o confronto direto é um find_one pelo `_id`; o histórico de um time lê só os
+  resumos dos pares dele (um por adversário), pelos índices de `team_a` e `team_b`.
+- Carga inicial / reconstrução: `backfill()` monta todos os resumos com uma única agregação
+  ($group por par, com allowDiskUse) sobre as scrims concluídas:
+
+      python -m app.scrim_history
+"""
+import asyncio
+import datetime
+from typing import Dict, Tuple
+
+from beanie import PydanticObjectId
+from beanie.odm.operators.find.comparison import In
+from pymongo import ReplaceOne
+from pymongo.errors import DuplicateKeyError
+
+from .models import (
+    GameEnum, HeadToHeadOut, OpponentRecordOut, Scrim, ScrimPairSummary, ScrimRecordOut,
+    ScrimStatusEnum, Team, TeamCard, TeamScrimHistoryOut
+)
+from .task_queue import task_queue
+
+# Resumos gravados por bulk_write no backfill.
+BACKFILL_BATCH_SIZE = 1000
+
+
+def pair_key(team_id, other_id) -> Tuple[str, PydanticObjectId, PydanticObjectId]:
+    """O `_id` do par e os dois times na ordem do par (lado `a` = id menor)."""
+    team_a, team_b = sorted((team_id, other_id))
+    return f"{team_a}:{team_b}", team_a, team_b
+
+
+# =============================================================================
+# --- Escrita ---
+# =============================================================================
+
+async def record_result(scrim: Scrim):
+    """Soma uma scrim concluída ao resumo do par, em segundo plano (uma única vez por scrim)."""
+    await task_queue.enqueue(
+        "scrim_history.apply_result",
+        scrim_id=scrim.id,
+        team_id=scrim.proposing_team.to_ref().id,
+        other_id=scrim.opponent_team.to_ref().id,
+        winner_team_id=scrim.winner_team_id,
+        game=GameEnum(scrim.game).value,
+        played_at=scrim.scrim_datetime,
+    )
+
+
+@task_queue.task("scrim_history.apply_result")
+async def apply_result(scrim_id, team_id, other_id, winner_team_id, game: str, played_at: datetime.datetime):
+    """Um único update ($inc/$max/$addToSet, upsert) no resumo do par, uma vez por scrim."""
+    key, team_a, team_b = pair_key(team_id, other_id)
+    if winner_team_id == team_a:
+        outcome = "wins_a"
+    elif winner_team_id == team_b:
+        outcome = "wins_b"
+    else:
+        outcome = "draws"
+    collection = ScrimPairSummary.get_motor_collection()
+    query = {"_id": key, "counted_scrims": {"$ne": scrim_id}}
+    update = {
+        "$inc": {"played": 1, outcome: 1, f"by_game.{game}.played": 1, f"by_game.{game}.{outcome}": 1},
+        "$max": {"last_played": played_at},
+        "$addToSet": {"counted_scrims": scrim_id},
+        "$setOnInsert": {"team_a": team_a, "team_b": team_b},
+    }
+    try:
+        await collection.update_one(query, update, upsert=True)
+    except DuplicateKeyError:
+        # O resumo existe e o filtro não casou: ou a scrim já foi contada (nada a fazer), ou o
+        # resumo foi criado por outra scrim ao mesmo tempo (agora o update sem upsert casa).
+        await collection.update_one(query, update)
+
+
+# =============================================================================
+# --- Leitura ---
+# =============================================================================
+
+def _record(pair: dict, side: str) -> ScrimRecordOut:
+    """Um retrospecto do par (o resumo ou um jogo dele) do ponto de vista do lado `side`."""
+    other = "b" if side == "a" else "a"
+    return ScrimRecordOut(
+        played=pair.get("played", 0),
+        wins=pair.get(f"wins_{side}", 0),
+        losses=pair.get(f"wins_{other}", 0),
+        draws=pair.get("draws", 0),
+    )
+
+
+def _opponent_record(pair: dict, team_id, opponent: TeamCard) -> OpponentRecordOut:
+    side = "a" if pair["team_a"] == team_id else "b"
+    return OpponentRecordOut(
+        **_record(pair, side).model_dump(),
+        opponent=opponent.model_dump(),
+        last_played=pair.get("last_played"),
+        by_game={game: _record(record, side) for game, record in pair.get("by_game", {}).items()},
+    )
+
+
+async def get_head_to_head(team: TeamCard, opponent: TeamCard) -> HeadToHeadOut:
+    """O confronto direto entre dois times (zerado se eles nunca concluíram uma scrim)."""
+    key, team_a, team_b = pair_key(team.id, opponent.id)
+    pair = await ScrimPairSummary.get_motor_collection().find_one({"_id": key}, {"counted_scrims": 0})
+    pair = pair or {"team_a": team_a, "team_b": team_b}
+    return HeadToHeadOut(**_opponent_record(pair, team.id, opponent).model_dump(), team=team.model_dump())
+
+
+async def get_team_history(team_id: PydanticObjectId, limit: int) -> TeamScrimHistoryOut:
+    """Totais, retrospecto por jogo e os `limit` adversários mais recentes de um time."""
+    collection = ScrimPairSummary.get_motor_collection()
+    # Um resumo por adversário; as duas leituras usam cada uma o seu índice.
+    as_a, as_b = await asyncio.gather(
+        collection.find({"team_a": team_id}, {"counted_scrims": 0}).to_list(None),
+        collection.find({"team_b": team_id}, {"counted_scrims": 0}).to_list(None),
+    )
+    pairs = sorted([*as_a, *as_b], key=lambda pair: pair.get("last_played") or datetime.datetime.min, reverse=True)
+
+    history = TeamScrimHistoryOut(last_played=pairs[0].get("last_played") if pairs else None)
+    by_game: Dict[str, ScrimRecordOut] = {}
+    for pair in pairs:
+        side = "a" if pair["team_a"] == team_id else "b"
+        _add(history, _record(pair, side))
+        for game, record in pair.get("by_game", {}).items():
+            _add(by_game.setdefault(game, ScrimRecordOut()), _record(record, side))
+    history.by_game = by_game
+
+    recent = pairs[:limit]
+    opponent_ids = [pair["team_b"] if pair["team_a"] == team_id else pair["team_a"] for pair in recent]
+    cards = {card.id: card for card in await Team.find(In(Team.id, opponent_ids)).project(TeamCard).to_list()}
+    # Adversários que não existem mais contam nos totais, mas ficam fora da lista.
+    history.opponents = [
+        _opponent_record(pair, team_id, cards[opponent_id])
+        for pair, opponent_id in zip(recent, opponent_ids) if opponent_id in cards
+    ]
+    return history
+
+
+def _add(target: ScrimRecordOut, record: ScrimRecordOut):
+    target.played += record.played
+    target.wins += record.wins
+    target.losses += record.losses
+    target.draws += record.draws
+
+
+# =============================================================================
+# --- Backfill ---
+# =============================================================================
+
+def backfill_pipeline() -> list:
+    """Uma linha por par de times, com os totais e as contagens de cada jogo, a partir das scrims concluídas."""
+    proposing, opponent = "$proposing_team.$id", "$opponent_team.$id"
+    a_first = {"$lt": [proposing, opponent]}
+    games = [game.value for game in GameEnum]
+
+    def count(condition):
+        return {"$sum": {"$cond": [condition, 1, 0]}}
+
+    won_a = {"$eq": ["$winner_team_id", "$team_a"]}
+    won_b = {"$eq": ["$winner_team_id", "$team_b"]}
+    per_game = {}
+    for index, game in enumerate(games):
+        is_game = {"$eq": ["$game", game]}
+        per_game[f"game{index}_played"] = count(is_game)
+        per_game[f"game{index}_wins_a"] = count({"$and": [is_game, won_a]})
+        per_game[f"game{index}_wins_b"] = count({"$and": [is_game, won_b]})
+
+    return [
+        {"$match": {"status": ScrimStatusEnum.COMPLETED.value}},
+        {"$project": {
+            "game": 1,
+            "scrim_datetime": 1,
+            "winner_team_id": 1,
+            "team_a": {"$cond": [a_first, proposing, opponent]},
+            "team_b": {"$cond": [a_first, opponent, proposing]},
+        }},
+        {"$group": {
+            "_id": {"team_a": "$team_a", "team_b": "$team_b"},
+            "played": {"$sum": 1},
+            "wins_a": count(won_a),
+            "wins_b": count(won_b),
+            "last_played": {"$max": "$scrim_datetime"},
+            "counted_scrims": {"$push": "$_id"},
+            **per_game,
+        }},
+    ]
+
+
+def _summary_from_group(row: dict) -> dict:
+    """Converte uma linha do $group no documento de `scrim_pairs`."""
+    team_a, team_b = row["_id"]["team_a"], row["_id"]["team_b"]
+    by_game = {}
+    for index, game in enumerate(GameEnum):
+        played = row[f"game{index}_played"]
+        if played:
+            wins_a, wins_b = row[f"game{index}_wins_a"], row[f"game{index}_wins_b"]
+            by_game[game.value] = {"played": played, "wins_a": wins_a, "wins_b": wins_b,
+                                   "draws": played - wins_a - wins_b}
+    return {
+        "_id": pair_key(team_a, team_b)[0],
+        "team_a": team_a,
+        "team_b": team_b,
+        "played": row["played"],
+        "wins_a": row["wins_a"],
+        "wins_b": row["wins_b"],
+        "draws": row["played"] - row["wins_a"] - row["wins_b"],
+        "last_played": row["last_played"],
+        "by_game": by_game,
+        "counted_scrims": row["counted_scrims"],
+    }
+
+
+async def backfill() -> int:
+    """
+    Reconstrói (substitui) os resumos de todos os pares a partir das scrims concluídas.
+    Devolve quantos resumos foram gravados. Uma scrim concluída durante o backfill pode ficar
+    de fora (o resumo do par é substituído por um calculado antes dela): rode com as conclusões
+    paradas (ex.: logo depois de uma carga).
+    """
+    collection = ScrimPairSummary.get_motor_collection()
+    written, operations = 0, []
+    # Os pares chegam em lotes do cursor: a memória não cresce com o número de pares.
+    cursor = Scrim.get_motor_collection().aggregate(backfill_pipeline(), allowDiskUse=True)
+    async for row in cursor:
+        summary = _summary_from_group(row)
+        operations.append(ReplaceOne({"_id": summary["_id"]}, summary, upsert=True))
+        if len(operations) >= BACKFILL_BATCH_SIZE:
+            await collection.bulk_write(operations, ordered=False)
+            written += len(operations)
+            operations = []
+    if operations:
+        await collection.bulk_write(operations, ordered=False)
+        written += len(operations)
+    return written
+
+
+if __name__ == "__main__":
+    from .db import init_db
+
+    async def main():
+        await init_db()
+        print(f"✅ {await backfill()} resumos de confronto gravados.")
+
+    asyncio.run(main())
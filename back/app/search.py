@@ -0,0 +1,363 @@
+# app/search.py
+"""
+Busca de posts por texto, com um índice invertido no Redis.
+
+Cada post é quebrado em termos (minúsculas, sem acentos, sem stopwords) e entra na lista de
+postagens de cada termo: um sorted set `search:v<n>:term:<termo>` com o id do post e o
+instante de criação como score. O que o ranking e os filtros usam fica ao lado:
+- `search:v<n>:doc:<id>` (hash): autor, jogo principal do autor quando o post foi criado,
+  instante de criação e termos;
+- `search:v<n>:likes` (hash): likes de cada post, atualizados pelas rotas de like;
+- `search:v<n>:all` (sorted set): todos os posts indexados (o N do IDF).
+
+O `<n>` é a geração do índice. As buscas leem a geração de `search:current`; uma
+reconstrução monta a geração seguinte ao lado (`search:building`) e só troca o ponteiro no
+fim, apagando a anterior depois. Enquanto ela roda, as tarefas da fila (novo post, likes)
+escrevem nas duas gerações: nada do que chega durante a reconstrução se perde.
+
+Consulta:
+1. para cada termo da busca, lê no máximo SEARCH_CANDIDATES_PER_TERM postagens, das mais
+   novas para as mais antigas. O custo depende desse limite, não do tamanho da base;
+2. filtra os candidatos por autor/jogo e calcula o score de cada um:
+       relevância (fração do IDF da busca que o post cobre) * SEARCH_WEIGHT_RELEVANCE
+     + recência (meia-vida de SEARCH_RECENCY_HALF_LIFE_HOURS) * SEARCH_WEIGHT_RECENCY
+     + popularidade (log dos likes)                           * SEARCH_WEIGHT_LIKES
+3. pagina por cursor: o cursor guarda o instante da primeira página (posts mais novos não
+   entram e a recência não muda no meio da paginação) e o (score, id) do último resultado.
+
+O índice é mantido pelas rotas (novo post, likes) e reconstruído a partir do MongoDB quando
+não existe (`ensure_index`, conferido a cada SEARCH_INDEX_CHECK_INTERVAL_SECONDS pelo
+lifespan: um FLUSHALL no Redis não deixa a busca vazia até o próximo deploy).
+"""
+import asyncio
+import base64
+import binascii
+import datetime
+import json
+import math
+import re
+import time
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .models import Post, Team
+from .task_queue import task_queue
+
+# Geração servida pelas buscas, geração em reconstrução e o contador de gerações.
+CURRENT_KEY = "search:current"
+BUILDING_KEY = "search:building"
+GENERATION_KEY = "search:generation"
+# Trava da reconstrução (um worker reconstrói, os outros esperam).
+REBUILD_LOCK_KEY = "search:rebuild-lock"
+REBUILD_LOCK_SECONDS = 600
+REBUILD_BATCH_SIZE = 500
+# De quanto em quanto tempo o lifespan confere se o índice existe.
+SEARCH_INDEX_CHECK_INTERVAL_SECONDS = 60
+
+# Postagens lidas por termo em cada consulta (limita o custo de termos muito comuns).
+SEARCH_CANDIDATES_PER_TERM = 1000
+
+# Pesos do ranking (somam 1) e as escalas de recência e popularidade.
+SEARCH_WEIGHT_RELEVANCE = 0.6
+SEARCH_WEIGHT_RECENCY = 0.25
+SEARCH_WEIGHT_LIKES = 0.15
+SEARCH_RECENCY_HALF_LIFE_HOURS = 72
+# Número de likes a partir do qual a popularidade já vale o máximo.
+SEARCH_LIKES_SATURATION = 100
+
+MIN_TERM_LENGTH = 2
+
+STOPWORDS = {
+    # português
+    "a", "o", "as", "os", "um", "uma", "uns", "umas", "de", "do", "da", "dos", "das", "em",
+    "no", "na", "nos", "nas", "por", "para", "pra", "com", "sem", "e", "ou", "que", "se",
+    "ao", "aos", "mais", "mas", "muito", "como", "ja", "tem", "ser", "esta", "isso", "esse",
+    "essa", "eu", "voce", "nos", "eles", "elas", "ele", "ela", "me", "te", "seu", "sua",
+    # inglês
+    "the", "an", "and", "or", "of", "to", "in", "on", "for", "with", "is", "are", "be",
+    "it", "this", "that", "at", "by", "from", "we", "you", "our", "your",
+}
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+class InvalidCursor(ValueError):
+    """Cursor de paginação malformado ou de outra busca."""
+
+
+def normalize(text: str) -> str:
+    """Minúsculas e sem acentos ("Próxima" -> "proxima")."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def tokenize(text: str) -> List[str]:
+    """Termos indexáveis de um texto, na ordem em que aparecem (com repetições)."""
+    return [
+        token for token in _TOKEN_PATTERN.findall(normalize(text))
+        if len(token) >= MIN_TERM_LENGTH and token not in STOPWORDS
+    ]
+
+
+def _timestamp(value: datetime.datetime) -> float:
+    # O MongoDB devolve datas sem fuso (em UTC).
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.UTC)
+    return value.timestamp()
+
+
+# =============================================================================
+# --- Atualização do índice ---
+# =============================================================================
+
+class _Keys:
+    """Chaves de dados de uma geração do índice."""
+    __slots__ = ("prefix", "likes", "all")
+
+    def __init__(self, generation):
+        self.prefix = f"search:v{generation}:"
+        self.likes = self.prefix + "likes"
+        self.all = self.prefix + "all"
+
+    def term(self, term: str) -> str:
+        return self.prefix + "term:" + term
+
+    def doc(self, post_id: str) -> str:
+        return self.prefix + "doc:" + post_id
+
+
+async def _write_generations(redis_client) -> List[_Keys]:
+    """As gerações que recebem escritas: a atual e, durante uma reconstrução, a nova."""
+    generations = await redis_client.mget(CURRENT_KEY, BUILDING_KEY)
+    return [_Keys(generation) for generation in dict.fromkeys(generations) if generation is not None]
+
+
+def _add_to_pipeline(pipe, keys: _Keys, post_id, content, author_id, game, created_at, likes):
+    post_id = str(post_id)
+    created = _timestamp(created_at)
+    terms = sorted(set(tokenize(content)))
+    for term in terms:
+        pipe.zadd(keys.term(term), {post_id: created})
+    pipe.hset(keys.doc(post_id), mapping={
+        "author": str(author_id),
+        "game": game or "",
+        "created": created,
+        "terms": " ".join(terms),
+    })
+    pipe.hset(keys.likes, post_id, likes)
+    pipe.zadd(keys.all, {post_id: created})
+
+
+@task_queue.task("search.index_post")
+async def index_post(redis_client, post_id, content: str, author_id, game: Optional[str],
+                     created_at: datetime.datetime, likes: int = 0):
+    """Coloca um post no índice (tarefa enfileirada ao criar o post)."""
+    # Sem nenhuma geração (Redis recém-esvaziado), a próxima reconstrução traz o post do MongoDB.
+    generations = await _write_generations(redis_client)
+    if not generations:
+        return
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for keys in generations:
+            _add_to_pipeline(pipe, keys, post_id, content, author_id, game, created_at, likes)
+        await pipe.execute()
+
+
+@task_queue.task("search.set_likes")
+async def set_likes(redis_client, likes_by_post: Dict[object, int]):
+    """Atualiza o número de likes usado no ranking (tarefa enfileirada pelas rotas de like)."""
+    if not likes_by_post:
+        return
+    mapping = {str(post_id): likes for post_id, likes in likes_by_post.items()}
+    generations = await _write_generations(redis_client)
+    if not generations:
+        return
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for keys in generations:
+            pipe.hset(keys.likes, mapping=mapping)
+        await pipe.execute()
+
+
+async def remove_posts(redis_client, post_ids: Iterable):
+    """Tira posts do índice."""
+    post_ids = [str(post_id) for post_id in post_ids]
+    if not post_ids:
+        return
+    for keys in await _write_generations(redis_client):
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for post_id in post_ids:
+                pipe.hget(keys.doc(post_id), "terms")
+            terms_by_post = await pipe.execute()
+
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for post_id, terms in zip(post_ids, terms_by_post):
+                for term in (terms or "").split():
+                    pipe.zrem(keys.term(term), post_id)
+                pipe.delete(keys.doc(post_id))
+            pipe.hdel(keys.likes, *post_ids)
+            pipe.zrem(keys.all, *post_ids)
+            await pipe.execute()
+
+
+async def rebuild(redis_client):
+    """
+    Monta uma geração nova do índice a partir de todos os posts do MongoDB, em lotes, e passa
+    as buscas para ela. As escritas das rotas continuam chegando na geração atual e, a partir
+    do início da reconstrução, também na nova. No fim, as gerações antigas são apagadas.
+    """
+    generation = await redis_client.incr(GENERATION_KEY)
+    keys = _Keys(generation)
+    # Daqui em diante, novos posts e likes também vão para a geração nova.
+    await redis_client.set(BUILDING_KEY, generation)
+
+    # Jogo principal de cada autor (só id e jogo saem do banco).
+    games = {}
+    async for team in Team.get_motor_collection().find({}, {"main_game": 1}):
+        games[team["_id"]] = team.get("main_game")
+
+    cursor = Post.get_motor_collection().aggregate([
+        {"$project": {"content": 1, "created_at": 1, "author": 1, "likes_count": {"$size": "$likes"}}},
+    ])
+    pipe = redis_client.pipeline(transaction=False)
+    pending = 0
+    async for post in cursor:
+        author_id = post["author"].id
+        _add_to_pipeline(pipe, keys, post["_id"], post["content"], author_id, games.get(author_id),
+                         post["created_at"], post["likes_count"])
+        pending += 1
+        if pending >= REBUILD_BATCH_SIZE:
+            await pipe.execute()
+            pending = 0
+    await pipe.execute()
+
+    # Troca a geração das buscas e para de escrever em duas.
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.set(CURRENT_KEY, generation)
+        pipe.delete(BUILDING_KEY)
+        await pipe.execute()
+
+    # Apaga as gerações anteriores (e as chaves do formato sem geração).
+    keep = (keys.prefix, CURRENT_KEY, BUILDING_KEY, GENERATION_KEY, REBUILD_LOCK_KEY)
+    async for key in redis_client.scan_iter(match="search:*", count=1000):
+        if not key.startswith(keep):
+            await redis_client.unlink(key)
+
+
+async def ensure_index(redis_client):
+    """Reconstrói o índice se ele ainda não existir (um worker por vez)."""
+    if await redis_client.exists(CURRENT_KEY):
+        return
+    if not await redis_client.set(REBUILD_LOCK_KEY, 1, nx=True, ex=REBUILD_LOCK_SECONDS):
+        return  # outro worker já está reconstruindo
+    try:
+        print("INFO: Índice de busca de posts vazio. Reconstruindo a partir do MongoDB...")
+        await rebuild(redis_client)
+        print("INFO: Índice de busca de posts pronto.")
+    finally:
+        await redis_client.delete(REBUILD_LOCK_KEY)
+
+
+async def run_periodically(redis_client):
+    """Confere a cada SEARCH_INDEX_CHECK_INTERVAL_SECONDS se o índice existe (tarefa iniciada no lifespan)."""
+    while True:
+        try:
+            await ensure_index(redis_client)
+        except Exception as exc:
+            print(f"AVISO: falha ao reconstruir o índice de busca de posts ({exc}). Nova tentativa em instantes.")
+        await asyncio.sleep(SEARCH_INDEX_CHECK_INTERVAL_SECONDS)
+
+
+# =============================================================================
+# --- Consulta ---
+# =============================================================================
+
+def encode_cursor(as_of: float, score: float, post_id: str) -> str:
+    raw = json.dumps([as_of, score, post_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, float, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        as_of, score, post_id = json.loads(raw)
+        return float(as_of), float(score), str(post_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise InvalidCursor(cursor)
+
+
+def rank_score(relevance: float, created: float, likes: int, as_of: float) -> float:
+    age_hours = max(0.0, as_of - created) / 3600
+    recency = 0.5 ** (age_hours / SEARCH_RECENCY_HALF_LIFE_HOURS)
+    popularity = min(1.0, math.log1p(max(likes, 0)) / math.log1p(SEARCH_LIKES_SATURATION))
+    score = (SEARCH_WEIGHT_RELEVANCE * relevance
+             + SEARCH_WEIGHT_RECENCY * recency
+             + SEARCH_WEIGHT_LIKES * popularity)
+    # Arredondado para o cursor comparar exatamente o mesmo valor na próxima página.
+    return round(score, 9)
+
+
+async def search(redis_client, query: str, author_id=None, game: Optional[str] = None,
+                 limit: int = 20, cursor: Optional[str] = None) -> Tuple[List[str], Optional[str]]:
+    """
+    Ids dos posts que casam com a busca, do mais bem ranqueado ao pior, e o cursor da
+    próxima página (None na última).
+    """
+    after = None
+    if cursor:
+        as_of, *after = decode_cursor(cursor)
+    else:
+        as_of = time.time()
+
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return [], None
+    generation = await redis_client.get(CURRENT_KEY)
+    if generation is None:
+        return [], None  # índice ainda em construção
+    keys = _Keys(generation)
+
+    # 1) Postagens mais novas de cada termo (até o instante da primeira página) e o df de cada um.
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.zcard(keys.all)
+        for term in terms:
+            pipe.zcard(keys.term(term))
+            pipe.zrevrangebyscore(keys.term(term), as_of, "-inf", start=0, num=SEARCH_CANDIDATES_PER_TERM)
+        results = await pipe.execute()
+
+    total_docs = max(results[0], 1)
+    idf = {}
+    matched_idf: Dict[str, float] = {}
+    for index, term in enumerate(terms):
+        doc_freq, postings = results[1 + 2 * index], results[2 + 2 * index]
+        idf[term] = math.log(1 + total_docs / max(doc_freq, 1))
+        for post_id in postings:
+            matched_idf[post_id] = matched_idf.get(post_id, 0.0) + idf[term]
+    if not matched_idf:
+        return [], None
+
+    # 2) Dados de ranking e filtro dos candidatos.
+    candidates = list(matched_idf)
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for post_id in candidates:
+            pipe.hmget(keys.doc(post_id), "author", "game", "created")
+        pipe.hmget(keys.likes, candidates)
+        *docs, likes = await pipe.execute()
+
+    query_idf = sum(idf.values())
+    author_id = str(author_id) if author_id else None
+    ranked = []
+    for post_id, (doc_author, doc_game, created), post_likes in zip(candidates, docs, likes):
+        if created is None:
+            continue  # removido do índice entre as duas leituras
+        if (author_id and doc_author != author_id) or (game and doc_game != game):
+            continue
+        relevance = matched_idf[post_id] / query_idf
+        ranked.append((rank_score(relevance, float(created), int(post_likes or 0), as_of), post_id))
+
+    # 3) Ordem estável por (score, id) e a página depois do cursor.
+    ranked.sort(reverse=True)
+    if after:
+        after = tuple(after)
+        ranked = [item for item in ranked if item < after]
+    page = ranked[:limit]
+    next_cursor = encode_cursor(as_of, *page[-1]) if len(ranked) > limit else None
+    return [post_id for _, post_id in page], next_cursor
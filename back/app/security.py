@@ -1,16 +1,17 @@
 # app/security.py
 
+import secrets
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Annotated
 
 from beanie import PydanticObjectId
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 
 from .config import settings
-from .models import Team
+from .models import Team, TeamPrincipal
 
 # --- Configuração de Hashing de Senha
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -19,6 +20,8 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 # Esta linha cria um "esquema" que o FastAPI usa para a documentação e para extrair o token.
 # Ele espera um token na rota POST /login, que nós criamos em routes.py.
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
+# Mesmo esquema para rotas públicas que só querem saber quem é o visitante, se estiver logado.
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login", auto_error=False)
 
 # --- Funções de Segurança
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -44,16 +47,14 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 
 
 # --- Dependência de Autenticação
-async def get_current_team(token: Annotated[str, Depends(oauth2_scheme)]) -> Team:
-    """
-    Dependência para ser usada em rotas protegidas.
-    Valida o token e retorna o documento do time correspondente.
-    """
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Não foi possível validar as credenciais",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Não foi possível validar as credenciais",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+def team_id_from_token(token: str) -> PydanticObjectId:
+    """Valida o token e devolve o id do time dono dele."""
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         team_id: str = payload.get("sub")
@@ -61,8 +62,46 @@ async def get_current_team(token: Annotated[str, Depends(oauth2_scheme)]) -> Tea
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    
-    team = await Team.get(PydanticObjectId(team_id))
+    return PydanticObjectId(team_id)
+
+async def get_current_team(token: Annotated[str, Depends(oauth2_scheme)]) -> Team:
+    """
+    Dependência para ser usada em rotas protegidas.
+    Valida o token e retorna o documento do time correspondente.
+    """
+    team = await Team.get(team_id_from_token(token))
     if team is None:
         raise credentials_exception
-    return team
\ No newline at end of file
+    return team
+
+async def get_current_principal(token: Annotated[str, Depends(oauth2_scheme)]) -> TeamPrincipal:
+    """
+    Como `get_current_team`, mas lê só id, nome e tag do time logado.
+    Para rotas que não alteram o documento do time (posts, likes, comentários, scrims).
+    """
+    principal = await Team.find_one(Team.id == team_id_from_token(token)).project(TeamPrincipal)
+    if principal is None:
+        raise credentials_exception
+    return principal
+
+async def get_optional_team_id(token: Annotated[Optional[str], Depends(optional_oauth2_scheme)]) -> Optional[PydanticObjectId]:
+    """
+    Dependência para rotas públicas: o id do time logado, ou None para visitantes sem token
+    (ou com token inválido). Não lê o banco.
+    """
+    if not token:
+        return None
+    try:
+        return team_id_from_token(token)
+    except HTTPException:
+        return None
+
+def require_admin(x_admin_token: Annotated[Optional[str], Header()] = None):
+    """
+    Dependência das rotas de administração: exige o cabeçalho `X-Admin-Token` igual a ADMIN_TOKEN.
+    Sem ADMIN_TOKEN configurado, as rotas ficam desligadas (404).
+    """
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso restrito à administração.")
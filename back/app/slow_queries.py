@@ -0,0 +1,222 @@
+# app/slow_queries.py
+"""
+Log de consultas lentas do MongoDB.
+
+Todo comando que passa de SLOW_QUERY_THRESHOLD_MS é registrado com a rota que o disparou,
+o *formato* da consulta (valores trocados por "?", para agrupar consultas iguais), a duração
+e o plano vencedor do `explain()`. Consultas que varrem a coleção inteira (COLLSCAN) são
+marcadas. O relatório agregado por formato fica em GET /admin/slow-queries (com ADMIN_TOKEN).
+
+O `explain()` nunca roda na requisição: uma amostra das consultas lentas vai para uma fila
+consumida por uma thread em segundo plano, com um cliente próprio (sem listeners) e no
+máximo um plano por formato a cada SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS.
+"""
+import datetime
+import json
+import queue
+import random
+import threading
+import time
+from collections import Counter
+
+from pymongo import MongoClient, monitoring
+
+from .config import settings
+from .metrics import current_request
+
+# Comandos que aceitam explain().
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+
+# Partes do comando que definem o seu formato (o resto é sessão, cursor, etc.).
+SHAPE_FIELDS = ("filter", "query", "sort", "projection", "pipeline", "key", "updates", "deletes")
+
+# Valores que são estrutura da consulta, não dados (nomes de coleções e campos).
+STRUCTURAL_KEYS = {"from", "localField", "foreignField", "as", "path", "key"}
+
+# Campos de controle que o driver acrescenta e que não podem ir para o explain.
+COMMAND_METADATA = {"lsid", "txnNumber", "$db", "$clusterTime", "$readPreference", "$readConcern", "readConcern"}
+
+EXPLAIN_QUEUE_SIZE = 100
+
+
+def normalize(value, key=None):
+    """Troca os valores de um comando por "?", mantendo operadores, campos e referências ($campo)."""
+    if isinstance(value, dict):
+        return {k: normalize(v, k) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(item, dict) for item in value):
+            return [normalize(item) for item in value]
+        return ["?"]
+    if isinstance(value, str) and (key in STRUCTURAL_KEYS or value.startswith("$")):
+        return value
+    return "?"
+
+
+def query_shape(command: dict) -> str:
+    shape = {field: normalize(command[field], field) for field in SHAPE_FIELDS if field in command}
+    return json.dumps(shape, sort_keys=True, default=str)
+
+
+def plan_stages(plan) -> list:
+    """Estágios de um plano em ordem (do topo às folhas), ex.: ["FETCH", "IXSCAN"]."""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for child_key in ("queryPlan", "inputStage"):
+            stages.extend(plan_stages(plan.get(child_key)))
+        for child in plan.get("inputStages", []):
+            stages.extend(plan_stages(child))
+    return stages
+
+
+def winning_plans(explain_output) -> list:
+    """Todos os `winningPlan` de uma saída de explain (um aggregate pode ter vários, um por $cursor/$lookup)."""
+    plans = []
+    if isinstance(explain_output, dict):
+        for key, value in explain_output.items():
+            if key == "winningPlan":
+                plans.append(value)
+            else:
+                plans.extend(winning_plans(value))
+    elif isinstance(explain_output, list):
+        for item in explain_output:
+            plans.extend(winning_plans(item))
+    return plans
+
+
+class SlowQueryStats:
+    """Números agregados de um formato de consulta."""
+
+    def __init__(self, collection, operation, shape):
+        self.collection = collection
+        self.operation = operation
+        self.shape = shape
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.routes = Counter()
+        self.last_seen = None
+        self.plan = None
+        self.collscan = None
+        self.plan_captured_at = None
+
+    def to_dict(self):
+        return {
+            "collection": self.collection,
+            "operation": self.operation,
+            "shape": json.loads(self.shape),
+            "count": self.count,
+            "total_ms": round(self.total_ms, 1),
+            "avg_ms": round(self.total_ms / self.count, 1),
+            "max_ms": round(self.max_ms, 1),
+            "routes": dict(self.routes.most_common()),
+            "last_seen": self.last_seen,
+            "collscan": self.collscan,
+            "plan": self.plan,
+        }
+
+
+class SlowQueryLog(monitoring.CommandListener):
+    """Listener do PyMongo que registra os comandos lentos e agenda a captura dos planos."""
+
+    def __init__(self, threshold_ms, explain_rate, explain_interval):
+        self.threshold_ms = threshold_ms
+        self.explain_rate = explain_rate
+        self.explain_interval = explain_interval
+        self._pending = {}  # request_id -> (comando, banco, rota)
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._explain_queue = queue.Queue(maxsize=EXPLAIN_QUEUE_SIZE)
+        self._worker = None
+
+    # --- Listener ---
+
+    def started(self, event):
+        if event.command_name in EXPLAINABLE_COMMANDS:
+            stats = current_request.get()
+            route = stats.route if stats is not None else "fora de requisição"
+            self._pending[event.request_id] = (event.command, event.database_name, route)
+
+    def succeeded(self, event):
+        pending = self._pending.pop(event.request_id, None)
+        elapsed_ms = event.duration_micros / 1000
+        if pending is not None and elapsed_ms >= self.threshold_ms:
+            self._record(event.command_name, *pending, elapsed_ms)
+
+    def failed(self, event):
+        self._pending.pop(event.request_id, None)
+
+    def _record(self, command_name, command, database_name, route, elapsed_ms):
+        collection = command.get(command_name)
+        shape = query_shape(command)
+        key = (collection, command_name, shape)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = SlowQueryStats(collection, command_name, shape)
+            stats.count += 1
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+            stats.routes[route] += 1
+            stats.last_seen = datetime.datetime.now(datetime.UTC).isoformat()
+            now = time.monotonic()
+            wants_plan = ((stats.plan_captured_at is None or now - stats.plan_captured_at >= self.explain_interval)
+                          and random.random() < self.explain_rate)
+            if wants_plan:
+                # Marca já, para que consultas concorrentes do mesmo formato não enfileirem outro explain.
+                stats.plan_captured_at = now
+
+        print(f"SLOW QUERY ({elapsed_ms:.0f} ms) em {route}: {command_name} {collection} {shape}")
+        if wants_plan:
+            self._schedule_explain(stats, command, database_name)
+
+    # --- explain() em segundo plano ---
+
+    def _schedule_explain(self, stats, command, database_name):
+        explain_command = {k: v for k, v in command.items() if k not in COMMAND_METADATA}
+        try:
+            self._explain_queue.put_nowait((stats, database_name, explain_command))
+        except queue.Full:
+            stats.plan_captured_at = None  # tenta de novo numa próxima ocorrência
+            return
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._explain_loop, name="slow-query-explain", daemon=True)
+                    self._worker.start()
+
+    def _explain_loop(self):
+        # Cliente separado e sem listeners: os explains não entram nas métricas nem neste log.
+        client = MongoClient(settings.MONGODB_URI, maxPoolSize=1)
+        while True:
+            stats, database_name, command = self._explain_queue.get()
+            try:
+                output = client[database_name].command({"explain": command, "verbosity": "queryPlanner"})
+                plans = winning_plans(output)
+                stages = [plan_stages(plan) for plan in plans]
+                stats.plan = [" > ".join(s) for s in stages]
+                stats.collscan = any("COLLSCAN" in s for s in stages)
+                if stats.collscan:
+                    print(f"SLOW QUERY: COLLSCAN em {stats.collection} ({stats.operation}) {stats.shape}")
+            except Exception as exc:
+                stats.plan = [f"explain falhou: {exc}"]
+
+    # --- Relatório ---
+
+    def report(self, limit: int = 50) -> list:
+        """Formatos de consulta mais lentos, ordenados pelo tempo total gasto."""
+        with self._lock:
+            items = sorted(self._stats.values(), key=lambda s: s.total_ms, reverse=True)[:limit]
+            return [stats.to_dict() for stats in items]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+slow_query_log = SlowQueryLog(
+    threshold_ms=settings.SLOW_QUERY_THRESHOLD_MS,
+    explain_rate=settings.SLOW_QUERY_EXPLAIN_RATE,
+    explain_interval=settings.SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS,
+)
@@ -0,0 +1,78 @@
+# app/snapshots.py
+"""
+Cópias desnormalizadas (FriendInfo) dos amigos e pedidos de amizade de cada time.
+
+As listas `Team.friends_info` e `Team.friend_requests_received_info` acompanham os Links
+`friends` e `friend_requests_received` e são gravadas no mesmo `save()` das rotas de amizade.
+Assim, listar amigos ou notificações é uma única leitura do próprio time, em vez de um
+`fetch_link` que carrega o documento inteiro de cada amigo.
+
+Quando um time muda nome, tag ou jogo, `propagate_team_snapshot` corrige as cópias nos
+outros times com atualizações em lote, fora da requisição (pela fila de tarefas). A tarefa
+lê o cartão atual do time, então duas edições seguidas nunca deixam a cópia mais antiga por
+último, e rodar de novo não muda nada.
+"""
+from typing import List
+
+from pymongo import UpdateMany
+
+from .models import Team, FriendInfo, TeamCard
+from .task_queue import task_queue
+
+# Campos copiados; mudanças em qualquer um deles precisam ser propagadas.
+SNAPSHOT_FIELDS = {"team_name", "tag", "main_game"}
+
+# Listas de cópias e os Links que elas acompanham.
+SNAPSHOT_LISTS = {
+    "friends_info": "friends",
+    "friend_requests_received_info": "friend_requests_received",
+}
+
+
+def team_snapshot(team: Team) -> FriendInfo:
+    return FriendInfo(id=team.id, team_name=team.team_name, tag=team.tag, main_game=team.main_game)
+
+
+async def snapshot_list(team: Team, info_field: str) -> List[FriendInfo]:
+    """
+    Devolve a lista de cópias de um time. Documentos gravados antes das cópias existirem
+    (ou fora de sincronia com os Links) são remontados a partir dos Links uma única vez.
+    """
+    links_field = SNAPSHOT_LISTS[info_field]
+    infos = getattr(team, info_field)
+    if len(infos) == len(getattr(team, links_field)):
+        return infos
+
+    if not isinstance(team, Team):
+        # Projeção (ex.: TeamPageProfile): a remontagem precisa do documento completo.
+        team = await Team.get(team.id)
+    await team.fetch_link(links_field)
+    infos = [team_snapshot(linked) for linked in getattr(team, links_field) if isinstance(linked, Team)]
+    setattr(team, info_field, infos)
+    await Team.get_motor_collection().update_one(
+        {"_id": team.id},
+        {"$set": {info_field: [info.model_dump() for info in infos]}}
+    )
+    return infos
+
+
+def remove_snapshot(infos: List[FriendInfo], team_id) -> None:
+    infos[:] = [info for info in infos if info.id != team_id]
+
+
+@task_queue.task("snapshots.propagate_team")
+async def propagate_team_snapshot(team_id) -> None:
+    """Atualiza, em todos os times que guardam uma cópia deste, os campos copiados (tarefa de fundo)."""
+    snapshot = await Team.find_one(Team.id == team_id).project(TeamCard)
+    if snapshot is None:
+        return  # o time foi apagado
+    fields = FriendInfo(**snapshot.model_dump()).model_dump(mode="json", exclude={"id"})
+    # Um time aparece no máximo uma vez em cada lista, então o posicional `$` basta.
+    operations = [
+        UpdateMany(
+            {f"{info_field}.id": snapshot.id},
+            {"$set": {f"{info_field}.$.{name}": value for name, value in fields.items()}},
+        )
+        for info_field in SNAPSHOT_LISTS
+    ]
+    await Team.get_motor_collection().bulk_write(operations, ordered=False)
@@ -0,0 +1,268 @@
+# app/task_queue.py
+"""
+Fila de tarefas em segundo plano: o trabalho secundário de uma rota (publicar no stream de
+atividades, atualizar o índice da busca, as hashtags em alta, os contadores dos times, ...)
+sai do caminho da resposta. A rota grava o que é essencial, enfileira o resto e responde.
+
+- As tarefas são funções assíncronas registradas por nome com `@task_queue.task("nome")`
+  e enfileiradas com `await task_queue.enqueue("nome", **kwargs)`. Uma tarefa que declara
+  `redis_client` recebe o cliente Redis da fila.
+- Fila limitada (TASK_QUEUE_MAX_SIZE) consumida por TASK_QUEUE_WORKERS workers. Com a
+  fila cheia, a própria requisição executa a tarefa: fica mais lenta, mas nada se perde.
+- Falhas são repetidas até TASK_QUEUE_MAX_ATTEMPTS vezes, com espera exponencial (e um
+  pouco de aleatoriedade) entre as tentativas. Só as tarefas idempotentes (que podem rodar
+  de novo sem efeito duplicado) são repetidas: as registradas com `idempotent=False`
+  (`$inc`, ZINCRBY, XADD) rodam no máximo uma vez. Os contadores dos times que ficarem
+  para trás são acertados pela conferência de app/team_stats.py; as hashtags em alta e o
+  stream de atividades toleram perder um evento.
+- Encerramento: `drain()` (no lifespan) para de aceitar tarefas novas e espera as da fila
+  terminarem, até TASK_QUEUE_DRAIN_TIMEOUT_SECONDS.
+- Durável (TASK_QUEUE_DURABLE=true): as tarefas vão para um stream do Redis
+  (`tasks:stream`) lido por um grupo de consumidores; cada uma só sai do stream depois de
+  concluída. As de um worker que caiu no meio voltam para a fila depois de
+  TASK_CLAIM_IDLE_MS (XAUTOCLAIM). Cada processo só lê do stream o que cabe na fila local e
+  renova (XCLAIM) a posse das tarefas que já pegou, inclusive as esperando uma nova
+  tentativa: nenhuma é retomada por outro processo enquanto este estiver vivo. Uma tarefa
+  não idempotente marca o id da entrada no Redis antes de rodar e, se for entregue de novo,
+  é só confirmada. Os argumentos precisam ser serializáveis em Extended JSON (ObjectIds e
+  datas servem; chaves de dicionário são strings).
+- Sem os workers rodando (scripts, testes), `enqueue` executa a tarefa na hora.
+"""
+import asyncio
+import inspect
+import os
+import random
+import socket
+import time
+
+import redis.asyncio as redis
+from bson import json_util
+from bson.json_util import JSONOptions
+
+from .config import settings
+from .resources import resources
+
+TASK_STREAM_KEY = "tasks:stream"
+TASK_GROUP = "workers"
+# Tarefas que esgotaram as tentativas (modo durável), para inspeção; só as mais recentes ficam.
+FAILED_TASKS_KEY = "tasks:failed"
+FAILED_TASKS_MAX = 1000
+
+# Espera antes da 2ª tentativa; dobra a cada nova falha, até o máximo.
+RETRY_BACKOFF_SECONDS = 0.5
+RETRY_BACKOFF_MAX_SECONDS = 30
+# Tarefas entregues a um worker e não concluídas há tanto tempo são retomadas por outro.
+TASK_CLAIM_IDLE_MS = 60_000
+# De quanto em quanto tempo um processo renova a posse das tarefas que pegou (bem antes de TASK_CLAIM_IDLE_MS).
+TASK_HEARTBEAT_MS = TASK_CLAIM_IDLE_MS // 3
+# Marca "já começou" das tarefas não idempotentes do stream (o id da entrada), para não rodarem duas vezes.
+TASK_STARTED_KEY_PREFIX = "tasks:started:"
+TASK_STARTED_TTL_SECONDS = 3600
+# Quantas tarefas são lidas do stream por vez.
+TASK_FETCH_BATCH = 50
+
+# Datas voltam do Extended JSON com fuso (UTC), como foram enfileiradas.
+_JSON_OPTIONS = JSONOptions(tz_aware=True)
+
+
+class TaskQueue:
+    """Fila de tarefas assíncronas com workers, tentativas e encerramento gracioso."""
+
+    def __init__(self, max_size: int, workers: int, max_attempts: int, durable: bool):
+        self.max_size = max_size
+        self.worker_count = workers
+        self.max_attempts = max_attempts
+        self.durable = durable
+        # Nome deste processo no grupo de consumidores do stream.
+        self.consumer = f"{socket.gethostname()}:{os.getpid()}"
+        self._handlers = {}
+        # Entradas do stream com este processo (na fila local, rodando ou esperando uma nova tentativa).
+        self._held = set()
+        self._queue = None
+        self._workers = []
+        self._fetcher = None
+        self._closing = False
+
+    @property
+    def redis(self):
+        return resources.redis
+
+    def task(self, name: str, idempotent: bool = True):
+        """
+        Registra uma função assíncrona como tarefa (devolve a função sem mudanças).
+        `idempotent=False`: a tarefa não pode rodar duas vezes (ex.: um `$inc`), então não é repetida.
+        """
+        def decorator(function):
+            wants_redis = "redis_client" in inspect.signature(function).parameters
+            self._handlers[name] = (function, wants_redis, idempotent)
+            return function
+        return decorator
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers) and not self._closing
+
+    async def enqueue(self, name: str, **kwargs):
+        """Agenda a tarefa `name`; volta assim que ela estiver na fila."""
+        if name not in self._handlers:
+            raise KeyError(f"Tarefa desconhecida: {name}")
+        if not self.running:
+            await self._execute(name, kwargs)
+        elif self.durable:
+            await self.redis.xadd(TASK_STREAM_KEY, {"name": name, "kwargs": json_util.dumps(kwargs)})
+        else:
+            try:
+                self._queue.put_nowait((None, name, kwargs))
+            except asyncio.QueueFull:
+                await self._execute(name, kwargs)
+
+    # =========================================================================
+    # --- Execução ---
+    # =========================================================================
+
+    async def _execute(self, name: str, kwargs: dict, entry_id: str = None) -> bool:
+        """Roda a tarefa, repetindo as falhas (só as idempotentes). Devolve se ela acabou dando certo."""
+        function, wants_redis, idempotent = self._handlers[name]
+        if not idempotent and entry_id is not None:
+            started = await self.redis.set(
+                TASK_STARTED_KEY_PREFIX + entry_id, 1, nx=True, ex=TASK_STARTED_TTL_SECONDS)
+            if not started:
+                return True  # entrega repetida de uma tarefa que já rodou (ou começou a rodar)
+        if wants_redis:
+            kwargs = {**kwargs, "redis_client": self.redis}
+        attempts = self.max_attempts if idempotent else 1
+        for attempt in range(1, attempts + 1):
+            try:
+                await function(**kwargs)
+                return True
+            except Exception as exc:
+                if attempt == attempts:
+                    print(f"AVISO: tarefa '{name}' falhou {attempt} vezes ({exc!r}); desistindo.")
+                    return False
+                delay = min(RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1), RETRY_BACKOFF_MAX_SECONDS)
+                await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+
+    async def _worker(self):
+        while True:
+            entry_id, name, kwargs = await self._queue.get()
+            try:
+                if name not in self._handlers:
+                    print(f"AVISO: tarefa desconhecida '{name}' descartada.")
+                    succeeded = False
+                else:
+                    succeeded = await self._execute(name, kwargs, entry_id)
+                if entry_id is not None:
+                    await self._finish(entry_id, name, kwargs, succeeded)
+            except Exception as exc:
+                # Falha ao confirmar no Redis: a tarefa continua pendente e é retomada depois.
+                print(f"AVISO: falha ao concluir a tarefa '{name}' ({exc}).")
+            finally:
+                self._held.discard(entry_id)
+                self._queue.task_done()
+
+    async def _finish(self, entry_id: str, name: str, kwargs: dict, succeeded: bool):
+        """Tira a tarefa do stream (e guarda as que falharam de vez)."""
+        async with self.redis.pipeline(transaction=False) as pipe:
+            if not succeeded:
+                pipe.lpush(FAILED_TASKS_KEY, json_util.dumps({"name": name, "kwargs": kwargs}))
+                pipe.ltrim(FAILED_TASKS_KEY, 0, FAILED_TASKS_MAX - 1)
+            pipe.xack(TASK_STREAM_KEY, TASK_GROUP, entry_id)
+            pipe.xdel(TASK_STREAM_KEY, entry_id)
+            await pipe.execute()
+
+    # =========================================================================
+    # --- Modo durável: leitura do stream ---
+    # =========================================================================
+
+    def _free_slots(self) -> int:
+        return min(TASK_FETCH_BATCH, self._queue.maxsize - self._queue.qsize())
+
+    def _put_entries(self, entries):
+        for entry_id, fields in entries:
+            # Uma entrada retomada que já está com este processo não entra duas vezes na fila.
+            if entry_id in self._held:
+                continue
+            self._held.add(entry_id)
+            kwargs = json_util.loads(fields["kwargs"], json_options=_JSON_OPTIONS)
+            # Só é lido do stream o que cabe na fila local, então não há espera aqui.
+            self._queue.put_nowait((entry_id, fields["name"], kwargs))
+
+    async def _fetch(self):
+        """Traz as tarefas do stream para a fila local (e retoma as de workers que caíram)."""
+        last_claim = last_heartbeat = 0.0
+        while True:
+            try:
+                now = time.monotonic()
+                if self._held and now - last_heartbeat >= TASK_HEARTBEAT_MS / 1000:
+                    # Zera o tempo ocioso das entradas deste processo: não são retomadas por outro.
+                    last_heartbeat = now
+                    await self.redis.xclaim(
+                        TASK_STREAM_KEY, TASK_GROUP, self.consumer, min_idle_time=0,
+                        message_ids=list(self._held), justid=True)
+                if not self._free_slots():
+                    # Fila local cheia: o resto espera no stream (sem dono, sem contar tempo ocioso).
+                    await asyncio.sleep(0.1)
+                    continue
+                if now - last_claim >= TASK_CLAIM_IDLE_MS / 1000:
+                    last_claim = now
+                    claimed = await self.redis.xautoclaim(
+                        TASK_STREAM_KEY, TASK_GROUP, self.consumer, min_idle_time=TASK_CLAIM_IDLE_MS,
+                        start_id="0-0", count=self._free_slots())
+                    self._put_entries(claimed[1])
+                    if not self._free_slots():
+                        continue
+                response = await self.redis.xreadgroup(
+                    TASK_GROUP, self.consumer, {TASK_STREAM_KEY: ">"}, count=self._free_slots(), block=1000)
+                for _, entries in response or []:
+                    self._put_entries(entries)
+            except redis.RedisError as exc:
+                print(f"AVISO: falha ao ler a fila de tarefas do Redis ({exc}). Nova tentativa em 1s.")
+                await asyncio.sleep(1)
+
+    # =========================================================================
+    # --- Ciclo de vida (lifespan) ---
+    # =========================================================================
+
+    async def start(self):
+        """Sobe os workers (e, no modo durável, a leitura do stream)."""
+        if self._workers:
+            return
+        self._closing = False
+        self._held.clear()
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        if self.durable:
+            try:
+                await self.redis.xgroup_create(TASK_STREAM_KEY, TASK_GROUP, id="0", mkstream=True)
+            except redis.ResponseError as exc:
+                if "BUSYGROUP" not in str(exc):
+                    raise
+            self._fetcher = asyncio.create_task(self._fetch())
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    async def drain(self, timeout: float):
+        """Para de aceitar tarefas e espera as que estão na fila (até `timeout` segundos)."""
+        if not self._workers:
+            return
+        # Daqui em diante, enqueue executa na hora.
+        self._closing = True
+        if self._fetcher is not None:
+            self._fetcher.cancel()
+            await asyncio.gather(self._fetcher, return_exceptions=True)
+            self._fetcher = None
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            where = "continuam no Redis" if self.durable else "foram perdidas"
+            print(f"AVISO: {self._queue.qsize()} tarefas não terminaram no encerramento ({where}).")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+
+task_queue = TaskQueue(
+    max_size=settings.TASK_QUEUE_MAX_SIZE,
+    workers=settings.TASK_QUEUE_WORKERS,
+    max_attempts=settings.TASK_QUEUE_MAX_ATTEMPTS,
+    durable=settings.TASK_QUEUE_DURABLE,
+)
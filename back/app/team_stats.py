@@ -0,0 +1,184 @@
+# app/team_stats.py
+"""
+Contadores de cada time (posts, amigos, jogadores, likes recebidos e scrims por status),
+materializados na coleção `team_stats` (TeamStats, um documento por time com `_id` = id do time).
+
+Antes, cada número da página de perfil seria uma agregação sobre `posts`, `teams` e
+`scrims`. Agora:
+- Escrita: as rotas que mudam um contador enfileiram um `$inc` atômico no documento do time
+  (upsert: o documento nasce no primeiro incremento), aplicado pela fila de tarefas
+  (app/task_queue.py) depois da resposta. Nenhuma leitura antes.
+- Leitura: um find_one pelo `_id`, O(1), sem depender do tamanho das outras coleções.
+- Conferência: de tempos em tempos (TEAM_STATS_RECONCILE_INTERVAL_SECONDS), uma única
+  agregação recalcula todos os contadores a partir da base (incluindo os posts arquivados)
+  e, enquanto o resultado chega, corrige só os documentos que divergiram (uma escrita que
+  falhou no meio, duas requisições concorrentes do mesmo time, dados carregados direto no banco).
+  Antes da agregação, uma cópia de `team_stats` é tirada ($out em `team_stats_snapshot`), e é
+  com ela que o recálculo é comparado. A correção só é aplicada se o contador ainda é o da
+  cópia; se um `$inc` chegou depois dela (durante ou depois da agregação), fica para a
+  próxima rodada.
+"""
+import asyncio
+from typing import Dict, Optional
+
+from beanie import PydanticObjectId
+from pymongo import UpdateOne
+
+from .config import settings
+from .task_queue import task_queue
+from .models import ArchivedPost, Post, Scrim, ScrimStatusEnum, Team, TeamStats, TeamStatsOut
+
+# Um worker por rodada (a trava expira junto com o intervalo entre as rodadas).
+RECONCILE_LOCK_KEY = "team_stats:reconcile:lock"
+# Correções enviadas por bulk_write.
+RECONCILE_BATCH_SIZE = 500
+# Cópia de `team_stats` tirada no início de cada conferência.
+SNAPSHOT_COLLECTION = "team_stats_snapshot"
+
+COUNTERS = list(TeamStatsOut.model_fields)
+
+# Contador de scrims de cada status.
+SCRIM_STATUS_COUNTERS = {
+    ScrimStatusEnum.PENDING: "scrims_pending",
+    ScrimStatusEnum.CONFIRMED: "scrims_confirmed",
+    ScrimStatusEnum.COMPLETED: "scrims_completed",
+    ScrimStatusEnum.CANCELED: "scrims_canceled",
+}
+
+
+# =============================================================================
+# --- Escrita (rotas) ---
+# =============================================================================
+
+async def increment(team_id, **deltas: int):
+    """Soma os deltas aos contadores de um time (ex.: `increment(id, posts_count=1)`), em segundo plano."""
+    await increment_many({team_id: deltas})
+
+
+async def increment_many(deltas_by_team: Dict[object, Dict[str, int]]):
+    """Soma os deltas de vários times, em segundo plano (pela fila de tarefas)."""
+    deltas = {str(team_id): team_deltas for team_id, team_deltas in deltas_by_team.items() if any(team_deltas.values())}
+    if deltas:
+        await task_queue.enqueue("team_stats.apply_increments", deltas_by_team=deltas)
+
+
+@task_queue.task("team_stats.apply_increments", idempotent=False)
+async def apply_increments(deltas_by_team: Dict[str, Dict[str, int]]):
+    """Aplica os deltas de vários times numa única ida ao banco."""
+    operations = [
+        UpdateOne({"_id": PydanticObjectId(team_id)}, {"$inc": deltas}, upsert=True)
+        for team_id, deltas in deltas_by_team.items()
+    ]
+    await TeamStats.get_motor_collection().bulk_write(operations, ordered=False)
+
+
+# =============================================================================
+# --- Leitura ---
+# =============================================================================
+
+async def get_stats(team_id) -> Optional[TeamStatsOut]:
+    """Os contadores de um time (None se ele ainda não tiver nenhum)."""
+    doc = await TeamStats.get_motor_collection().find_one({"_id": team_id}, {"_id": 0})
+    return TeamStatsOut(**doc) if doc else None
+
+
+# =============================================================================
+# --- Conferência ---
+# =============================================================================
+
+def _posts_by_author() -> list:
+    return [{"$group": {
+        "_id": "$author.$id",
+        "posts_count": {"$sum": 1},
+        "likes_received": {"$sum": {"$size": "$likes"}},
+    }}]
+
+
+def _scrims_by_team(side: str) -> list:
+    # Cada scrim conta para os dois times: um ramo por lado (`proposing_team` e `opponent_team`).
+    return [{"$group": {"_id": f"${side}.$id", **{
+        counter: {"$sum": {"$cond": [{"$eq": ["$status", status.value]}, 1, 0]}}
+        for status, counter in SCRIM_STATUS_COUNTERS.items()
+    }}}]
+
+
+def reconcile_pipeline() -> list:
+    """
+    Agregação sobre `teams` que junta ($unionWith) os totais por autor de `posts` e de
+    `posts_archive` e os totais por time de `scrims`, soma tudo por time e traz ao lado o
+    documento de `team_stats` como estava antes da agregação (a cópia em SNAPSHOT_COLLECTION).
+    """
+    return [
+        {"$project": {
+            # Marca as linhas vindas de `teams`.
+            "team": {"$literal": True},
+            "friends_count": {"$size": {"$ifNull": ["$friends", []]}},
+            "players_count": {"$size": {"$ifNull": ["$players", []]}},
+        }},
+        {"$unionWith": {"coll": Post.Settings.name, "pipeline": _posts_by_author()}},
+        {"$unionWith": {"coll": ArchivedPost.Settings.name, "pipeline": _posts_by_author()}},
+        {"$unionWith": {"coll": Scrim.Settings.name, "pipeline": _scrims_by_team("proposing_team")}},
+        {"$unionWith": {"coll": Scrim.Settings.name, "pipeline": _scrims_by_team("opponent_team")}},
+        # `team` só existe nas linhas vindas de `teams`: contadores de times apagados ficam de fora.
+        {"$group": {
+            "_id": "$_id",
+            "team": {"$sum": {"$cond": [{"$ifNull": ["$team", False]}, 1, 0]}},
+            **{counter: {"$sum": f"${counter}"} for counter in COUNTERS},
+        }},
+        {"$match": {"team": {"$gt": 0}}},
+        {"$lookup": {"from": SNAPSHOT_COLLECTION, "localField": "_id", "foreignField": "_id", "as": "current"}},
+    ]
+
+
+async def reconcile() -> int:
+    """Recalcula os contadores de todos os times e corrige os que divergiram. Devolve quantos foram corrigidos."""
+    collection = TeamStats.get_motor_collection()
+    # A cópia vem antes de qualquer leitura da agregação: um `$inc` aplicado depois dela muda
+    # o contador em `team_stats` e a correção condicional abaixo deixa de casar.
+    await collection.aggregate([{"$out": SNAPSHOT_COLLECTION}]).to_list(None)
+    corrected = 0
+    operations = []
+
+    async def flush():
+        nonlocal corrected
+        if operations:
+            result = await collection.bulk_write(operations, ordered=False)
+            # As correções cujo contador mudou depois da cópia não casam e não contam.
+            corrected += result.modified_count + result.upserted_count
+            operations.clear()
+
+    # Os resultados chegam em lotes do cursor: a memória não cresce com o número de times.
+    async for row in Team.get_motor_collection().aggregate(reconcile_pipeline(), allowDiskUse=True):
+        expected = {counter: row[counter] for counter in COUNTERS}
+        current = row["current"][0] if row["current"] else None
+        if current is None:
+            # O documento não existia na cópia; se um `$inc` o criou depois, ele prevalece.
+            operations.append(UpdateOne({"_id": row["_id"]}, {"$setOnInsert": expected}, upsert=True))
+        else:
+            observed = {counter: current.get(counter, 0) for counter in COUNTERS}
+            if observed == expected:
+                continue
+            drifted = {counter: value for counter, value in expected.items() if observed[counter] != value}
+            operations.append(UpdateOne(
+                {"_id": row["_id"], **{counter: current.get(counter) for counter in drifted}},
+                {"$set": drifted},
+            ))
+        if len(operations) >= RECONCILE_BATCH_SIZE:
+            await flush()
+    await flush()
+    await collection.database.drop_collection(SNAPSHOT_COLLECTION)
+    return corrected
+
+
+async def run_periodically(redis_client):
+    """Roda a conferência a cada TEAM_STATS_RECONCILE_INTERVAL_SECONDS (tarefa iniciada no lifespan)."""
+    interval = settings.TEAM_STATS_RECONCILE_INTERVAL_SECONDS
+    while True:
+        if await redis_client.set(RECONCILE_LOCK_KEY, 1, nx=True, ex=interval):
+            try:
+                corrected = await reconcile()
+                if corrected:
+                    print(f"INFO: contadores de {corrected} times corrigidos.")
+            except Exception as exc:
+                print(f"AVISO: falha na conferência dos contadores dos times ({exc}). Nova tentativa na próxima rodada.")
+        await asyncio.sleep(interval)
@@ -0,0 +1,300 @@
+# app/tracing.py
+"""
+Rastreamento (tracing) leve das requisições, dentro do próprio processo.
+
+Cada requisição amostrada vira um *trace*: um span raiz para a requisição e spans filhos
+para cada comando do MongoDB, comando/pipeline do Redis, consulta ao Neo4j e carregamento
+de Link do Beanie (fetch_link / fetch_all_links). Cada span guarda início, duração e atributos.
+
+Amostragem:
+- TRACE_SAMPLE_RATE: fração das requisições rastreadas (0 desliga);
+- TRACE_ROUTE_SAMPLE_RATES: taxas por prefixo de caminho, ex.: {"/api/teams/recommendations": 1.0};
+- o cabeçalho `X-Trace: 1` força o rastreamento de uma requisição.
+
+Exportação: os traces terminados são gravados por uma thread em segundo plano em
+TRACE_EXPORT_PATH, no formato de eventos do Chrome (Trace Event Format). O arquivo abre
+direto no https://ui.perfetto.dev ou em chrome://tracing, com uma linha por requisição e
+os spans empilhados como num flame graph.
+"""
+import contextvars
+import functools
+import itertools
+import json
+import os
+import queue
+import random
+import threading
+import time
+
+from pymongo import monitoring
+
+from .config import settings
+
+
+def _now_us() -> float:
+    return time.perf_counter_ns() / 1000
+
+
+class Trace:
+    """Os spans de uma requisição amostrada."""
+    _ids = itertools.count(1)
+
+    def __init__(self):
+        self.trace_id = os.urandom(16).hex()
+        # "Linha" da requisição no visualizador (um tid por trace).
+        self.lane = next(Trace._ids)
+        self.spans = []
+        # Spans dos comandos do MongoDB terminam nas threads do Motor.
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+
+class Span:
+    __slots__ = ("trace", "name", "span_id", "parent_id", "start_us", "duration_us", "attributes")
+
+    def __init__(self, trace, name, parent_id=None, attributes=None, start_us=None):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_us = _now_us() if start_us is None else start_us
+        self.duration_us = None
+        self.attributes = attributes or {}
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def end(self, duration_us=None):
+        self.duration_us = _now_us() - self.start_us if duration_us is None else duration_us
+        self.trace.add(self)
+
+    def child(self, name, **attributes):
+        return Span(self.trace, name, parent_id=self.span_id, attributes=attributes)
+
+
+# Span ativo na tarefa atual (None = requisição não amostrada: nada é medido).
+current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class span:
+    """
+    Abre um span filho do span atual, com `with` ou `async with`:
+
+        async with tracing.span("recommendations.similarity", team_id=team_id):
+            ...
+
+    Fora de uma requisição amostrada não faz nada.
+    """
+    __slots__ = ("name", "attributes", "_span", "_token")
+
+    def __init__(self, name, **attributes):
+        self.name = name
+        self.attributes = attributes
+        self._span = None
+        self._token = None
+
+    def __enter__(self):
+        parent = current_span.get()
+        if parent is not None:
+            self._span = parent.child(self.name, **self.attributes)
+            self._token = current_span.set(self._span)
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._span is not None:
+            if exc_type is not None:
+                self._span.set_attribute("error", exc_type.__name__)
+            current_span.reset(self._token)
+            self._span.end()
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+# =============================================================================
+# --- Exportação ---
+# =============================================================================
+
+class ChromeTraceExporter:
+    """Grava os traces terminados no formato de eventos do Chrome, numa thread à parte."""
+
+    def __init__(self, path):
+        self.path = path
+        self._queue = queue.Queue(maxsize=1000)
+        self._worker = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def export(self, trace):
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._write_loop, name="trace-exporter", daemon=True)
+                    self._worker.start()
+
+    def close(self, timeout=5.0):
+        """Espera os traces pendentes serem gravados (chamado no encerramento da aplicação)."""
+        if self._worker is not None:
+            self._queue.put(None)
+            self._worker.join(timeout)
+
+    @staticmethod
+    def to_events(trace):
+        events = []
+        for s in trace.spans:
+            events.append({
+                "name": s.name,
+                "ph": "X",  # evento "completo": início + duração
+                "ts": s.start_us,
+                "dur": s.duration_us,
+                "pid": os.getpid(),
+                "tid": trace.lane,
+                "args": {"trace_id": trace.trace_id, "span_id": s.span_id, "parent_id": s.parent_id, **s.attributes},
+            })
+        return events
+
+    def _write_loop(self):
+        # O formato aceita um array JSON sem o "]" final, o que permite só acrescentar eventos.
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        with open(self.path, "a", encoding="utf-8") as file:
+            if new_file:
+                file.write("[\n")
+            while True:
+                trace = self._queue.get()
+                if trace is None:
+                    break
+                for event in self.to_events(trace):
+                    file.write(json.dumps(event, default=str) + ",\n")
+                file.flush()
+
+
+exporter = ChromeTraceExporter(settings.TRACE_EXPORT_PATH)
+
+
+# =============================================================================
+# --- Requisições ---
+# =============================================================================
+
+def sample_rate_for(path: str) -> float:
+    """Taxa de amostragem do caminho: a do prefixo mais longo configurado, ou a taxa geral."""
+    best, rate = -1, settings.TRACE_SAMPLE_RATE
+    for prefix, prefix_rate in settings.TRACE_ROUTE_SAMPLE_RATES.items():
+        if path.startswith(prefix) and len(prefix) > best:
+            best, rate = len(prefix), prefix_rate
+    return rate
+
+
+class TracingMiddleware:
+    """Middleware ASGI que abre o span raiz das requisições amostradas."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._sampled(scope):
+            await self.app(scope, receive, send)
+            return
+
+        root = Span(Trace(), f"{scope['method']} {scope['path']}", attributes={"http.path": scope["path"]})
+        token = current_span.set(root)
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            current_span.reset(token)
+            route = scope.get("route")
+            if route is not None:
+                root.name = f"{scope['method']} {route.path}"
+            root.set_attribute("http.status_code", status_code)
+            root.end()
+            exporter.export(root.trace)
+
+    @staticmethod
+    def _sampled(scope):
+        for name, value in scope["headers"]:
+            if name == b"x-trace":
+                return value == b"1"
+        rate = sample_rate_for(scope["path"])
+        return rate > 0 and random.random() < rate
+
+
+# =============================================================================
+# --- MongoDB e Beanie ---
+# =============================================================================
+
+class MongoTraceListener(monitoring.CommandListener):
+    """Um span por comando do MongoDB, filho do span ativo de quem disparou o comando."""
+
+    def __init__(self):
+        self._open = {}  # request_id -> span
+
+    def started(self, event):
+        parent = current_span.get()  # o Motor copia o contexto da tarefa para a sua thread
+        if parent is not None:
+            target = event.command.get(event.command_name)
+            self._open[event.request_id] = parent.child(
+                f"mongo {event.command_name}",
+                **{"db.collection": target if isinstance(target, str) else None}
+            )
+
+    def succeeded(self, event):
+        child = self._open.pop(event.request_id, None)
+        if child is not None:
+            child.end(event.duration_micros)
+
+    def failed(self, event):
+        child = self._open.pop(event.request_id, None)
+        if child is not None:
+            child.set_attribute("error", str(event.failure.get("errmsg", "")) if isinstance(event.failure, dict) else "")
+            child.end(event.duration_micros)
+
+
+mongo_trace_listener = MongoTraceListener()
+
+
+def _traced(name, method, attributes):
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        if current_span.get() is None:
+            return await method(*args, **kwargs)
+        with span(name, **attributes(*args, **kwargs)):
+            return await method(*args, **kwargs)
+    wrapper._traced = True
+    return wrapper
+
+
+def instrument_beanie():
+    """Envolve os carregamentos de Link do Beanie em spans (ex.: o fetch_link dos amigos)."""
+    from beanie import Document, Link
+
+    if getattr(Document.fetch_link, "_traced", False):
+        return
+
+    Document.fetch_link = _traced(
+        "beanie fetch_link", Document.fetch_link,
+        lambda document, field: {"beanie.document": type(document).__name__, "beanie.field": str(field)})
+    Document.fetch_all_links = _traced(
+        "beanie fetch_all_links", Document.fetch_all_links,
+        lambda document: {"beanie.document": type(document).__name__})
+    Link.fetch = _traced(
+        "beanie Link.fetch", Link.fetch,
+        lambda link, fetch_links=False: {"beanie.document": link.document_class.__name__})
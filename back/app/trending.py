@@ -0,0 +1,132 @@
+# app/trending.py
+"""
+Hashtags e menções dos posts, e as hashtags em alta.
+
+`create_post` extrai as `#hashtags` (normalizadas: minúsculas, sem acentos) e as menções
+`@TAG` (resolvidas para os times com essa tag) e as grava no próprio post, em campos
+indexados. Os posts de uma hashtag saem direto do índice, sem varrer a coleção.
+
+Hashtags em alta: contadores em janelas deslizantes no Redis, sem nenhuma agregação sobre
+a coleção de posts.
+- cada uso de hashtag incrementa o balde do minuto (`trending:hashtags:m:<minuto>`) e o
+  balde da hora (`trending:hashtags:h:<hora>`);
+- a janela "hour" soma os últimos 60 baldes de minuto; a janela "day", o balde da hora
+  corrente e os 23 anteriores;
+- cada balde guarda no máximo TRENDING_BUCKET_CAPACITY hashtags (top-k "Space-Saving"):
+  quando está cheio, uma hashtag nova entra no lugar da menos usada herdando a contagem
+  dela. As hashtags realmente frequentes nunca saem, e a memória não cresce com o número
+  de hashtags distintas (contagens das menos usadas podem vir superestimadas).
+"""
+import datetime
+import re
+from typing import List, Tuple
+
+from .search import normalize
+from .task_queue import task_queue
+
+BUCKET_KEY_PREFIX = "trending:hashtags:"
+# Resultado de uma janela já somada, reaproveitado até o próximo minuto.
+WINDOW_KEY_PREFIX = "trending:hashtags:window:"
+
+TRENDING_BUCKET_CAPACITY = 1000
+MAX_HASHTAGS_PER_POST = 10
+MAX_MENTIONS_PER_POST = 10
+
+# Janela -> (granularidade do balde em segundos, número de baldes somados)
+WINDOWS = {
+    "hour": (60, 60),
+    "day": (3600, 24),
+}
+
+# Um `#` ou `@` no começo do texto ou depois de algo que não seja letra/número
+# (assim e-mails e âncoras como "pagina#secao" não contam).
+_HASHTAG_PATTERN = re.compile(r"(?<![\w#])#([a-z0-9_]{2,50})")
+_MENTION_PATTERN = re.compile(r"(?<![\w@])@([A-Za-z0-9_]{2,30})")
+
+
+def normalize_hashtag(tag: str) -> str:
+    """"#Campeão" -> "campeao" (a mesma forma usada na extração)."""
+    return normalize(tag.strip().lstrip("#"))
+
+
+def extract_hashtags(content: str) -> List[str]:
+    """Hashtags distintas do texto, normalizadas e na ordem em que aparecem."""
+    tags = dict.fromkeys(_HASHTAG_PATTERN.findall(normalize(content)))
+    return list(tags)[:MAX_HASHTAGS_PER_POST]
+
+
+def extract_mentions(content: str) -> List[str]:
+    """Tags de times mencionadas (`@FURI`), distintas e como foram escritas."""
+    handles = dict.fromkeys(_MENTION_PATTERN.findall(content))
+    return list(handles)[:MAX_MENTIONS_PER_POST]
+
+
+def _bucket_key(granularity: int, bucket: int) -> str:
+    kind = "m" if granularity == 60 else "h"
+    return f"{BUCKET_KEY_PREFIX}{kind}:{bucket}"
+
+
+def _buckets(granularity: int, count: int, at: datetime.datetime) -> List[str]:
+    current = int(at.timestamp()) // granularity
+    return [_bucket_key(granularity, current - offset) for offset in range(count)]
+
+
+# =============================================================================
+# --- Escrita ---
+# =============================================================================
+
+@task_queue.task("trending.record_hashtags", idempotent=False)
+async def record_hashtags(redis_client, hashtags: List[str], at: datetime.datetime = None):
+    """Conta um uso de cada hashtag nos baldes do minuto e da hora (tarefa enfileirada ao criar um post)."""
+    if not hashtags:
+        return
+    at = at or datetime.datetime.now(datetime.UTC)
+    keys = [(_buckets(granularity, 1, at)[0], granularity * count)
+            for granularity, count in WINDOWS.values()]
+
+    # 1) Tamanho de cada balde, a menor contagem dele e se as hashtags já estão lá.
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for key, _ in keys:
+            pipe.zcard(key)
+            pipe.zrange(key, 0, 0, withscores=True)
+            pipe.zmscore(key, hashtags)
+        state = await pipe.execute()
+
+    # 2) Incrementa; num balde cheio, cada hashtag nova toma o lugar da menos usada.
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for index, (key, window_seconds) in enumerate(keys):
+            size, lowest, scores = state[3 * index: 3 * index + 3]
+            new_tags = [tag for tag, score in zip(hashtags, scores) if score is None]
+            free = max(TRENDING_BUCKET_CAPACITY - size, 0)
+            if lowest and len(new_tags) > free:
+                floor = lowest[0][1]
+                pipe.zadd(key, {tag: floor for tag in new_tags[free:]}, nx=True)
+            for tag in hashtags:
+                pipe.zincrby(key, 1, tag)
+            pipe.zremrangebyrank(key, 0, -(TRENDING_BUCKET_CAPACITY + 1))
+            # O balde vive o tempo da janela mais longa que o usa, mais uma folga.
+            pipe.expire(key, window_seconds + 300)
+        await pipe.execute()
+
+
+# =============================================================================
+# --- Leitura ---
+# =============================================================================
+
+async def top_hashtags(redis_client, window: str, limit: int,
+                       at: datetime.datetime = None) -> List[Tuple[str, int]]:
+    """As hashtags mais usadas na janela, com as contagens, da mais usada para a menos."""
+    at = at or datetime.datetime.now(datetime.UTC)
+    granularity, count = WINDOWS[window]
+    # A soma dos baldes muda no máximo uma vez por minuto: cada minuto tem a sua chave.
+    merged_key = f"{WINDOW_KEY_PREFIX}{window}:{int(at.timestamp()) // 60}"
+
+    if not await redis_client.exists(merged_key):
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.zunionstore(merged_key, _buckets(granularity, count, at))
+            pipe.zremrangebyrank(merged_key, 0, -(TRENDING_BUCKET_CAPACITY + 1))
+            pipe.expire(merged_key, 120)
+            await pipe.execute()
+
+    top = await redis_client.zrevrange(merged_key, 0, limit - 1, withscores=True)
+    return [(tag, int(score)) for tag, score in top]
@@ -0,0 +1,99 @@
+# app/views.py
+"""
+Visualizações únicas de posts e perfis de times, contadas com HyperLogLog no Redis.
+
+Cada objeto tem uma chave por dia (`views:<tipo>:<id>:<AAAAMMDD>`, em UTC) onde entram os
+visitantes que o viram. O HyperLogLog estima quantos visitantes distintos a chave recebeu
+com ~0,8% de erro e ocupa no máximo 12 KB, não importa quantos visitantes sejam (com
+poucos visitantes, a codificação esparsa do Redis usa bem menos).
+
+Como chaves de HyperLogLog podem ser unidas, as estatísticas da semana e do mês são o
+PFCOUNT dos últimos 7 e 30 dias juntos: um visitante que voltou em dias diferentes conta
+uma vez só. As chaves diárias expiram depois de VIEWS_RETENTION_DAYS.
+
+Visitante: o id do time logado ou, para quem não está logado, um hash do IP + user agent.
+As rotas registram as visualizações em segundo plano (pela fila de tarefas, app/task_queue.py),
+todas as da resposta num único pipeline: uma página de 20 posts é uma única ida ao Redis. Listas sem
+paginação (GET /posts ou /teams/{id}/posts sem `limit`) contam só os primeiros
+VIEWS_MAX_OBJECTS_PER_RESPONSE itens (uma página cheia): o pipeline não cresce com a base.
+"""
+import datetime
+import hashlib
+import itertools
+from typing import Annotated, Dict, Iterable, Optional
+
+from beanie import PydanticObjectId
+from fastapi import Depends, Request
+
+from .security import get_optional_team_id
+from .task_queue import task_queue
+
+VIEWS_KEY_PREFIX = "views:"
+VIEWS_RETENTION_DAYS = 31
+# Quantos objetos de uma mesma resposta, no máximo, contam visualização (os primeiros da
+# lista). É a maior página que as rotas servem (GET /posts?limit=100).
+VIEWS_MAX_OBJECTS_PER_RESPONSE = 100
+
+# Dias somados em cada período das estatísticas.
+PERIODS = {"day": 1, "week": 7, "month": 30}
+
+
+def get_viewer_id(
+    request: Request,
+    team_id: Annotated[Optional[PydanticObjectId], Depends(get_optional_team_id)]
+) -> str:
+    """Dependência que identifica quem está vendo a resposta (time logado ou visitante anônimo)."""
+    if team_id is not None:
+        return f"team:{team_id}"
+    client = request.client.host if request.client else ""
+    fingerprint = f"{client}|{request.headers.get('user-agent', '')}"
+    return "anon:" + hashlib.sha1(fingerprint.encode()).hexdigest()[:16]
+
+
+def _day_key(kind: str, object_id, day: datetime.date) -> str:
+    return f"{VIEWS_KEY_PREFIX}{kind}:{object_id}:{day:%Y%m%d}"
+
+
+@task_queue.task("views.record")
+async def record_views(redis_client, kind: str, object_ids: Iterable, viewer_id: str):
+    """Conta uma visualização de `viewer_id` em cada objeto, num único pipeline."""
+    object_ids = list(dict.fromkeys(str(object_id) for object_id in object_ids))
+    if not object_ids:
+        return
+    today = datetime.datetime.now(datetime.UTC).date()
+    ttl = VIEWS_RETENTION_DAYS * 24 * 3600
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for object_id in object_ids:
+            key = _day_key(kind, object_id, today)
+            pipe.pfadd(key, viewer_id)
+            pipe.expire(key, ttl)
+        await pipe.execute()
+
+
+async def unique_views(redis_client, kind: str, object_id) -> Dict[str, int]:
+    """Visitantes distintos do objeto hoje, nos últimos 7 dias e nos últimos 30 dias."""
+    today = datetime.datetime.now(datetime.UTC).date()
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for days in PERIODS.values():
+            # PFCOUNT com várias chaves conta a união delas (sem gravar a união).
+            pipe.pfcount(*(_day_key(kind, object_id, today - datetime.timedelta(days=offset))
+                           for offset in range(days)))
+        counts = await pipe.execute()
+    return dict(zip(PERIODS, counts))
+
+
+class ViewTracker:
+    """Enfileira o registro do que o visitante da requisição viu (feito fora da resposta)."""
+
+    def __init__(self, viewer_id: str):
+        self.viewer_id = viewer_id
+
+    async def record(self, kind: str, object_ids: Iterable):
+        object_ids = [str(object_id) for object_id in itertools.islice(object_ids, VIEWS_MAX_OBJECTS_PER_RESPONSE)]
+        if object_ids:
+            await task_queue.enqueue("views.record", kind=kind, object_ids=object_ids, viewer_id=self.viewer_id)
+
+
+def get_view_tracker(viewer_id: Annotated[str, Depends(get_viewer_id)]) -> ViewTracker:
+    """Dependência das rotas que servem posts e perfis."""
+    return ViewTracker(viewer_id)
@@ -0,0 +1,369 @@
+# benchmarks/load.py
+"""
+Gerador de carga da API com uma mistura configurável de jornadas de usuário:
+
+- feed:   login → feed → curtir um post → comentar
+- social: busca → perfil de um time → pedido de amizade
+- scrim:  login → propõe uma scrim → o oponente faz login e aceita
+
+Modelos de chegada:
+- fechado (--users): N usuários virtuais repetem jornadas, cada um esperando a anterior terminar;
+- aberto (--rate): jornadas chegam como um processo de Poisson, independente de a API dar conta.
+
+Também grava (--record) e reproduz (--replay) um log JSONL de requisições, uma por linha:
+    {"t": 0.132, "method": "POST", "path": "/api/posts/.../like", "endpoint": "POST /posts/{id}/like",
+     "team": 12, "json": null, "form": null}
+onde "t" é o segundo (desde o início) em que a requisição saiu e "team" é o índice do time
+autenticado. O replay respeita os tempos originais (ajustáveis com --speed).
+
+Alvo: por padrão a API roda no próprio processo sobre os substitutos em memória
+(benchmarks/standins.py). Com --base-url a carga vai por HTTP para uma instância de verdade,
+que precisa ter sido populada com `populate.py --scale` usando os mesmos --teams e --seed.
+
+Uso (a partir da pasta `back`):
+    python -m benchmarks.load --users 20 --duration 30 --mix feed=6,social=3,scrim=1
+    python -m benchmarks.load --rate 50 --duration 60 --base-url http://localhost:8000
+    python -m benchmarks.load --users 10 --duration 20 --record pico.jsonl
+    python -m benchmarks.load --replay pico.jsonl --speed 2
+"""
+import argparse
+import asyncio
+import bisect
+import datetime
+import json
+import random
+import time
+from collections import Counter
+from pathlib import Path
+
+import httpx
+
+# Limites (em ms) das faixas do histograma de latência.
+HISTOGRAM_BOUNDS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+SEARCH_TERMS = ["Wolves", "Dragons", "Titans", "Red", "Iron", "Shadow", "Storm", "Neon"]
+COMMENTS = ["Bom jogo!", "Bora marcar um treino?", "GG WP", "Que jogada!"]
+GAMES = ["League of Legends", "Valorant", "Counter-Strike"]
+FAKE_PASSWORD = "password123"  # a mesma senha usada pelo populate.py
+
+
+class EndpointStats:
+    """Latências, status e erros de um endpoint."""
+
+    def __init__(self):
+        self.latencies = []
+        self.statuses = Counter()
+        self.errors = 0
+
+    def add(self, elapsed_ms, status, ok):
+        self.latencies.append(elapsed_ms)
+        self.statuses[status] += 1
+        if not ok:
+            self.errors += 1
+
+    def percentile(self, fraction):
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+    def histogram(self):
+        buckets = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+        for latency in self.latencies:
+            buckets[bisect.bisect_left(HISTOGRAM_BOUNDS_MS, latency)] += 1
+        return buckets
+
+
+class Recorder:
+    """Escreve cada requisição enviada no log JSONL usado pelo --replay."""
+
+    def __init__(self, path):
+        self.file = open(path, "w", encoding="utf-8")
+
+    def write(self, entry):
+        self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+class LoadRunner:
+    """Estado compartilhado da carga: cliente HTTP, contas semeadas, tokens e estatísticas."""
+
+    def __init__(self, client, accounts, seed, recorder=None):
+        self.client = client
+        self.accounts = accounts  # lista de (team_id, email), na ordem do gerador do populate.py
+        self.rng = random.Random(seed)
+        self.recorder = recorder
+        self.tokens = {}
+        self._pending_logins = {}
+        self.stats = {}
+        self.dropped = 0
+        self.started = time.perf_counter()
+
+    async def call(self, endpoint, method, path, team=None, json_body=None, form=None, expect=(200, 201, 204)):
+        """Envia uma requisição e registra latência/status sob o nome do endpoint (sem IDs)."""
+        if team is not None and team not in self.tokens and endpoint != "POST /login":
+            # Um único login por time, mesmo com várias requisições dele saindo ao mesmo tempo.
+            if team not in self._pending_logins:
+                self._pending_logins[team] = asyncio.ensure_future(self.login(team))
+            await self._pending_logins[team]
+
+        if self.recorder:
+            self.recorder.write({
+                "t": round(time.perf_counter() - self.started, 4), "method": method, "path": path,
+                "endpoint": endpoint, "team": team, "json": json_body, "form": form,
+            })
+
+        headers = {}
+        if team is not None and team in self.tokens:
+            headers["Authorization"] = f"Bearer {self.tokens[team]}"
+        stats = self.stats.setdefault(endpoint, EndpointStats())
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, headers=headers, json=json_body, data=form)
+        except httpx.HTTPError:
+            stats.add((time.perf_counter() - start) * 1000, "erro de rede", ok=False)
+            return None
+        stats.add((time.perf_counter() - start) * 1000, response.status_code, ok=response.status_code in expect)
+        return response
+
+    async def login(self, team, form=None):
+        form = form or {"username": self.accounts[team][1], "password": FAKE_PASSWORD}
+        response = await self.call("POST /login", "POST", "/api/login", team=team, form=form)
+        if response is not None and response.status_code == 200:
+            self.tokens[team] = response.json()["access_token"]
+
+    def random_team(self):
+        return self.rng.randrange(len(self.accounts))
+
+
+# =============================================================================
+# --- Jornadas ---
+# =============================================================================
+
+async def feed_journey(runner):
+    team = runner.random_team()
+    await runner.login(team)
+    response = await runner.call("GET /posts", "GET", "/api/posts")
+    if response is None or response.status_code != 200 or not response.json():
+        return
+    post_id = runner.rng.choice(response.json())["id"]
+    await runner.call("POST /posts/{id}/like", "POST", f"/api/posts/{post_id}/like", team=team)
+    await runner.call("POST /posts/{id}/comments", "POST", f"/api/posts/{post_id}/comments", team=team,
+                      json_body={"content": runner.rng.choice(COMMENTS)})
+
+
+async def social_journey(runner):
+    team = runner.random_team()
+    q = runner.rng.choice(SEARCH_TERMS)
+    response = await runner.call("GET /teams/search", "GET", f"/api/teams/search?q={q}")
+    own_id = runner.accounts[team][0]
+    candidates = [t["id"] for t in (response.json() if response is not None and response.status_code == 200 else [])
+                  if t["id"] != own_id]
+    if not candidates:
+        return
+    target_id = runner.rng.choice(candidates)
+    await runner.call("GET /teams/{id}", "GET", f"/api/teams/{target_id}")
+    # 400 = pedido já enviado ou times já amigos: resposta esperada, não erro.
+    await runner.call("POST /friends/request/{id}", "POST", f"/api/friends/request/{target_id}", team=team,
+                      expect=(204, 400))
+
+
+async def scrim_journey(runner):
+    proposer = runner.random_team()
+    opponent = runner.random_team()
+    if proposer == opponent:
+        return
+    await runner.login(proposer)
+    when = datetime.datetime.now(datetime.UTC) + datetime.timedelta(days=runner.rng.randint(1, 14))
+    response = await runner.call("POST /scrims", "POST", "/api/scrims", team=proposer, json_body={
+        "opponent_team_id": runner.accounts[opponent][0],
+        "scrim_datetime": when.isoformat(),
+        "game": runner.rng.choice(GAMES),
+    })
+    if response is None or response.status_code != 201:
+        return
+    await runner.login(opponent)
+    scrim_id = response.json()["id"]
+    await runner.call("POST /scrims/{id}/accept", "POST", f"/api/scrims/{scrim_id}/accept", team=opponent)
+
+
+JOURNEYS = {"feed": feed_journey, "social": social_journey, "scrim": scrim_journey}
+
+
+def parse_mix(text):
+    """'feed=6,social=3,scrim=1' -> ([jornadas], [pesos])."""
+    names, weights = [], []
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in JOURNEYS:
+            raise SystemExit(f"Jornada desconhecida: {name} (opções: {', '.join(JOURNEYS)})")
+        names.append(name)
+        weights.append(float(weight or 1))
+    return names, weights
+
+
+# =============================================================================
+# --- Modelos de chegada ---
+# =============================================================================
+
+async def closed_loop(runner, mix, users, duration, think_time):
+    """N usuários virtuais; cada um só começa a próxima jornada quando a anterior termina."""
+    deadline = time.perf_counter() + duration
+    names, weights = mix
+
+    async def user():
+        while time.perf_counter() < deadline:
+            await JOURNEYS[runner.rng.choices(names, weights)[0]](runner)
+            if think_time:
+                await asyncio.sleep(runner.rng.expovariate(1 / think_time))
+
+    await asyncio.gather(*(user() for _ in range(users)))
+
+
+async def open_loop(runner, mix, rate, duration, max_in_flight):
+    """Jornadas chegam a `rate` por segundo (Poisson), sem esperar as anteriores terminarem."""
+    deadline = time.perf_counter() + duration
+    names, weights = mix
+    in_flight = set()
+    while time.perf_counter() < deadline:
+        if len(in_flight) >= max_in_flight:
+            # A API não está dando conta: a chegada é descartada e contada, não enfileirada.
+            runner.dropped += 1
+        else:
+            task = asyncio.create_task(JOURNEYS[runner.rng.choices(names, weights)[0]](runner))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        await asyncio.sleep(runner.rng.expovariate(rate))
+    if in_flight:
+        await asyncio.gather(*in_flight)
+
+
+async def replay(runner, path, speed, max_in_flight):
+    """Reenvia um log gravado respeitando os instantes originais (divididos por `speed`)."""
+    entries = [json.loads(line) for line in Path(path).read_text(encoding="utf-8").splitlines() if line.strip()]
+    entries.sort(key=lambda e: e["t"])
+    semaphore = asyncio.Semaphore(max_in_flight)
+
+    async def send(entry, endpoint):
+        async with semaphore:
+            if endpoint == "POST /login" and entry.get("team") is not None:
+                await runner.login(entry["team"], form=entry.get("form"))
+                return
+            await runner.call(endpoint, entry["method"], entry["path"], team=entry.get("team"),
+                              json_body=entry.get("json"), form=entry.get("form"), expect=range(200, 500))
+
+    tasks = []
+    start = time.perf_counter()
+    for entry in entries:
+        delay = entry["t"] / speed - (time.perf_counter() - start)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        endpoint = entry.get("endpoint") or f"{entry['method']} {entry['path']}"
+        task = asyncio.create_task(send(entry, endpoint))
+        if endpoint == "POST /login" and entry.get("team") is not None:
+            # As próximas requisições do time esperam este login em vez de fazer outro.
+            runner._pending_logins[entry["team"]] = task
+        tasks.append(task)
+    await asyncio.gather(*tasks)
+
+
+# =============================================================================
+# --- Relatório ---
+# =============================================================================
+
+def report(runner, elapsed, show_histogram):
+    total = sum(len(s.latencies) for s in runner.stats.values())
+    errors = sum(s.errors for s in runner.stats.values())
+    header = f"{'endpoint':<30} {'reqs':>7} {'req/s':>8} {'erros':>7} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+    print("\n" + header)
+    print("-" * len(header))
+    for endpoint, stats in sorted(runner.stats.items()):
+        count = len(stats.latencies)
+        print(f"{endpoint:<30} {count:>7} {count / elapsed:>8.1f} {stats.errors / count:>7.1%} "
+              f"{stats.percentile(0.5):>8.1f} {stats.percentile(0.9):>8.1f} {stats.percentile(0.99):>8.1f} "
+              f"{max(stats.latencies):>8.1f}")
+        if stats.errors:
+            print(f"{'':<30} status: " + ", ".join(f"{k}={v}" for k, v in sorted(stats.statuses.items(), key=str)))
+        if show_histogram:
+            labels = [f"≤{b}" for b in HISTOGRAM_BOUNDS_MS] + [f">{HISTOGRAM_BOUNDS_MS[-1]}"]
+            print(f"{'':<30} " + " ".join(f"{label}:{n}" for label, n in zip(labels, stats.histogram()) if n))
+    print("-" * len(header))
+    print(f"Total: {total} requisições em {elapsed:.1f}s ({total / elapsed:.1f} req/s), "
+          f"erros: {errors} ({errors / max(total, 1):.1%})")
+    if runner.dropped:
+        print(f"Chegadas descartadas (limite de requisições em andamento): {runner.dropped}")
+
+
+# =============================================================================
+# --- Alvos ---
+# =============================================================================
+
+async def inprocess_target(teams, posts, scrims, seed):
+    """Sobe a API no próprio processo, sobre os substitutos em memória."""
+    from benchmarks.standins import StandIns  # configura o ambiente antes de importar o app
+
+    standins = StandIns()
+    await standins.seed(teams=teams, posts=posts, scrims=scrims, seed=seed)
+    transport = httpx.ASGITransport(app=standins.app)
+    client = httpx.AsyncClient(transport=transport, base_url="http://load", timeout=None)
+    return client, list(zip(standins.team_ids, standins.emails))
+
+
+def http_target(base_url, teams, seed, connections):
+    """Aponta para uma API real populada por `populate.py --scale` com a mesma semente."""
+    import populate
+
+    config = populate.ScaleConfig(
+        teams=teams, posts=0, scrims=0, seed=seed, hashed_password="",
+        reference_time=datetime.datetime.combine(populate.SCALE_REFERENCE_DATE, datetime.time(), tzinfo=datetime.UTC),
+    )
+    team_docs, _ = populate.generate_teams(config, 0, teams)
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    client = httpx.AsyncClient(base_url=base_url, timeout=30, limits=limits)
+    return client, [(str(doc["_id"]), doc["email"]) for doc in team_docs]
+
+
+async def main(args):
+    if args.base_url:
+        client, accounts = http_target(args.base_url, args.teams, args.seed, max(args.users, args.max_in_flight))
+    else:
+        client, accounts = await inprocess_target(args.teams, args.teams * 2, args.teams, args.seed)
+
+    recorder = Recorder(args.record) if args.record else None
+    runner = LoadRunner(client, accounts, args.seed, recorder)
+    start = time.perf_counter()
+    try:
+        if args.replay:
+            print(f"🔁 Reproduzindo {args.replay} (velocidade {args.speed}x)...")
+            await replay(runner, args.replay, args.speed, args.max_in_flight)
+        elif args.rate:
+            print(f"🌊 Carga aberta: {args.rate} jornadas/s por {args.duration}s...")
+            await open_loop(runner, parse_mix(args.mix), args.rate, args.duration, args.max_in_flight)
+        else:
+            print(f"🔄 Carga fechada: {args.users} usuários por {args.duration}s...")
+            await closed_loop(runner, parse_mix(args.mix), args.users, args.duration, args.think_time)
+    finally:
+        await client.aclose()
+        if recorder:
+            recorder.close()
+            print(f"📝 Log de requisições gravado em {args.record}")
+
+    report(runner, time.perf_counter() - start, args.histogram)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gerador de carga e reprodução de tráfego da API.")
+    parser.add_argument("--base-url", help="URL de uma API real; sem ela a API roda no próprio processo.")
+    parser.add_argument("--teams", type=int, default=100, help="Times semeados (devem bater com o populate).")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mix", default="feed=6,social=3,scrim=1", help="Pesos das jornadas.")
+    parser.add_argument("--users", type=int, default=10, help="Usuários virtuais (carga fechada).")
+    parser.add_argument("--rate", type=float, help="Jornadas por segundo (carga aberta).")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Pausa média entre jornadas, em segundos.")
+    parser.add_argument("--duration", type=float, default=30.0, help="Duração da carga, em segundos.")
+    parser.add_argument("--max-in-flight", type=int, default=200, help="Limite de jornadas/requisições simultâneas.")
+    parser.add_argument("--record", help="Grava as requisições enviadas neste arquivo JSONL.")
+    parser.add_argument("--replay", help="Reproduz um log JSONL gravado em vez de gerar jornadas.")
+    parser.add_argument("--speed", type=float, default=1.0, help="Multiplicador de velocidade do replay.")
+    parser.add_argument("--histogram", action="store_true", help="Mostra o histograma de latência por endpoint.")
+    asyncio.run(main(parser.parse_args()))
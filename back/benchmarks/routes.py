@@ -0,0 +1,274 @@
+# benchmarks/routes.py
+"""
+Benchmark das rotas de app/routes.py contra substitutos em memória (benchmarks/standins.py).
+
+Para cada tamanho de base (gerada pelo modo de escala do populate.py) e cada rota:
+- mede latência (p50/p95/p99) e memória alocada por requisição (tracemalloc);
+- conta os comandos enviados ao MongoDB e ao Redis em cada requisição;
+- mede os bytes de documentos lidos do MongoDB por requisição (comparados com a linha de base).
+
+E falha (código de saída 1) quando:
+- o número de comandos de uma rota cresce junto com o tamanho do resultado (padrão N+1);
+- o p95 de uma rota piora mais que --max-regression em relação à linha de base salva.
+
+Uso (a partir da pasta `back`):
+    python -m benchmarks.routes --sizes 20,50 --requests 10
+    python -m benchmarks.routes --update-baseline   # grava a linha de base atual
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import httpx
+
+from benchmarks.standins import StandIns
+
+DEFAULT_BASELINE = Path(__file__).with_name("routes_baseline.json")
+
+# Diferença de comandos tolerada entre requisições da mesma rota antes de suspeitar de N+1
+# (algumas rotas têm ramos legítimos, ex.: recomendações com fallback).
+N_PLUS_ONE_TOLERANCE = 2
+N_PLUS_ONE_CORRELATION = 0.8
+
+# Posts gerados por time em cada base. O feed devolve todos os posts, então isto pesa bastante.
+POSTS_PER_TEAM = 2
+
+
+class Scenario:
+    """Uma rota a ser medida: como montar a requisição e como medir o tamanho do resultado."""
+
+    def __init__(self, name, method, path, auth=False, body=None, result_size=None):
+        self.name = name
+        self.method = method
+        self.path = path  # função (standins, rng) -> caminho
+        self.auth = auth
+        self.body = body  # corpo fixo ou função (standins, rng) -> corpo
+        self.result_size = result_size or default_result_size
+
+
+def default_result_size(payload) -> int:
+    if isinstance(payload, list):
+        return len(payload)
+    if isinstance(payload, dict):
+        return sum(len(v) for v in payload.values() if isinstance(v, list)) or 1
+    return 0
+
+
+def random_team(standins, rng):
+    return rng.choice(standins.team_ids)
+
+
+def random_post(standins, rng):
+    return rng.choice(standins.post_ids)
+
+
+def random_like_batch(standins, rng):
+    """Metade dos posts sorteados é curtida e a outra metade descurtida (listas disjuntas)."""
+    post_ids = rng.sample(standins.post_ids, k=min(10, len(standins.post_ids)))
+    return {"like": post_ids[::2], "unlike": post_ids[1::2]}
+
+
+SCENARIOS = [
+    Scenario("GET /posts", "GET", lambda s, r: "/api/posts"),
+    Scenario("GET /posts/popular", "GET", lambda s, r: "/api/posts/popular"),
+    Scenario("GET /teams/search", "GET", lambda s, r: f"/api/teams/search?q={r.choice(['Wolves', 'Red', 'Iron Titans'])}"),
+    Scenario("GET /teams/{id}", "GET", lambda s, r: f"/api/teams/{random_team(s, r)}"),
+    Scenario("GET /teams/{id}/posts", "GET", lambda s, r: f"/api/teams/{random_team(s, r)}/posts"),
+    Scenario("GET /teams/{id}/friends", "GET", lambda s, r: f"/api/teams/{random_team(s, r)}/friends"),
+    Scenario("GET /teams/{id}/page", "GET", lambda s, r: f"/api/teams/{random_team(s, r)}/page",
+             result_size=lambda payload: len(payload["friends"]) + len(payload["posts"])),
+    Scenario("GET /teams/{id}/stats", "GET", lambda s, r: f"/api/teams/{random_team(s, r)}/stats"),
+    Scenario("GET /teams/{id}/views", "GET", lambda s, r: f"/api/teams/{random_team(s, r)}/views"),
+    Scenario("GET /teams/{id}/vs/{other}", "GET", lambda s, r: "/api/teams/{}/vs/{}".format(*r.sample(s.team_ids, k=2))),
+    Scenario("GET /teams/{id}/scrims/history", "GET", lambda s, r: f"/api/teams/{random_team(s, r)}/scrims/history",
+             result_size=lambda payload: len(payload["opponents"])),
+    Scenario("POST /teams/batch", "POST", lambda s, r: "/api/teams/batch",
+             body=lambda s, r: {"ids": r.sample(s.team_ids, k=min(10, len(s.team_ids)))}),
+    Scenario("GET /teams/me/profile", "GET", lambda s, r: "/api/teams/me/profile", auth=True),
+    Scenario("GET /teams/recommendations", "GET", lambda s, r: "/api/teams/recommendations", auth=True),
+    Scenario("GET /friends", "GET", lambda s, r: "/api/friends", auth=True),
+    Scenario("GET /friends/requests", "GET", lambda s, r: "/api/friends/requests", auth=True),
+    Scenario("GET /notifications", "GET", lambda s, r: "/api/notifications", auth=True),
+    Scenario("GET /scrims/me", "GET", lambda s, r: "/api/scrims/me", auth=True),
+    Scenario("GET /activity-stream", "GET", lambda s, r: "/api/activity-stream"),
+    Scenario("GET /feed", "GET", lambda s, r: "/api/feed", auth=True),
+    # Palavras que aparecem no texto gerado pelo populate.py.
+    Scenario("GET /posts/search", "GET", lambda s, r: f"/api/posts/search?q={r.choice(['iure', 'amet', 'content', 'solutions'])}",
+             result_size=lambda payload: len(payload["posts"])),
+    Scenario("GET /posts/{id}/views", "GET", lambda s, r: f"/api/posts/{random_post(s, r)}/views"),
+    Scenario("GET /posts/{id}/likes", "GET", lambda s, r: f"/api/posts/{random_post(s, r)}/likes",
+             result_size=lambda payload: len(payload["teams"])),
+    # O populate.py não gera hashtags: as rotas de hashtag vêm depois do POST /posts, que as cria.
+    Scenario("POST /posts", "POST", lambda s, r: "/api/posts", auth=True,
+             body={"content": "Procurando scrim hoje à noite! #scrim #treino"}),
+    Scenario("GET /trending/hashtags", "GET", lambda s, r: f"/api/trending/hashtags?window={r.choice(['hour', 'day'])}"),
+    Scenario("GET /hashtags/{tag}/posts", "GET", lambda s, r: f"/api/hashtags/{r.choice(['scrim', 'treino'])}/posts"),
+    Scenario("POST /posts/{id}/like", "POST", lambda s, r: f"/api/posts/{random_post(s, r)}/like", auth=True),
+    Scenario("POST /posts/{id}/comments", "POST", lambda s, r: f"/api/posts/{random_post(s, r)}/comments",
+             auth=True, body={"content": "Bom jogo!"}),
+    Scenario("POST /posts/likes/batch", "POST", lambda s, r: "/api/posts/likes/batch", auth=True,
+             body=random_like_batch),
+]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def correlation(xs, ys):
+    if len(set(xs)) < 2 or len(set(ys)) < 2:
+        return 0.0
+    return statistics.correlation(xs, ys)
+
+
+async def send(client, standins, scenario, rng):
+    headers = {}
+    if scenario.auth:
+        headers["Authorization"] = f"Bearer {rng.choice(standins.tokens)}"
+    body = scenario.body(standins, rng) if callable(scenario.body) else scenario.body
+    return await client.request(scenario.method, scenario.path(standins, rng), headers=headers, json=body)
+
+
+async def run_scenario(client, standins, scenario, num_requests, rng):
+    """Executa a rota várias vezes; devolve latências, comandos, tamanhos de resultado e alocações."""
+    samples = []
+    for _ in range(num_requests):
+        standins.counter.reset()
+        start = time.perf_counter()
+        response = await send(client, standins, scenario, rng)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if response.status_code >= 400:
+            raise RuntimeError(f"{scenario.name} respondeu {response.status_code}: {response.text[:200]}")
+        payload = response.json() if response.content else None
+        samples.append({
+            "ms": elapsed_ms,
+            "mongo": standins.counter.mongo,
+            "mongo_bytes": standins.counter.mongo_bytes,
+            "redis": standins.counter.redis,
+            "result_size": scenario.result_size(payload),
+        })
+
+    # Passada separada com tracemalloc, que distorceria as latências acima.
+    tracemalloc.start()
+    allocations = []
+    for _ in range(min(5, num_requests)):
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        await send(client, standins, scenario, rng)
+        _, peak = tracemalloc.get_traced_memory()
+        allocations.append(peak - before)
+    tracemalloc.stop()
+
+    return samples, statistics.median(allocations)
+
+
+def check_n_plus_one(name, samples):
+    """Acusa N+1 quando os comandos por requisição crescem junto com o tamanho do resultado."""
+    sizes = [s["result_size"] for s in samples]
+    commands = [s["mongo"] + s["redis"] for s in samples]
+    spread = max(commands) - min(commands)
+    corr = correlation(sizes, commands)
+    if spread > N_PLUS_ONE_TOLERANCE and corr >= N_PLUS_ONE_CORRELATION:
+        return (f"{name}: comandos por requisição variam de {min(commands)} a {max(commands)} "
+                f"e acompanham o tamanho do resultado (correlação {corr:.2f}) — provável N+1")
+    return None
+
+
+def print_bytes_read_diff(results, baseline):
+    """Bytes lidos do MongoDB por requisição: linha de base (antes) x execução atual (depois)."""
+    rows = [(key, baseline[key].get("mongo_bytes_read"), current["mongo_bytes_read"])
+            for key, current in results.items() if key in baseline]
+    rows = [(key, before, after) for key, before, after in rows if before is not None]
+    if not rows:
+        return
+    print(f"\n{'bytes lidos do MongoDB por requisição':<40} {'antes':>10} {'depois':>10} {'diferença':>10}")
+    for key, before, after in rows:
+        change = f"{(after - before) / before:+.0%}" if before else "-"
+        print(f"{key:<40} {before:>10.0f} {after:>10.0f} {change:>10}")
+
+
+async def run(sizes, num_requests, seed, baseline_path, update_baseline, max_regression, only):
+    standins = StandIns()
+    rng = random.Random(seed)
+    scenarios = [s for s in SCENARIOS if not only or any(o in s.name for o in only)]
+    results = {}
+    samples_by_route = {}
+
+    header = (f"{'rota':<30} {'times':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+              f"{'mongo':>6} {'lido KiB':>9} {'redis':>6} {'KiB':>8}")
+    print(header)
+    print("-" * len(header))
+    for size in sizes:
+        await standins.seed(teams=size, posts=size * POSTS_PER_TEAM, scrims=size, seed=seed)
+        transport = httpx.ASGITransport(app=standins.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            for scenario in scenarios:
+                await send(client, standins, scenario, rng)  # aquecimento (caches, grafo em memória)
+                samples, allocated = await run_scenario(client, standins, scenario, num_requests, rng)
+                samples_by_route.setdefault(scenario.name, []).extend(samples)
+
+                latencies = [s["ms"] for s in samples]
+                key = f"{scenario.name}@{size}"
+                results[key] = {
+                    "p50_ms": percentile(latencies, 0.50),
+                    "p95_ms": percentile(latencies, 0.95),
+                    "p99_ms": percentile(latencies, 0.99),
+                    "mongo_commands": max(s["mongo"] for s in samples),
+                    "mongo_bytes_read": statistics.median(s["mongo_bytes"] for s in samples),
+                    "redis_commands": max(s["redis"] for s in samples),
+                    "allocated_bytes": allocated,
+                }
+                r = results[key]
+                print(f"{scenario.name:<30} {size:>6} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} "
+                      f"{r['mongo_commands']:>6} {r['mongo_bytes_read'] / 1024:>9.1f} "
+                      f"{r['redis_commands']:>6} {allocated / 1024:>8.1f}")
+
+    failures = [f for f in (check_n_plus_one(n, s) for n, s in samples_by_route.items()) if f]
+
+    if update_baseline:
+        baseline_path.write_text(json.dumps(results, indent=2, sort_keys=True))
+        print(f"\nLinha de base gravada em {baseline_path}")
+    elif baseline_path.exists():
+        baseline = json.loads(baseline_path.read_text())
+        print_bytes_read_diff(results, baseline)
+        for key, current in results.items():
+            previous = baseline.get(key)
+            if previous and current["p95_ms"] > previous["p95_ms"] * (1 + max_regression):
+                failures.append(f"{key}: p95 {current['p95_ms']:.2f} ms vs linha de base "
+                                f"{previous['p95_ms']:.2f} ms (limite +{max_regression:.0%})")
+    else:
+        print(f"\n(sem linha de base em {baseline_path}; use --update-baseline para criá-la)")
+
+    if failures:
+        print("\n❌ Falhas:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("\n✅ Nenhuma regressão encontrada.")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark das rotas da API com substitutos em memória.")
+    parser.add_argument("--sizes", default="20,50", help="Quantidades de times separadas por vírgula.")
+    parser.add_argument("--requests", type=int, default=10, help="Requisições medidas por rota e tamanho.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--max-regression", type=float, default=0.25,
+                        help="Piora máxima aceita no p95 em relação à linha de base (0.25 = 25%%).")
+    parser.add_argument("--only", action="append", help="Mede só as rotas cujo nome contém este texto.")
+    args = parser.parse_args()
+
+    exit_code = asyncio.run(run(
+        [int(s) for s in args.sizes.split(",")], args.requests, args.seed,
+        args.baseline, args.update_baseline, args.max_regression, args.only
+    ))
+    sys.exit(exit_code)
@@ -0,0 +1,137 @@
+# benchmarks/similarity.py
+"""
+Benchmark da recomendação por similaridade (app/gds.py).
+
+Cria grafos sintéticos de tamanhos diferentes no Neo4j, todos com o mesmo grau médio,
+e mede o custo (db hits e latência) da consulta SIMILAR_TEAMS_QUERY para uma amostra de times.
+Se a consulta estiver restrita à vizinhança do time, o custo por requisição deve
+acompanhar o grau local e ficar praticamente constante quando o grafo cresce.
+
+Uso (a partir da pasta `back`):
+    python -m benchmarks.similarity --sizes 1000,10000,100000 --degree 10
+
+Os nós de teste recebem o rótulo extra :BenchTeam e são removidos ao final.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from neo4j import AsyncGraphDatabase
+
+from app.config import settings
+from app.gds import SIMILAR_TEAMS_QUERY, TEAM_ID_CONSTRAINT
+
+BATCH_SIZE = 10_000
+GAMES = ["League of Legends", "Valorant", "Counter-Strike"]
+
+
+def build_graph(num_teams: int, degree: int, rng: random.Random):
+    """Gera nós e arestas (mútuas) de um grafo aleatório com grau médio `degree`."""
+    teams = [
+        {"id": f"bench-{i}", "name": f"Bench Team {i}", "game": rng.choice(GAMES)}
+        for i in range(num_teams)
+    ]
+    edges = set()
+    for i in range(num_teams):
+        # Cada time escolhe degree/2 amigos; como a amizade é mútua, o grau médio fica ~degree.
+        for j in rng.sample(range(num_teams), k=min(degree // 2, num_teams - 1)):
+            if i != j:
+                edges.add((min(i, j), max(i, j)))
+    relations = []
+    for a, b in edges:
+        relations.append({"a": f"bench-{a}", "b": f"bench-{b}"})
+        relations.append({"a": f"bench-{b}", "b": f"bench-{a}"})
+    return teams, relations
+
+
+def total_db_hits(plan: dict) -> int:
+    """Soma os db hits de um plano de execução (PROFILE) e de todos os seus filhos."""
+    return plan.get("dbHits", 0) + sum(total_db_hits(child) for child in plan.get("children", []))
+
+
+async def load_graph(session, teams, relations):
+    for i in range(0, len(teams), BATCH_SIZE):
+        await session.run(
+            "UNWIND $teams AS team MERGE (t:Team:BenchTeam {id: team.id}) SET t.name = team.name, t.game = team.game",
+            teams=teams[i:i + BATCH_SIZE]
+        )
+    for i in range(0, len(relations), BATCH_SIZE):
+        await session.run(
+            "UNWIND $relations AS rel MATCH (t1:Team {id: rel.a}), (t2:Team {id: rel.b}) MERGE (t1)-[:AMIGO_DE]->(t2)",
+            relations=relations[i:i + BATCH_SIZE]
+        )
+
+
+async def clear_graph(session):
+    await session.run(
+        "MATCH (t:BenchTeam) CALL { WITH t DETACH DELETE t } IN TRANSACTIONS OF 10000 ROWS"
+    )
+
+
+async def measure(session, team_ids):
+    """Executa a consulta com PROFILE para cada time da amostra e devolve (grau, db hits, ms)."""
+    rows = []
+    for team_id in team_ids:
+        degree_result = await session.run(
+            "MATCH (t:Team {id: $id}) RETURN COUNT { (t)-[:AMIGO_DE]->() } AS degree", id=team_id
+        )
+        degree = (await degree_result.single())["degree"]
+
+        start = time.perf_counter()
+        result = await session.run("PROFILE " + SIMILAR_TEAMS_QUERY, team_id=team_id, limit=5)
+        summary = await result.consume()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        rows.append((degree, total_db_hits(summary.profile), elapsed_ms))
+    return rows
+
+
+async def run(sizes, degree, samples, seed):
+    driver = AsyncGraphDatabase.driver(
+        settings.NEO4J_URI,
+        auth=(settings.NEO4J_USERNAME, settings.NEO4J_PASSWORD)
+    )
+    rng = random.Random(seed)
+
+    print(f"{'times':>10} | {'grau médio':>10} | {'db hits (média)':>15} | {'db hits/grau':>12} | {'p50 ms':>8} | {'p95 ms':>8}")
+    print("-" * 80)
+    try:
+        async with driver.session() as session:
+            await session.run(TEAM_ID_CONSTRAINT)
+            for size in sizes:
+                await clear_graph(session)
+                teams, relations = build_graph(size, degree, rng)
+                await load_graph(session, teams, relations)
+
+                sample = [t["id"] for t in rng.sample(teams, k=min(samples, size))]
+                # Aquece o cache de páginas do Neo4j antes de medir.
+                await measure(session, sample[:3])
+                rows = await measure(session, sample)
+
+                degrees = [r[0] for r in rows]
+                hits = [r[1] for r in rows]
+                latencies = sorted(r[2] for r in rows)
+                hits_per_degree = statistics.mean(h / max(d, 1) ** 2 for d, h, _ in rows)
+                p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+                print(
+                    f"{size:>10} | {statistics.mean(degrees):>10.1f} | {statistics.mean(hits):>15.0f} | "
+                    f"{hits_per_degree:>12.1f} | {statistics.median(latencies):>8.2f} | {p95:>8.2f}"
+                )
+            await clear_graph(session)
+    finally:
+        await driver.close()
+
+    print("\n'db hits/grau' é normalizado por grau² (tamanho da vizinhança de 2 saltos);")
+    print("ele deve ficar estável entre as linhas, independentemente do número de times.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark da consulta de similaridade entre times.")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Tamanhos de grafo separados por vírgula.")
+    parser.add_argument("--degree", type=int, default=10, help="Grau médio (amigos por time).")
+    parser.add_argument("--samples", type=int, default=50, help="Times consultados por tamanho de grafo.")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    asyncio.run(run([int(s) for s in args.sizes.split(",")], args.degree, args.samples, args.seed))
@@ -0,0 +1,327 @@
+# benchmarks/standins.py
+"""
+Substitutos locais (em memória) dos serviços externos, para rodar a API sem MongoDB,
+Redis ou Neo4j de verdade:
+
+- MongoDB: mongomock-motor
+- Redis: fakeredis
+- Grafo: o motor embutido de app/graph_engine.py no lugar do Neo4j GDS
+
+Também conta quantos comandos cada requisição envia ao MongoDB e ao Redis, e quantos
+bytes (em BSON) de documentos o MongoDB devolve.
+
+Dependências extras (só para benchmarks):
+    pip install mongomock-motor fakeredis httpx
+"""
+import contextvars
+import datetime
+import functools
+import os
+
+# As configurações são obrigatórias no app; aqui nenhum serviço real é usado.
+for _name, _value in {
+    "MONGODB_URI": "mongodb://localhost:27017",
+    "DATABASE_NAME": "esports_bench",
+    "SECRET_KEY": "benchmark-secret",
+    "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "60",
+    "REDIS_URL": "redis://localhost:6379/0",
+    "NEO4J_URI": "bolt://localhost:7687",
+    "NEO4J_USERNAME": "neo4j",
+    "NEO4J_PASSWORD": "benchmark",
+    "RECOMMENDATION_ENGINE": "embedded",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+import fakeredis
+import mongomock.aggregate
+import mongomock.collection
+import mongomock.command_cursor
+import mongomock.filtering
+import mongomock.helpers
+import redis.asyncio.client
+from beanie import init_beanie
+import bson
+from bson import DBRef
+from mongomock_motor import AsyncMongoMockClient
+
+import populate
+from app import feed, graph_engine, routes
+from app import search as post_search
+from app import team_stats, scrim_history
+from app.cache import response_cache
+from app.models import Team, Player, Post, ArchivedPost, Scrim, TeamStats, ScrimPairSummary
+from app.security import create_access_token
+from app.resources import resources
+from main import app
+
+# Operações do mongomock que correspondem a um comando enviado ao servidor.
+MONGO_OPERATIONS = [
+    "find", "find_one", "insert_one", "insert_many", "update_one", "update_many",
+    "replace_one", "delete_one", "delete_many", "aggregate", "count_documents",
+    "estimated_document_count", "distinct", "bulk_write",
+    "find_one_and_update", "find_one_and_replace", "find_one_and_delete",
+]
+
+
+class CommandCounter:
+    """
+    Conta comandos enviados ao MongoDB e ao Redis (chamadas internas não contam duas vezes)
+    e os bytes dos documentos lidos do MongoDB, no tamanho que teriam em BSON na rede.
+    """
+
+    def __init__(self):
+        self.mongo = 0
+        self.mongo_bytes = 0
+        self.redis = 0
+        self._depth = 0
+
+    def reset(self):
+        self.mongo = 0
+        self.mongo_bytes = 0
+        self.redis = 0
+
+    def install(self):
+        for name in MONGO_OPERATIONS:
+            original = getattr(mongomock.collection.Collection, name, None)
+            if original is not None:
+                setattr(mongomock.collection.Collection, name, self._wrap_mongo(original))
+        # Documentos de find e aggregate chegam pelos cursores.
+        for cursor_class in (mongomock.collection.Cursor, mongomock.command_cursor.CommandCursor):
+            wrapped = self._wrap_cursor(cursor_class.__next__)
+            cursor_class.__next__ = wrapped
+            cursor_class.next = wrapped
+
+        original_execute_command = redis.asyncio.client.Redis.execute_command
+        original_pipeline_execute = redis.asyncio.client.Pipeline.execute
+
+        @functools.wraps(original_execute_command)
+        async def execute_command(client, *args, **kwargs):
+            self.redis += 1
+            return await original_execute_command(client, *args, **kwargs)
+
+        @functools.wraps(original_pipeline_execute)
+        async def pipeline_execute(pipeline, *args, **kwargs):
+            # Um pipeline é uma única ida e volta ao servidor.
+            self.redis += 1
+            return await original_pipeline_execute(pipeline, *args, **kwargs)
+
+        redis.asyncio.client.Redis.execute_command = execute_command
+        redis.asyncio.client.Pipeline.execute = pipeline_execute
+
+    def _wrap_mongo(self, original):
+        @functools.wraps(original)
+        def wrapper(collection, *args, **kwargs):
+            if self._depth == 0:
+                self.mongo += 1
+            self._depth += 1
+            try:
+                result = original(collection, *args, **kwargs)
+            finally:
+                self._depth -= 1
+            if self._depth == 0 and isinstance(result, dict):
+                # find_one, find_one_and_update, ...: o documento volta direto.
+                self.mongo_bytes += len(bson.encode(result))
+            return result
+        return wrapper
+
+    def _wrap_cursor(self, original):
+        @functools.wraps(original)
+        def wrapper(cursor):
+            document = original(cursor)
+            if self._depth == 0:
+                self.mongo_bytes += len(bson.encode(document))
+            return document
+        return wrapper
+
+
+# Índices das coleções estrangeiras, válidos só durante um aggregate.
+_lookup_indexes = contextvars.ContextVar("lookup_indexes", default=None)
+
+
+def _as_document(value):
+    """No MongoDB real um DBRef é um subdocumento {"$ref", "$id"}; no mongomock é um objeto."""
+    return value.as_doc() if isinstance(value, DBRef) else value
+
+
+def _values_by_path(doc, path):
+    """Valores de um caminho com pontos, percorrendo arrays e DBRefs como o MongoDB faz."""
+    values = [doc]
+    for part in path.split("."):
+        found = []
+        for value in values:
+            value = _as_document(value)
+            if isinstance(value, dict) and part in value:
+                child = value[part]
+                found.extend(child if isinstance(child, list) else [child])
+        values = found
+    return values
+
+
+def _install_mongomock_dbref_support():
+    """
+    Ajusta o mongomock ao que o Beanie espera do MongoDB:
+    - filtros como {"author.$id": ...} ou {"likes.$id": ...} (DBRefs dentro de arrays) e
+      expressões como "$$like.$id" precisam enxergar dentro dos DBRefs;
+    - o fetch_links usa `$lookup` com localField/foreignField E `pipeline` juntos
+      (MongoDB 5+), forma que o mongomock não implementa;
+    - o UpdateOne e o ReplaceOne do PyMongo 4.11+ passam `sort` ao bulk_write, argumento que o
+      mongomock não conhece;
+    - a conferência dos contadores dos times usa `$unionWith` (MongoDB 4.4+), que o mongomock
+      não implementa.
+    """
+    if getattr(mongomock.aggregate._PIPELINE_HANDLERS["$lookup"], "_beanie_compatible", False):
+        return
+
+    original_iter_key_candidates = mongomock.filtering.iter_key_candidates
+
+    def iter_key_candidates(key, doc):
+        return original_iter_key_candidates(key, _as_document(doc))
+
+    mongomock.filtering.iter_key_candidates = iter_key_candidates
+
+    original_iter_key_candidates_sublist = mongomock.filtering._iter_key_candidates_sublist
+
+    def iter_key_candidates_sublist(key, doc):
+        return original_iter_key_candidates_sublist(key, [_as_document(item) for item in doc])
+
+    mongomock.filtering._iter_key_candidates_sublist = iter_key_candidates_sublist
+
+    original_get_value_by_dot = mongomock.helpers.get_value_by_dot
+
+    def get_value_by_dot(doc, key, can_generate_array=False):
+        # Resolve o caminho parte a parte, abrindo os DBRefs que aparecerem no meio.
+        parts = key.split(".")
+        for index, part in enumerate(parts):
+            doc = _as_document(doc)
+            if isinstance(doc, list):
+                return original_get_value_by_dot(doc, ".".join(parts[index:]), can_generate_array)
+            doc = original_get_value_by_dot(doc, part, can_generate_array)
+        return doc
+
+    mongomock.helpers.get_value_by_dot = get_value_by_dot
+
+    original_lookup = mongomock.aggregate._handle_lookup_stage
+    original_aggregate = mongomock.collection.Collection.aggregate
+
+    def aggregate(collection, *args, **kwargs):
+        # Durante um aggregate, cada coleção estrangeira é lida e indexada uma única vez
+        # (o fetch_links aninha dezenas de $lookup, e o mongomock varreria tudo a cada um).
+        token = _lookup_indexes.set({})
+        try:
+            return original_aggregate(collection, *args, **kwargs)
+        finally:
+            _lookup_indexes.reset(token)
+
+    def foreign_index(database, collection_name, field):
+        indexes = _lookup_indexes.get()
+        if indexes is None:
+            indexes = {}
+        key = (collection_name, field)
+        if key not in indexes:
+            index = {}
+            for foreign_doc in database.get_collection(collection_name).find({}):
+                for value in _values_by_path(foreign_doc, field):
+                    index.setdefault(value, []).append(foreign_doc)
+            indexes[key] = index
+        return indexes[key]
+
+    def handle_lookup_stage(in_collection, database, options):
+        if "localField" not in options:
+            return original_lookup(in_collection, database, options)
+        index = foreign_index(database, options["from"], options["foreignField"])
+        out = []
+        for doc in in_collection:
+            matches, seen = [], set()
+            for value in _values_by_path(doc, options["localField"]):
+                for match in index.get(value, []):
+                    if id(match) not in seen:
+                        seen.add(id(match))
+                        matches.append(match)
+            if "pipeline" in options:
+                matches = list(mongomock.aggregate.process_pipeline(matches, database, options["pipeline"], None))
+            out.append(dict(doc, **{options["as"]: matches}))
+        return out
+
+    def handle_union_with_stage(in_collection, database, options):
+        if isinstance(options, str):
+            options = {"coll": options}
+        docs = list(database.get_collection(options["coll"]).find({}))
+        if "pipeline" in options:
+            docs = list(mongomock.aggregate.process_pipeline(docs, database, options["pipeline"], None))
+        return list(in_collection) + docs
+
+    mongomock.collection.Collection.aggregate = aggregate
+    handle_lookup_stage._beanie_compatible = True
+    mongomock.aggregate._PIPELINE_HANDLERS["$lookup"] = handle_lookup_stage
+    mongomock.aggregate._PIPELINE_HANDLERS["$unionWith"] = handle_union_with_stage
+
+    original_add_update = mongomock.collection.BulkOperationBuilder.add_update
+    original_add_replace = mongomock.collection.BulkOperationBuilder.add_replace
+
+    def add_update(builder, *args, sort=None, **kwargs):
+        return original_add_update(builder, *args, **kwargs)
+
+    def add_replace(builder, *args, sort=None, **kwargs):
+        return original_add_replace(builder, *args, **kwargs)
+
+    mongomock.collection.BulkOperationBuilder.add_update = add_update
+    mongomock.collection.BulkOperationBuilder.add_replace = add_replace
+
+
+class StandIns:
+    """Aplicação FastAPI ligada aos substitutos em memória e populada pelo gerador do populate.py."""
+
+    def __init__(self):
+        _install_mongomock_dbref_support()
+        self.counter = CommandCounter()
+        self.counter.install()
+        self.redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+        self.app = app
+        self.team_ids = []
+        self.emails = []
+        self.post_ids = []
+        self.tokens = []
+
+        # O cache, a fila de tarefas, o grafo e as rotas pegam o Redis em `resources.redis`.
+        resources.redis = self.redis
+        routes.recommender = graph_engine
+        feed.affinity_engine = graph_engine
+
+    async def seed(self, teams: int, posts: int, scrims: int, seed: int = 42):
+        """Recria a base em memória com o gerador determinístico do modo de escala."""
+        client = AsyncMongoMockClient()
+        database = client[os.environ["DATABASE_NAME"]]
+        await init_beanie(database=database, document_models=[Team, Player, Post, ArchivedPost, Scrim, TeamStats, ScrimPairSummary])
+        await self.redis.flushall()
+        response_cache._l1.clear()
+
+        config = populate.ScaleConfig(
+            teams=teams,
+            posts=posts,
+            scrims=scrims,
+            seed=seed,
+            hashed_password=populate.hash_password(populate.FAKE_PASSWORD),
+            reference_time=datetime.datetime(2026, 1, 1, tzinfo=datetime.UTC),
+        )
+        team_docs, player_docs = populate.generate_teams(config, 0, teams)
+        post_docs = populate.generate_posts(config, 0, posts)
+        scrim_docs = populate.generate_scrims(config, 0, scrims)
+        for model, docs in ((Team, team_docs), (Player, player_docs), (Post, post_docs), (Scrim, scrim_docs)):
+            if docs:
+                await database[model.Settings.name].insert_many(docs)
+
+        # O grafo em memória é recarregado a partir da nova base.
+        graph_engine.friendship_graph.__init__()
+        # O índice da busca de posts também.
+        await post_search.rebuild(self.redis)
+        # E os contadores dos times e os confrontos diretos.
+        await team_stats.reconcile()
+        await scrim_history.backfill()
+
+        self.team_ids = [str(doc["_id"]) for doc in team_docs]
+        self.emails = [doc["email"] for doc in team_docs]
+        self.post_ids = [str(doc["_id"]) for doc in post_docs]
+        self.tokens = [create_access_token({"sub": team_id}) for team_id in self.team_ids]
+        self.counter.reset()
+        return database
@@ -1,9 +1,21 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
 from app.db import init_db
 from app.routes import router as api_router
 from fastapi.middleware.cors import CORSMiddleware 
-from app.cache import redis_pool
+import asyncio
+from app.cache import response_cache
+from app.resources import resources
+from app import search as post_search
+from app import archive
+from app import team_stats
+from app.config import settings
+from app.task_queue import task_queue
+from app.metrics import MetricsMiddleware, registry
+from app.security import require_admin
+from app.slow_queries import slow_query_log
+from app.tracing import TracingMiddleware, exporter as trace_exporter
 
 # Lista de origens que podem fazer requisições à nossa API
 origins = [
@@ -13,9 +25,32 @@ origins = [
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # Abre (e aquece) as conexões com MongoDB, Redis e Neo4j, compartilhadas por todas as rotas
+    await resources.start()
     await init_db()
+    # Ouve as invalidações de cache publicadas pelos outros workers
+    await response_cache.start()
+    # Sobe os workers da fila de tarefas em segundo plano
+    await task_queue.start()
+    # Monta o índice da busca de posts se ele não existir, na subida e depois de tempos em tempos
+    # (em segundo plano: com muitos posts, a reconstrução não deve atrasar a subida da aplicação)
+    search_index_task = asyncio.create_task(post_search.run_periodically(resources.redis))
+    # Move os posts antigos para o arquivo de tempos em tempos (se configurado)
+    archive_task = None
+    if settings.POST_ARCHIVE_AFTER_DAYS > 0:
+        archive_task = asyncio.create_task(archive.run_periodically(resources.redis))
+    # Confere os contadores dos times com a base de tempos em tempos
+    team_stats_task = asyncio.create_task(team_stats.run_periodically(resources.redis))
     yield
-    await redis_pool.close()
+    search_index_task.cancel()
+    team_stats_task.cancel()
+    if archive_task is not None:
+        archive_task.cancel()
+    # Termina as tarefas já enfileiradas antes de fechar as conexões
+    await task_queue.drain(settings.TASK_QUEUE_DRAIN_TIMEOUT_SECONDS)
+    await response_cache.stop()
+    await resources.close()
+    trace_exporter.close()
     print("Aplicação encerrada.")
 
 app = FastAPI(lifespan=lifespan)
@@ -29,8 +64,35 @@ app.add_middleware(
     allow_headers=["*"], # Permite todos os cabeçalhos
 )
 
+# Mede cada requisição (latência por rota e chamadas a banco) para o GET /metrics
+app.add_middleware(MetricsMiddleware)
+# Rastreia as requisições amostradas (TRACE_SAMPLE_RATE) e grava os traces em TRACE_EXPORT_PATH
+app.add_middleware(TracingMiddleware)
+
 app.include_router(api_router, prefix="/api")
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def get_metrics():
+    """Métricas no formato texto do Prometheus."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/health", tags=["Admin"])
+async def get_health():
+    """Estado de cada banco (ping e latência) e o uso dos pools de conexões; 503 se algum estiver fora do ar."""
+    health = await resources.health()
+    return JSONResponse(health, status_code=200 if health["status"] == "ok" else 503)
+
+@app.get("/admin/slow-queries", tags=["Admin"], dependencies=[Depends(require_admin)])
+def get_slow_queries(limit: int = 50):
+    """
+    Consultas lentas do MongoDB agrupadas por formato, das que mais consumiram tempo às que menos.
+    Expõe coleções e planos de execução: só com o cabeçalho X-Admin-Token (ver ADMIN_TOKEN).
+    """
+    return {
+        "threshold_ms": slow_query_log.threshold_ms,
+        "queries": slow_query_log.report(limit),
+    }
+
 @app.get("/")
 def read_root():
     return {"message": "Bem-vindo à API de eSports!"}
\ No newline at end of file
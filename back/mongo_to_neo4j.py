@@ -1,94 +1,418 @@
+import argparse
 import asyncio
+import json
+import time
 from neo4j import AsyncGraphDatabase
+from pymongo.errors import PyMongoError
 from app.db import init_db
 from app.config import settings
-from app.models import Team, Player, Post, Scrim
+from app.models import Team, Player
+from app.gds import TEAM_ID_CONSTRAINT
 
 # Cypher é a linguagem de consulta do Neo4j
 # UNWIND é como um "for each" para uma lista de dados que enviamos
 # MERGE é como "crie se não existir, encontre se já existir" (evita duplicatas)
-# CREATE cria um relacionamento entre dois nós que já existem
 
-async def migrate():
+# --- Configurações da carga completa ---
+# Quantas linhas vão em cada transação (cada parâmetro do UNWIND).
+DEFAULT_CHUNK_SIZE = 5000
+# Quantas sessões do Neo4j escrevem em paralelo.
+DEFAULT_CONCURRENCY = 4
+# Quantas vezes um lote é reenviado quando a escrita falha.
+MAX_CHUNK_ATTEMPTS = 5
+
+# Restrição de unicidade em :Player(id) (a de :Team(id) fica em app/gds.py).
+PLAYER_ID_CONSTRAINT = "CREATE CONSTRAINT player_id IF NOT EXISTS FOR (p:Player) REQUIRE p.id IS UNIQUE"
+
+# Apaga o grafo em várias transações pequenas, em vez de uma gigante.
+CLEAR_GRAPH_QUERY = "MATCH (n) CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 10000 ROWS"
+
+WRITE_TEAMS_QUERY = "UNWIND $rows AS team MERGE (t:Team {id: team.id}) SET t.name = team.name, t.game = team.game"
+WRITE_PLAYERS_QUERY = "UNWIND $rows AS player MERGE (p:Player {id: player.id}) SET p.nickname = player.nickname"
+WRITE_PLAYER_TEAM_QUERY = (
+    "UNWIND $rows AS rel MATCH (p:Player {id: rel.player_id}), (t:Team {id: rel.team_id}) "
+    "MERGE (p)-[:PERTENCE_A]->(t)"
+)
+WRITE_FRIENDS_QUERY = (
+    "UNWIND $rows AS rel MATCH (t1:Team {id: rel.team1_id}), (t2:Team {id: rel.team2_id}) "
+    "MERGE (t1)-[:AMIGO_DE]->(t2)"
+)
+
+
+async def stream_chunks(cursor, to_rows, chunk_size: int):
+    """
+    Lê um cursor do MongoDB aos poucos e entrega listas de até `chunk_size` linhas.
+    `to_rows` converte um documento em zero ou mais linhas para o Cypher.
+    """
+    chunk = []
+    async for doc in cursor:
+        chunk.extend(to_rows(doc))
+        while len(chunk) >= chunk_size:
+            yield chunk[:chunk_size]
+            chunk = chunk[chunk_size:]
+    if chunk:
+        yield chunk
+
+
+async def _write_rows(tx, query: str, rows: list):
+    result = await tx.run(query, rows=rows)
+    await result.consume()
+
+
+async def load_phase(neo4j_driver, name: str, query: str, chunks, concurrency: int) -> int:
+    """
+    Escreve os lotes de uma fase usando `concurrency` sessões em paralelo.
+
+    A fila é limitada, então a leitura do MongoDB nunca fica muito à frente da escrita:
+    a memória usada depende do tamanho do lote, não do tamanho da base.
+    `execute_write` já repete erros transitórios (ex.: deadlock entre transações
+    concorrentes); além disso, cada lote ainda tem até MAX_CHUNK_ATTEMPTS tentativas.
+    """
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    written = 0
+    start = time.perf_counter()
+
+    async def worker():
+        nonlocal written
+        async with neo4j_driver.session() as session:
+            while True:
+                rows = await queue.get()
+                try:
+                    if rows is None:
+                        return
+                    for attempt in range(1, MAX_CHUNK_ATTEMPTS + 1):
+                        try:
+                            await session.execute_write(_write_rows, query, rows)
+                            break
+                        except Exception as error:
+                            if attempt == MAX_CHUNK_ATTEMPTS:
+                                raise
+                            print(f"  ⚠️ {name}: falha no lote ({error}); tentativa {attempt + 1}...")
+                            await asyncio.sleep(0.5 * 2 ** attempt)
+                    written += len(rows)
+                finally:
+                    queue.task_done()
+
+    async def producer():
+        async for chunk in chunks:
+            await queue.put(chunk)
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    tasks = [asyncio.create_task(producer())]
+    tasks += [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        # Se um lote falhar de vez, interrompe a leitura e as outras sessões.
+        for task in tasks:
+            task.cancel()
+        raise
+
+    elapsed = time.perf_counter() - start
+    rate = written / elapsed if elapsed > 0 else 0
+    print(f"  {name}: {written} linhas em {elapsed:.1f}s ({rate:,.0f} linhas/s)")
+    return written
+
+
+def team_rows(doc):
+    yield {"id": str(doc["_id"]), "name": doc.get("team_name"), "game": doc.get("main_game")}
+
+
+def player_rows(doc):
+    yield {"id": str(doc["_id"]), "nickname": doc.get("nickname")}
+
+
+def player_team_rows(doc):
+    if doc.get("team"):
+        yield {"player_id": str(doc["_id"]), "team_id": str(doc["team"].id)}
+
+
+def friend_rows(doc):
+    # A amizade já está salva nos dois times, então cada lado gera a sua aresta.
+    for friend in doc.get("friends", []):
+        yield {"team1_id": str(doc["_id"]), "team2_id": str(friend.id)}
+
+
+async def migrate(chunk_size: int = DEFAULT_CHUNK_SIZE, concurrency: int = DEFAULT_CONCURRENCY):
     """
     Script para ler os dados do MongoDB e populacionar um banco de dados Neo4j,
     criando um grafo de relacionamentos.
+
+    Os dados são lidos por cursores (só com os campos necessários) e escritos em lotes
+    de tamanho fixo, por várias sessões em paralelo.
     """
     print("Iniciando migração de MongoDB para Neo4j...")
-    
+    total_start = time.perf_counter()
+
     # --- 1. Conectar aos Bancos ---
     # Conecta ao MongoDB (usando nossa função já existente)
     await init_db()
-    
+    teams_collection = Team.get_motor_collection()
+    players_collection = Player.get_motor_collection()
+    # Marca o ponto de partida do --watch ANTES de ler o MongoDB.
+    start_token = await capture_start_token(teams_collection.database)
+
     # Conecta ao Neo4j
     neo4j_driver = AsyncGraphDatabase.driver(
-        settings.NEO4J_URI, 
-        auth=(settings.NEO4J_USERNAME, settings.NEO4J_PASSWORD)
+        settings.NEO4J_URI,
+        auth=(settings.NEO4J_USERNAME, settings.NEO4J_PASSWORD),
+        max_connection_pool_size=max(concurrency * 2, 10)
     )
-    
-    async with neo4j_driver.session() as session:
-        # --- 2. Limpar o Neo4j para garantir uma migração limpa ---
-        print("--Limpando banco de dados Neo4j...")
-        await session.run("MATCH (n) DETACH DELETE n")
-        
-        # --- 3. Ler Dados do MongoDB ---
-        print("--Lendo dados do MongoDB...")
-        all_teams = await Team.find_all(fetch_links=True).to_list()
-        all_players = await Player.find_all(fetch_links=True).to_list()
-        
+
+    try:
+        async with neo4j_driver.session() as session:
+            # --- 2. Limpar o Neo4j para garantir uma migração limpa ---
+            print("--Limpando banco de dados Neo4j...")
+            await session.run(CLEAR_GRAPH_QUERY)
+            # --- 3. Restrições/índices ANTES da carga ---
+            # Sem eles, cada MATCH por id dos relacionamentos varreria todos os nós.
+            await session.run(TEAM_ID_CONSTRAINT)
+            await session.run(PLAYER_ID_CONSTRAINT)
+            await session.run("CALL db.awaitIndexes()")
+
         # --- 4. Escrever Nós no Neo4j ---
-        print("--Escrevendo Nós no Neo4j...")
-        
-        # Prepara e escreve os Times
-        teams_for_neo4j = [
-            {"id": str(t.id), "name": t.team_name, "game": t.main_game} 
-            for t in all_teams
-        ]
-        await session.run(
-            "UNWIND $teams AS team MERGE (t:Team {id: team.id}) SET t.name = team.name, t.game = team.game", 
-            teams=teams_for_neo4j
-        )
-        
-        # Prepara e escreve os Jogadores
-        players_for_neo4j = [
-            {"id": str(p.id), "nickname": p.nickname} 
-            for p in all_players
-        ]
-        await session.run(
-            "UNWIND $players AS player MERGE (p:Player {id: player.id}) SET p.nickname = player.nickname", 
-            players=players_for_neo4j
+        print(f"--Escrevendo Nós no Neo4j (lotes de {chunk_size}, {concurrency} sessões)...")
+        teams_cursor = teams_collection.find({}, {"team_name": 1, "main_game": 1}, batch_size=chunk_size)
+        players_cursor = players_collection.find({}, {"nickname": 1}, batch_size=chunk_size)
+        num_teams, num_players = await asyncio.gather(
+            load_phase(neo4j_driver, "Times", WRITE_TEAMS_QUERY,
+                       stream_chunks(teams_cursor, team_rows, chunk_size), concurrency),
+            load_phase(neo4j_driver, "Jogadores", WRITE_PLAYERS_QUERY,
+                       stream_chunks(players_cursor, player_rows, chunk_size), concurrency),
         )
-        
-        print(f"✅ {len(all_teams)} Times e {len(all_players)} Jogadores criados como Nós.")
-        
+        print(f"✅ {num_teams} Times e {num_players} Jogadores criados como Nós.")
+
         # --- 5. Escrever Relacionamentos no Neo4j ---
         print("--Criando relacionamentos...")
-        
+
         # Relacionamento: Jogadores -> [:PERTENCE_A] -> Times
-        player_team_relations = [
-            {"player_id": str(p.id), "team_id": str(p.team.id)} 
-            for p in all_players if p.team
-        ]
-        await session.run(
-            "UNWIND $relations AS rel MATCH (p:Player {id: rel.player_id}), (t:Team {id: rel.team_id}) CREATE (p)-[:PERTENCE_A]->(t)", 
-            relations=player_team_relations
-        )
+        player_team_cursor = players_collection.find({"team": {"$ne": None}}, {"team": 1}, batch_size=chunk_size)
+        await load_phase(neo4j_driver, "PERTENCE_A", WRITE_PLAYER_TEAM_QUERY,
+                         stream_chunks(player_team_cursor, player_team_rows, chunk_size), concurrency)
 
         # Relacionamento: Times -> [:AMIGO_DE] -> Times
-        friend_relations = []
-        for team in all_teams:
-            for friend in team.friends:
-                # Adiciona a amizade nos dois sentidos para facilitar as consultas
-                friend_relations.append({"team1_id": str(team.id), "team2_id": str(friend.id)})
-        await session.run(
-            "UNWIND $relations AS rel MATCH (t1:Team {id: rel.team1_id}), (t2:Team {id: rel.team2_id}) MERGE (t1)-[:AMIGO_DE]->(t2)", 
-            relations=friend_relations
-        )
-        
+        friends_cursor = teams_collection.find({}, {"friends": 1}, batch_size=chunk_size)
+        await load_phase(neo4j_driver, "AMIGO_DE", WRITE_FRIENDS_QUERY,
+                         stream_chunks(friends_cursor, friend_rows, chunk_size), concurrency)
+
         print("✅ Relacionamentos criados com sucesso.")
-        
-    await neo4j_driver.close()
-    print("\n✅ Migração concluída com sucesso!")
+
+        # --- 6. Checkpoint do modo --watch ---
+        # A limpeza apagou o checkpoint anterior. O novo aponta para antes da leitura: o --watch
+        # reaplica o que mudou durante a carga (MERGE torna a repetição inofensiva).
+        if start_token is not None:
+            async with neo4j_driver.session() as session:
+                await session.run(SAVE_CHECKPOINT_QUERY, name=SYNC_CHECKPOINT_NAME,
+                                  resume_token=json.dumps(start_token))
+            print("✅ Checkpoint do modo --watch salvo (início da carga).")
+    finally:
+        await neo4j_driver.close()
+
+    print(f"\n✅ Migração concluída com sucesso em {time.perf_counter() - total_start:.1f}s!")
+
+# =============================================================================
+# --- Sincronização incremental (modo --watch) ---
+# =============================================================================
+
+# Em vez de apagar e recriar o grafo, o modo incremental acompanha os Change Streams
+# do MongoDB nas coleções `teams` e `players` e aplica só o que mudou.
+# Requer um MongoDB em replica set (o Atlas já é), condição para Change Streams.
+#
+# Cada lote de mudanças é escrito em UMA transação do Neo4j, junto com o resume token
+# do stream (nó :SyncCheckpoint). Se o processo cair, ele retoma exatamente do último
+# lote confirmado; como todas as escritas usam MERGE, reaplicar um lote é inofensivo.
+
+SYNC_CHECKPOINT_NAME = "mongo-change-stream"
+WATCHED_COLLECTIONS = ["teams", "players"]
+CHANGE_STREAM_PIPELINE = [{"$match": {"ns.coll": {"$in": WATCHED_COLLECTIONS}}}]
+
+# Cria/atualiza os times e deixa as arestas AMIGO_DE de saída iguais à lista `friends`.
+UPSERT_TEAMS_QUERY = """
+    UNWIND $teams AS team
+    MERGE (t:Team {id: team.id})
+    SET t.name = team.name, t.game = team.game
+    WITH t, team
+    CALL {
+        WITH t, team
+        MATCH (t)-[r:AMIGO_DE]->(old:Team)
+        WHERE NOT old.id IN team.friends
+        DELETE r
+    }
+    CALL {
+        WITH t, team
+        UNWIND team.friends AS friend_id
+        MERGE (f:Team {id: friend_id})
+        MERGE (t)-[:AMIGO_DE]->(f)
+    }
+"""
+
+# Cria/atualiza os jogadores e aponta PERTENCE_A para o time atual (se houver).
+UPSERT_PLAYERS_QUERY = """
+    UNWIND $players AS player
+    MERGE (p:Player {id: player.id})
+    SET p.nickname = player.nickname
+    WITH p, player
+    CALL {
+        WITH p, player
+        MATCH (p)-[r:PERTENCE_A]->(old:Team)
+        WHERE player.team_id IS NULL OR old.id <> player.team_id
+        DELETE r
+    }
+    CALL {
+        WITH p, player
+        WITH p, player WHERE player.team_id IS NOT NULL
+        MERGE (t:Team {id: player.team_id})
+        MERGE (p)-[:PERTENCE_A]->(t)
+    }
+"""
+
+DELETE_TEAMS_QUERY = "UNWIND $ids AS id MATCH (t:Team {id: id}) DETACH DELETE t"
+DELETE_PLAYERS_QUERY = "UNWIND $ids AS id MATCH (p:Player {id: id}) DETACH DELETE p"
+
+SAVE_CHECKPOINT_QUERY = """
+    MERGE (c:SyncCheckpoint {name: $name})
+    SET c.resume_token = $resume_token, c.updated_at = datetime()
+"""
+LOAD_CHECKPOINT_QUERY = "MATCH (c:SyncCheckpoint {name: $name}) RETURN c.resume_token AS resume_token"
+
+
+def team_to_graph(doc: dict) -> dict:
+    """Converte um documento bruto da coleção `teams` para os parâmetros do Cypher."""
+    return {
+        "id": str(doc["_id"]),
+        "name": doc.get("team_name"),
+        "game": doc.get("main_game"),
+        "friends": [str(ref.id) for ref in doc.get("friends", [])],
+    }
+
+
+def player_to_graph(doc: dict) -> dict:
+    """Converte um documento bruto da coleção `players` para os parâmetros do Cypher."""
+    team_ref = doc.get("team")
+    return {
+        "id": str(doc["_id"]),
+        "nickname": doc.get("nickname"),
+        "team_id": str(team_ref.id) if team_ref else None,
+    }
+
+
+async def apply_batch(tx, changes: dict, resume_token: dict):
+    """
+    Aplica um lote de mudanças (já deduplicado por documento) e salva o checkpoint,
+    tudo na mesma transação.
+    """
+    teams, players, deleted_teams, deleted_players = [], [], [], []
+    for (collection, _), change in changes.items():
+        # Sem `fullDocument` o documento já não existe mais (foi apagado depois da mudança).
+        if change["operationType"] == "delete" or change.get("fullDocument") is None:
+            deleted_id = str(change["documentKey"]["_id"])
+            (deleted_teams if collection == "teams" else deleted_players).append(deleted_id)
+        elif collection == "teams":
+            teams.append(team_to_graph(change["fullDocument"]))
+        else:
+            players.append(player_to_graph(change["fullDocument"]))
+
+    if teams:
+        await tx.run(UPSERT_TEAMS_QUERY, teams=teams)
+    if players:
+        await tx.run(UPSERT_PLAYERS_QUERY, players=players)
+    if deleted_teams:
+        await tx.run(DELETE_TEAMS_QUERY, ids=deleted_teams)
+    if deleted_players:
+        await tx.run(DELETE_PLAYERS_QUERY, ids=deleted_players)
+    await tx.run(SAVE_CHECKPOINT_QUERY, name=SYNC_CHECKPOINT_NAME, resume_token=json.dumps(resume_token))
+
+
+async def capture_start_token(database):
+    """
+    Resume token do Change Stream no momento atual, ou None se o MongoDB não tiver Change
+    Streams (fora de um replica set). A carga completa o salva como checkpoint ao terminar.
+    """
+    try:
+        async with database.watch(CHANGE_STREAM_PIPELINE, max_await_time_ms=1) as stream:
+            # A primeira leitura traz o token da posição atual do stream.
+            await stream.try_next()
+            return stream.resume_token
+    except PyMongoError as exc:
+        print(f"AVISO: sem Change Streams ({exc}); sem checkpoint, o --watch só acompanha o que mudar depois de iniciado.")
+        return None
+
+
+async def load_checkpoint(session):
+    result = await session.run(LOAD_CHECKPOINT_QUERY, name=SYNC_CHECKPOINT_NAME)
+    record = await result.single()
+    if record and record["resume_token"]:
+        return json.loads(record["resume_token"])
+    return None
+
+
+async def watch(batch_size: int, flush_interval: float):
+    """
+    Mantém o grafo do Neo4j sincronizado com o MongoDB continuamente,
+    sem reconstrução completa.
+    """
+    print("Iniciando sincronização incremental MongoDB -> Neo4j (Ctrl+C para parar)...")
+    await init_db()
+    database = Team.get_motor_collection().database
+
+    neo4j_driver = AsyncGraphDatabase.driver(
+        settings.NEO4J_URI,
+        auth=(settings.NEO4J_USERNAME, settings.NEO4J_PASSWORD)
+    )
+
+    try:
+        async with neo4j_driver.session() as session:
+            await session.run(TEAM_ID_CONSTRAINT)
+            await session.run(PLAYER_ID_CONSTRAINT)
+            resume_token = await load_checkpoint(session)
+            if resume_token:
+                print("--Retomando a partir do último checkpoint salvo.")
+            else:
+                print("--Nenhum checkpoint encontrado: acompanhando a partir de agora.")
+                print("  (rode `python mongo_to_neo4j.py` antes para a carga inicial completa)")
+
+            async with database.watch(
+                CHANGE_STREAM_PIPELINE,
+                full_document="updateLookup",
+                resume_after=resume_token,
+                max_await_time_ms=int(flush_interval * 1000),
+            ) as stream:
+                # Mudanças pendentes, indexadas por (coleção, _id): só a última de cada documento importa,
+                # pois com `updateLookup` ela já traz o estado atual completo.
+                pending = {}
+                last_flush = time.monotonic()
+                while stream.alive:
+                    change = await stream.try_next()
+                    if change is not None:
+                        pending[(change["ns"]["coll"], change["documentKey"]["_id"])] = change
+
+                    flush_due = time.monotonic() - last_flush >= flush_interval
+                    if pending and (len(pending) >= batch_size or change is None or flush_due):
+                        token = stream.resume_token
+                        await session.execute_write(apply_batch, pending, token)
+                        print(f"✅ {len(pending)} documentos sincronizados.")
+                        pending = {}
+                        last_flush = time.monotonic()
+    finally:
+        await neo4j_driver.close()
+
 
 if __name__ == "__main__":
-    asyncio.run(migrate())
+    parser = argparse.ArgumentParser(description="Sincroniza os dados do MongoDB com o Neo4j.")
+    parser.add_argument("--watch", action="store_true",
+                        help="Modo incremental contínuo via Change Streams (sem reconstruir o grafo).")
+    parser.add_argument("--batch-size", type=int, default=500,
+                        help="Máximo de documentos por transação no modo --watch.")
+    parser.add_argument("--flush-interval", type=float, default=1.0,
+                        help="Tempo máximo (s) que uma mudança espera antes de ser escrita no modo --watch.")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Linhas por transação na carga completa.")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Sessões do Neo4j escrevendo em paralelo na carga completa.")
+    args = parser.parse_args()
+
+    if args.watch:
+        asyncio.run(watch(args.batch_size, args.flush_interval))
+    else:
+        asyncio.run(migrate(args.chunk_size, args.concurrency))
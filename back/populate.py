@@ -1,18 +1,28 @@
 # populate.py - Versão Final com Rede Social Densa
 
+import argparse
 import asyncio
+import datetime
+import os
 import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from faker import Faker
 import motor.motor_asyncio
+from bson import DBRef, ObjectId
+from pymongo import MongoClient
 
 from beanie import init_beanie
 # Importa todos os modelos e Enums necessários do seu projeto
 from app.models import (
-    Team, Player, Post, Comment, PostAuthor, Scrim,
+    Team, Player, Post, ArchivedPost, Comment, PostAuthor, Scrim, TeamStats, ScrimPairSummary,
     GameEnum, LolRoleEnum, ValorantRoleEnum, CsRoleEnum, ScrimStatusEnum
 )
 from app.config import settings
 from app.security import hash_password
+from app.snapshots import team_snapshot
+from app import team_stats, scrim_history
 
 # --- Configurações do Script ---
 NUMBER_OF_TEAMS = 100
@@ -27,7 +37,8 @@ ROLE_MAP = {
     GameEnum.CS: [r.value for r in CsRoleEnum],
 }
 
-async def populate():
+async def populate(number_of_teams: int = NUMBER_OF_TEAMS, number_of_posts: int = NUMBER_OF_POSTS,
+                   number_of_scrims: int = NUMBER_OF_SCRIMS):
     """
     Script para limpar o banco de dados e popular com dados falsos e interconectados,
     incluindo uma rede de amizades mais densa para testes de recomendação.
@@ -38,7 +49,7 @@ async def populate():
     client = motor.motor_asyncio.AsyncIOMotorClient(settings.MONGODB_URI)
     database = client[settings.DATABASE_NAME]
     # Inicializa o Beanie, registrando todos os modelos de Documento
-    await init_beanie(database=database, document_models=[Team, Player, Post, Scrim])
+    await init_beanie(database=database, document_models=[Team, Player, Post, ArchivedPost, Scrim, TeamStats, ScrimPairSummary])
     print("✅ Conexão com o banco de dados estabelecida.")
 
     # --- 2. Limpar Todas as Coleções ---
@@ -46,17 +57,20 @@ async def populate():
     await Team.delete_all()
     await Player.delete_all()
     await Post.delete_all()
+    await ArchivedPost.delete_all()
     await Scrim.delete_all()
+    await TeamStats.delete_all()
+    await ScrimPairSummary.delete_all()
     print("✅ Coleções limpas com sucesso.")
 
     # --- 3. Criar Times ---
-    print(f"\n👥 Criando {NUMBER_OF_TEAMS} times falsos...")
+    print(f"\n👥 Criando {number_of_teams} times falsos...")
     fake = Faker('pt_BR') # Gera dados em português
     teams_to_create = []
     hashed_fake_password = hash_password(FAKE_PASSWORD)
     valid_games = [game.value for game in GameEnum]
 
-    for _ in range(NUMBER_OF_TEAMS):
+    for _ in range(number_of_teams):
         team_name = fake.unique.company()
         team_data = Team(
             email=fake.unique.email(),
@@ -85,14 +99,17 @@ async def populate():
     # Adiciona mais amizades aleatórias para o resto dos times
     for team in created_teams:
         num_friends = random.randint(1, 4)
-        potential_friends = [f for f in created_teams if f.id != team.id and f not in team.friends]
+        # Conjunto de ids para a verificação de "já é amigo" ser O(1), e não uma varredura da lista.
+        excluded_ids = {team.id} | {friend.id for friend in team.friends}
+        potential_friends = [f for f in created_teams if f.id not in excluded_ids]
         new_friends = random.sample(potential_friends, k=min(num_friends, len(potential_friends)))
         for friend in new_friends:
             team.friends.append(friend)
             friend.friends.append(team) # Amizade é mútua, então adicionamos nos dois times
     
-    # Salva todas as amizades de uma vez
+    # Salva todas as amizades de uma vez, junto com as cópias (FriendInfo) de cada amigo
     for team in created_teams:
+        team.friends_info = [team_snapshot(friend) for friend in team.friends]
         await team.save()
     print("✅ Rede de amizades criada.")
     
@@ -120,9 +137,9 @@ async def populate():
     print(f"✅ {len(created_players)} jogadores criados e associados.")
     
     # --- 6. Criar Posts ---
-    print(f"\n📝 Criando {NUMBER_OF_POSTS} posts aleatórios...")
+    print(f"\n📝 Criando {number_of_posts} posts aleatórios...")
     posts_to_create = []
-    for _ in range(NUMBER_OF_POSTS):
+    for _ in range(number_of_posts):
         posts_to_create.append(Post(
             author=random.choice(created_teams),
             content=fake.bs().capitalize() + ". " + fake.paragraph(nb_sentences=2)
@@ -150,27 +167,386 @@ async def populate():
     print("✅ Interações sociais simuladas com sucesso.")
 
     # --- 8. Simular Scrims ---
-    print(f"\n⚔️ Criando {NUMBER_OF_SCRIMS} scrims aleatórias...")
+    print(f"\n⚔️ Criando {number_of_scrims} scrims aleatórias...")
     scrims_to_create = []
     valid_statuses = [s.value for s in ScrimStatusEnum]
-    for _ in range(NUMBER_OF_SCRIMS):
+    for _ in range(number_of_scrims):
         proposer, opponent = random.sample(created_teams, k=2)
+        status = random.choice(valid_statuses)
+        # Scrims concluídas têm um resultado: vitória de um dos times ou empate.
+        winner = random.choice([proposer.id, opponent.id, None]) if status == ScrimStatusEnum.COMPLETED else None
         scrims_to_create.append(Scrim(
             proposing_team=proposer,
             opponent_team=opponent,
             scrim_datetime=fake.future_datetime(end_date="+30d"),
             game=proposer.main_game,
-            status=random.choice(valid_statuses)
+            status=status,
+            winner_team_id=winner
         ))
     await Scrim.insert_many(scrims_to_create)
     print(f"✅ {len(scrims_to_create)} scrims criadas.")
 
+    # --- 9. Contadores dos Times e Retrospectos ---
+    # Os dados foram gravados direto, sem passar pelas rotas: os contadores saem de uma
+    # conferência e os confrontos diretos, do backfill.
+    await team_stats.reconcile()
+    await scrim_history.backfill()
+    print("✅ Contadores dos times e retrospectos calculados.")
+
     # --- Conclusão ---
     print("\n" + "="*50)
     print("🎉 Script de população concluído com sucesso! 🎉")
     print(f"👉 A senha para todos os times é: '{FAKE_PASSWORD}'")
     print("="*50)
 
+# =============================================================================
+# --- Modo de escala (--scale) ---
+# =============================================================================
+# Gera bases grandes (ex.: 1M de times, 10M de posts) para testes de carga.
+#
+# - Determinístico: o mesmo --seed (e os mesmos tamanhos) geram exatamente os mesmos dados.
+#   As datas (criação dos times e posts, horário das scrims) contam a partir de
+#   --reference-date (padrão SCALE_REFERENCE_DATE), não do dia em que o script roda.
+# - Sem leituras de volta: os ObjectIds são calculados a partir do índice de cada documento
+#   (tipo + índice), então qualquer processo sabe o id do time 123 sem consultar o banco.
+# - Amizades simétricas por construção: a aresta (a, a+o) existe se um hash de (seed, a, o)
+#   cair abaixo de FRIEND_EDGE_PROBABILITY; os dois lados calculam a mesma coisa sozinhos.
+# - Paralelo: cada processo gera uma faixa de índices e grava com insert_many(ordered=False).
+
+SCALE_BATCH_SIZE = 5000
+SCALE_REFERENCE_DATE = datetime.date(2026, 1, 1)
+FRIEND_OFFSETS_PER_TEAM = 4
+FRIEND_EDGE_PROBABILITY = 0.5
+HUB_SIZE = 5
+MAX_PLAYERS_PER_TEAM = 5
+MAX_LIKES_PER_POST = 50
+TEXT_POOL_SIZE = 2000
+
+# Prefixo do ObjectId que identifica o tipo do documento.
+KIND_TEAM, KIND_PLAYER, KIND_POST, KIND_SCRIM = 1, 2, 3, 4
+
+NAME_PREFIXES = ["Red", "Blue", "Iron", "Shadow", "Storm", "Neon", "Night", "Solar", "Frost", "Wild",
+                 "Dark", "Golden", "Silent", "Rapid", "Royal", "Cyber", "Lunar", "Crimson", "Alpha", "Omega"]
+NAME_SUFFIXES = ["Wolves", "Dragons", "Titans", "Falcons", "Knights", "Vipers", "Ravens", "Lions",
+                 "Phantoms", "Sharks", "Rangers", "Giants", "Hawks", "Owls", "Tigers", "Bulls"]
+GAMES = [game.value for game in GameEnum]
+SCRIM_STATUSES = [s.value for s in ScrimStatusEnum]
+
+
+@dataclass(frozen=True)
+class ScaleConfig:
+    """Parâmetros do modo de escala (enviados a cada processo de trabalho)."""
+    teams: int
+    posts: int
+    scrims: int
+    seed: int
+    hashed_password: str
+    reference_time: datetime.datetime
+    batch_size: int = SCALE_BATCH_SIZE
+
+
+def make_object_id(kind: int, index: int) -> ObjectId:
+    """ObjectId determinístico: 4 bytes de timestamp fixo + 1 byte de tipo + 7 bytes de índice."""
+    return ObjectId((1_700_000_000).to_bytes(4, "big") + bytes([kind]) + index.to_bytes(7, "big"))
+
+
+def _hash01(*values: int) -> float:
+    """Hash rápido (splitmix64) de inteiros para um número em [0, 1)."""
+    h = 0x9E3779B97F4A7C15
+    for value in values:
+        h = (h ^ (value & 0xFFFFFFFFFFFFFFFF)) * 0xBF58476D1CE4E5B9 & 0xFFFFFFFFFFFFFFFF
+        h = (h ^ (h >> 27)) * 0x94D049BB133111EB & 0xFFFFFFFFFFFFFFFF
+        h ^= h >> 31
+    return h / 2 ** 64
+
+
+def team_name(config: ScaleConfig, index: int) -> str:
+    prefix = NAME_PREFIXES[int(_hash01(config.seed, KIND_TEAM, index, 1) * len(NAME_PREFIXES))]
+    suffix = NAME_SUFFIXES[int(_hash01(config.seed, KIND_TEAM, index, 2) * len(NAME_SUFFIXES))]
+    return f"{prefix} {suffix} {index}"
+
+
+def team_tag(name: str) -> str:
+    return name[:4].upper().replace(" ", "")
+
+
+def team_game(config: ScaleConfig, index: int) -> str:
+    return GAMES[int(_hash01(config.seed, KIND_TEAM, index, 3) * len(GAMES))]
+
+
+def team_player_count(config: ScaleConfig, index: int) -> int:
+    return 2 + int(_hash01(config.seed, KIND_PLAYER, index) * (MAX_PLAYERS_PER_TEAM - 1))
+
+
+def friend_snapshot(config: ScaleConfig, index: int) -> dict:
+    """Cópia (FriendInfo) do time `index`, calculada sem ler o documento dele."""
+    name = team_name(config, index)
+    return {"id": make_object_id(KIND_TEAM, index), "team_name": name,
+            "tag": team_tag(name), "main_game": team_game(config, index)}
+
+
+def friend_offsets(config: ScaleConfig) -> list:
+    rng = random.Random(f"{config.seed}:offsets")
+    population = range(1, max(config.teams, 2))
+    return rng.sample(population, k=min(FRIEND_OFFSETS_PER_TEAM, len(population)))
+
+
+def team_friends(config: ScaleConfig, index: int, offsets: list) -> list:
+    """Índices dos amigos de um time; a relação é simétrica sem nenhuma coordenação."""
+    n = config.teams
+    friends = set()
+    for offset in offsets:
+        # Aresta que "sai" deste time (index -> index + offset)...
+        if _hash01(config.seed, index, offset) < FRIEND_EDGE_PROBABILITY:
+            friends.add((index + offset) % n)
+        # ...e a que "chega" nele, calculada com a mesma chave do outro lado.
+        origin = (index - offset) % n
+        if _hash01(config.seed, origin, offset) < FRIEND_EDGE_PROBABILITY:
+            friends.add(origin)
+    # O "hub" social: os primeiros times são todos amigos entre si.
+    if index < HUB_SIZE:
+        friends.update(range(min(HUB_SIZE, n)))
+    friends.discard(index)
+    return sorted(friends)
+
+
+_worker_state = {}
+
+
+def _text_pools(config: ScaleConfig):
+    """Frases geradas uma única vez por processo (Faker é caro demais por documento)."""
+    if _worker_state.get("pools_seed") != config.seed:
+        fake = Faker("pt_BR")
+        fake.seed_instance(config.seed)
+        _worker_state["pools_seed"] = config.seed
+        _worker_state["pools"] = {
+            "sentences": [fake.sentence(nb_words=random.Random(i).randint(5, 15)) for i in range(TEXT_POOL_SIZE)],
+            "bs": [fake.bs().capitalize() for _ in range(TEXT_POOL_SIZE)],
+            "names": [fake.name() for _ in range(TEXT_POOL_SIZE)],
+            "domains": [fake.domain_name() for _ in range(50)],
+        }
+    return _worker_state["pools"]
+
+
+def generate_teams(config: ScaleConfig, start: int, stop: int):
+    """Gera os documentos brutos dos times [start, stop) e dos seus jogadores."""
+    pools = _text_pools(config)
+    offsets = friend_offsets(config)
+    teams, players = [], []
+    for i in range(start, stop):
+        rng = random.Random(f"{config.seed}:team:{i}")
+        name = team_name(config, i)
+        game = team_game(config, i)
+        team_id = make_object_id(KIND_TEAM, i)
+        friend_indexes = team_friends(config, i, offsets)
+
+        player_refs = []
+        for slot in range(team_player_count(config, i)):
+            player_id = make_object_id(KIND_PLAYER, i * MAX_PLAYERS_PER_TEAM + slot)
+            player_refs.append(DBRef("players", player_id))
+            players.append({
+                "_id": player_id,
+                "nickname": f"{name.split()[1].lower()}_{i}_{slot}",
+                "full_name": rng.choice(pools["names"]),
+                "role": rng.choice(ROLE_MAP[GameEnum(game)]),
+                "team": DBRef("teams", team_id),
+            })
+
+        teams.append({
+            "_id": team_id,
+            "email": f"team{i}@{rng.choice(pools['domains'])}",
+            "hashed_password": config.hashed_password,
+            "team_name": name,
+            "tag": team_tag(name),
+            "logo_url": None,
+            "bio": " ".join(rng.choices(pools["sentences"], k=3)),
+            "main_game": game,
+            "socials": None,
+            "friends": [DBRef("teams", make_object_id(KIND_TEAM, f)) for f in friend_indexes],
+            "friend_requests_sent": [],
+            "friend_requests_received": [],
+            "friends_info": [friend_snapshot(config, f) for f in friend_indexes],
+            "friend_requests_received_info": [],
+            "players": player_refs,
+            "created_at": config.reference_time - datetime.timedelta(days=rng.randint(30, 365)),
+        })
+    return teams, players
+
+
+def generate_posts(config: ScaleConfig, start: int, stop: int):
+    """Gera os documentos brutos dos posts [start, stop), com likes e comentários já ligados."""
+    pools = _text_pools(config)
+    posts = []
+    for i in range(start, stop):
+        rng = random.Random(f"{config.seed}:post:{i}")
+        author = rng.randrange(config.teams)
+
+        likes = []
+        if rng.random() > 0.3:  # 70% de chance de um post ter likes
+            num_likes = rng.randint(1, max(1, min(MAX_LIKES_PER_POST, config.teams // 2)))
+            likes = [DBRef("teams", make_object_id(KIND_TEAM, t)) for t in rng.sample(range(config.teams), k=num_likes)]
+
+        comments = []
+        if rng.random() > 0.5:  # 50% de chance de ter comentários
+            for _ in range(rng.randint(1, 3)):
+                commenter = rng.randrange(config.teams)
+                name = team_name(config, commenter)
+                comments.append({
+                    "author": {"id": make_object_id(KIND_TEAM, commenter), "team_name": name, "tag": team_tag(name)},
+                    "content": rng.choice(pools["sentences"]),
+                    "created_at": config.reference_time - datetime.timedelta(minutes=rng.randint(0, 60 * 24 * 30)),
+                })
+
+        posts.append({
+            "_id": make_object_id(KIND_POST, i),
+            "content": (rng.choice(pools["bs"]) + ". " + rng.choice(pools["sentences"]))[:280],
+            "created_at": config.reference_time - datetime.timedelta(seconds=rng.randint(0, 90 * 24 * 3600)),
+            "author": DBRef("teams", make_object_id(KIND_TEAM, author)),
+            "likes": likes,
+            "comments": comments,
+        })
+    return posts
+
+
+def generate_scrims(config: ScaleConfig, start: int, stop: int):
+    """Gera os documentos brutos das scrims [start, stop)."""
+    scrims = []
+    for i in range(start, stop):
+        rng = random.Random(f"{config.seed}:scrim:{i}")
+        proposer, opponent = rng.sample(range(config.teams), k=2)
+        scrim = {
+            "_id": make_object_id(KIND_SCRIM, i),
+            "proposing_team": DBRef("teams", make_object_id(KIND_TEAM, proposer)),
+            "opponent_team": DBRef("teams", make_object_id(KIND_TEAM, opponent)),
+            "scrim_datetime": config.reference_time + datetime.timedelta(minutes=rng.randint(60, 60 * 24 * 30)),
+            "game": team_game(config, proposer),
+            "status": rng.choice(SCRIM_STATUSES),
+            "winner_team_id": None,
+            "created_at": config.reference_time - datetime.timedelta(minutes=rng.randint(0, 60 * 24 * 7)),
+        }
+        # Scrims concluídas têm um resultado: vitória de um dos times ou empate.
+        if scrim["status"] == ScrimStatusEnum.COMPLETED.value:
+            winner = rng.choice([proposer, opponent, None])
+            if winner is not None:
+                scrim["winner_team_id"] = make_object_id(KIND_TEAM, winner)
+        scrims.append(scrim)
+    return scrims
+
+
+def _worker_database():
+    """Cada processo de trabalho abre (uma vez) o seu próprio cliente síncrono do MongoDB."""
+    if "database" not in _worker_state:
+        _worker_state["database"] = MongoClient(settings.MONGODB_URI)[settings.DATABASE_NAME]
+    return _worker_state["database"]
+
+
+def _insert(collection: str, documents: list) -> int:
+    if not documents:
+        return 0
+    # ordered=False: o servidor pode gravar o lote em paralelo e não para no primeiro erro.
+    result = _worker_database()[collection].insert_many(documents, ordered=False)
+    return len(result.inserted_ids)
+
+
+def write_range(kind: str, config: ScaleConfig, start: int, stop: int) -> dict:
+    """Tarefa executada em um processo de trabalho: gera uma faixa de documentos e grava."""
+    counts = {}
+    if kind == "teams":
+        teams, players = generate_teams(config, start, stop)
+        counts["teams"] = _insert(Team.Settings.name, teams)
+        counts["players"] = _insert(Player.Settings.name, players)
+    elif kind == "posts":
+        counts["posts"] = _insert(Post.Settings.name, generate_posts(config, start, stop))
+    elif kind == "scrims":
+        counts["scrims"] = _insert(Scrim.Settings.name, generate_scrims(config, start, stop))
+    return counts
+
+
+async def populate_scale(config: ScaleConfig, workers: int):
+    """
+    Popula o banco em escala usando vários processos de trabalho.
+    Os índices são criados (via init_beanie) só depois da carga, que fica bem mais rápida.
+    """
+    print(f"🚀 Modo de escala: {config.teams} times, {config.posts} posts, {config.scrims} scrims "
+          f"(seed={config.seed}, {workers} processos, lotes de {config.batch_size})")
+    start_time = time.perf_counter()
+
+    client = motor.motor_asyncio.AsyncIOMotorClient(settings.MONGODB_URI)
+    database = client[settings.DATABASE_NAME]
+
+    print("\n🧹 Removendo coleções existentes...")
+    for model in (Team, Player, Post, ArchivedPost, Scrim, TeamStats, ScrimPairSummary):
+        await database.drop_collection(model.Settings.name)
+
+    tasks = []
+    for kind, total in (("teams", config.teams), ("posts", config.posts), ("scrims", config.scrims)):
+        for batch_start in range(0, total, config.batch_size):
+            tasks.append((kind, batch_start, min(batch_start + config.batch_size, total)))
+
+    totals = {"teams": 0, "players": 0, "posts": 0, "scrims": 0}
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            loop.run_in_executor(executor, write_range, kind, config, batch_start, batch_stop)
+            for kind, batch_start, batch_stop in tasks
+        ]
+        last_report = time.perf_counter()
+        for done in asyncio.as_completed(futures):
+            for kind, count in (await done).items():
+                totals[kind] += count
+            if time.perf_counter() - last_report >= 5:
+                elapsed = time.perf_counter() - start_time
+                written = sum(totals.values())
+                print(f"  ... {written:,} documentos em {elapsed:.0f}s ({written / elapsed:,.0f} docs/s)")
+                last_report = time.perf_counter()
+
+    load_time = time.perf_counter() - start_time
+    print(f"✅ Carga concluída em {load_time:.1f}s: " + ", ".join(f"{v:,} {k}" for k, v in totals.items()))
+
+    print("\n📇 Criando índices...")
+    await init_beanie(database=database, document_models=[Team, Player, Post, ArchivedPost, Scrim, TeamStats, ScrimPairSummary])
+    print(f"✅ Índices criados em {time.perf_counter() - start_time - load_time:.1f}s.")
+
+    print("\n🔢 Calculando os contadores dos times e os retrospectos das scrims...")
+    stats_start = time.perf_counter()
+    await team_stats.reconcile()
+    await scrim_history.backfill()
+    print(f"✅ Contadores e retrospectos calculados em {time.perf_counter() - stats_start:.1f}s.")
+
+    print("\n" + "="*50)
+    print("🎉 Script de população concluído com sucesso! 🎉")
+    print(f"👉 A senha para todos os times é: '{FAKE_PASSWORD}'")
+    print("="*50)
+
+
 # Permite que o script seja executado diretamente pelo terminal
 if __name__ == "__main__":
-    asyncio.run(populate())
+    parser = argparse.ArgumentParser(description="Popula o MongoDB com dados falsos.")
+    parser.add_argument("--scale", action="store_true",
+                        help="Gera uma base grande com processos paralelos e escritas em lote.")
+    parser.add_argument("--teams", type=int, default=NUMBER_OF_TEAMS)
+    parser.add_argument("--posts", type=int, default=NUMBER_OF_POSTS)
+    parser.add_argument("--scrims", type=int, default=NUMBER_OF_SCRIMS)
+    parser.add_argument("--seed", type=int, default=42, help="Semente que torna a geração determinística.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processos de trabalho.")
+    parser.add_argument("--batch-size", type=int, default=SCALE_BATCH_SIZE, help="Documentos por lote/tarefa.")
+    parser.add_argument("--reference-date", type=datetime.date.fromisoformat, default=SCALE_REFERENCE_DATE,
+                        help="Data (AAAA-MM-DD) a partir da qual as datas são geradas no modo de escala.")
+    args = parser.parse_args()
+    if args.teams < 2:
+        parser.error("--teams precisa ser pelo menos 2 (as scrims e os likes sorteiam pares de times).")
+
+    if args.scale:
+        reference = datetime.datetime.combine(args.reference_date, datetime.time(), tzinfo=datetime.UTC)
+        config = ScaleConfig(
+            teams=args.teams,
+            posts=args.posts,
+            scrims=args.scrims,
+            seed=args.seed,
+            hashed_password=hash_password(FAKE_PASSWORD),
+            reference_time=reference,
+            batch_size=args.batch_size,
+        )
+        asyncio.run(populate_scale(config, args.workers))
+    else:
+        asyncio.run(populate(args.teams, args.posts, args.scrims))
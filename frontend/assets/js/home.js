@@ -26,11 +26,11 @@ document.addEventListener('DOMContentLoaded', () => {
     // =========================================================================
 
     /**
-     * Busca todos os posts da API e chama a função para renderizá-los na tela.
+     * Busca o feed ranqueado do time logado na API e chama a função para renderizá-lo na tela.
      */
     async function fetchAndRenderPosts() {
         try {
-            const response = await fetch(`${API_URL}/posts`);
+            const response = await fetch(`${API_URL}/feed?limit=50&compact=true`, { headers: { 'Authorization': `Bearer ${token}` } });
             const posts = await response.json();
             if (!response.ok) throw new Error('Falha ao buscar os posts.');
             renderPosts(posts);
@@ -54,7 +54,7 @@ document.addEventListener('DOMContentLoaded', () => {
         let postsHTML = '';
         posts.forEach(post => {
             // Verifica se o usuário logado (myProfile) já curtiu este post
-            const isLikedByCurrentUser = myProfile && post.likes && post.likes.includes(myProfile.id);
+            const isLikedByCurrentUser = post.liked_by_me;
             postsHTML += `
                 <div class="post-card" data-post-id="${post.id}">
                     <div class="post-header">
@@ -258,7 +258,7 @@ document.addEventListener('DOMContentLoaded', () => {
         const likeButton = target.closest('.like-button');
         if (likeButton) {
             try {
-                const response = await fetch(`${API_URL}/posts/${postId}/like`, {
+                const response = await fetch(`${API_URL}/posts/${postId}/like?compact=true`, {
                     method: 'POST',
                     headers: { 'Authorization': `Bearer ${token}` }
                 });
@@ -270,7 +270,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 const icon = likeButton.querySelector('i');
                 likesCountSpan.textContent = updatedPost.likes_count;
 
-                const isLiked = updatedPost.likes.includes(myProfile.id);
+                const isLiked = updatedPost.liked_by_me;
                 likeButton.classList.toggle('liked', isLiked);
                 icon.classList.toggle('bi-heart-fill', isLiked);
                 icon.classList.toggle('bi-heart', !isLiked);
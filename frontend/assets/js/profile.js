@@ -17,6 +17,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const friendsCountEl = document.getElementById('friends-count');
     const friendsListEl = document.getElementById('friends-list');
     const postFeedEl = document.getElementById('profile-post-feed');
+    const loadMorePostsBtn = document.getElementById('load-more-posts');
     const playersListDiv = document.getElementById('profile-players-list');
     const logoutButton = document.getElementById('logout-button');
 
@@ -27,7 +28,10 @@ document.addEventListener('DOMContentLoaded', () => {
     const scrimOpponentName = document.getElementById('scrim-opponent-name');
 
     const API_URL = 'http://127.0.0.1:8000/api';
+    // Posts por página; "Carregar mais" pede a próxima a partir do último post exibido.
+    const POSTS_PAGE_SIZE = 10;
     let myProfile = null;
+    let lastPostCreatedAt = null;
     let viewedProfile = null;
 
     // =========================================================================
@@ -102,15 +106,18 @@ document.addEventListener('DOMContentLoaded', () => {
         `).join('');
     }
 
-    function renderPosts(posts, myProfileData) {
+    function renderPosts(posts, myProfileData, append = false) {
         if (!postFeedEl) return;
-        if (!posts || posts.length === 0) {
+        // Página cheia: pode haver mais posts depois do último.
+        if (posts && posts.length > 0) lastPostCreatedAt = posts[posts.length - 1].created_at;
+        if (loadMorePostsBtn) loadMorePostsBtn.style.display = posts && posts.length === POSTS_PAGE_SIZE ? '' : 'none';
+        if (!append && (!posts || posts.length === 0)) {
             postFeedEl.innerHTML = '<p>Este time ainda não fez nenhuma publicação.</p>';
             return;
         }
         let postsHTML = '';
         posts.forEach(post => {
-            const isLikedByCurrentUser = myProfileData && post.likes && post.likes.includes(myProfileData.id);
+            const isLikedByCurrentUser = post.liked_by_me;
             postsHTML += `
                 <div class="post-card" data-post-id="${post.id}">
                     <div class="post-header">
@@ -147,7 +154,27 @@ document.addEventListener('DOMContentLoaded', () => {
                 </div>
             `;
         });
-        postFeedEl.innerHTML = postsHTML;
+        if (append) {
+            postFeedEl.insertAdjacentHTML('beforeend', postsHTML);
+        } else {
+            postFeedEl.innerHTML = postsHTML;
+        }
+    }
+
+    async function loadMorePosts() {
+        loadMorePostsBtn.disabled = true;
+        try {
+            const params = new URLSearchParams({ compact: 'true', limit: POSTS_PAGE_SIZE, before: lastPostCreatedAt });
+            const response = await fetch(`${API_URL}/teams/${viewedProfile.id}/posts?${params}`, { headers: { 'Authorization': `Bearer ${token}` } });
+            const posts = await response.json();
+            if (!response.ok) throw new Error(posts.detail);
+            renderPosts(posts, myProfile, true);
+        } catch (error) {
+            console.error('Erro ao carregar mais posts:', error.message);
+            alert('Não foi possível carregar mais publicações.');
+        } finally {
+            loadMorePostsBtn.disabled = false;
+        }
     }
 
     async function sendFriendRequest(targetTeamId, buttonElement) {
@@ -176,7 +203,7 @@ document.addEventListener('DOMContentLoaded', () => {
         const likeButton = target.closest('.like-button');
         if (likeButton) {
             try {
-                const response = await fetch(`${API_URL}/posts/${postId}/like`, {
+                const response = await fetch(`${API_URL}/posts/${postId}/like?compact=true`, {
                     method: 'POST',
                     headers: { 'Authorization': `Bearer ${token}` }
                 });
@@ -188,7 +215,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 likesCountSpan.textContent = updatedPost.likes_count;
 
                 if (myProfile) {
-                    const isLiked = updatedPost.likes.includes(myProfile.id);
+                    const isLiked = updatedPost.liked_by_me;
                     likeButton.classList.toggle('liked', isLiked);
                     icon.classList.toggle('bi-heart-fill', isLiked);
                     icon.classList.toggle('bi-heart', !isLiked);
@@ -238,17 +265,15 @@ document.addEventListener('DOMContentLoaded', () => {
                 profileId = myProfile.id;
             }
 
-            const [profileRes, postsRes, friendsRes] = await Promise.all([
-                fetch(`${API_URL}/teams/${profileId}`),
-                fetch(`${API_URL}/teams/${profileId}/posts`),
-                fetch(`${API_URL}/teams/${profileId}/friends`)
-            ]);
+            // Perfil, amigos e primeira página de posts numa única requisição.
+            const pageRes = await fetch(`${API_URL}/teams/${profileId}/page?compact=true&posts_limit=${POSTS_PAGE_SIZE}`, { headers: { 'Authorization': `Bearer ${token}` } });
 
-            if (!profileRes.ok) throw new Error("Perfil não encontrado");
+            if (!pageRes.ok) throw new Error("Perfil não encontrado");
 
-            viewedProfile = await profileRes.json();
-            const postsData = await postsRes.json();
-            const friendsData = await friendsRes.json();
+            const pageData = await pageRes.json();
+            viewedProfile = pageData.team;
+            const postsData = pageData.posts;
+            const friendsData = pageData.friends;
 
             await renderProfileHeader(viewedProfile, myProfile);
             renderPlayers(viewedProfile.players);
@@ -317,6 +342,10 @@ document.addEventListener('DOMContentLoaded', () => {
         postFeedEl.addEventListener('click', handleFeedClick);
     }
 
+    if (loadMorePostsBtn) {
+        loadMorePostsBtn.addEventListener('click', loadMorePosts);
+    }
+
     // --- INICIALIZAÇÃO ---
     initializeProfilePage();
 });
\ No newline at end of file